@@ -8,6 +8,7 @@ import hashlib
 from datetime import datetime
 import base64
 import sys
+import asyncio
 
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
@@ -17,7 +18,7 @@ from utils.formatacao import formatar_valor_monetario, formatar_df_monetario
 from utils.filtros import filtro_data, filtro_categorias, aplicar_filtros
 
 # BACKEND V2 OBRIGATÓRIO - Importações exclusivas
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager, AsyncDatabaseManager
 from utils.repositories_v2 import TransacaoRepository, UsuarioRepository, CategoriaRepository
 from services.transacao_service_v2 import TransacaoService
 from utils.database_monitoring import DatabaseMonitor
@@ -183,7 +184,7 @@ def autenticar_usuario_v2(usuario, senha):
     """Autentica usuário no sistema Richness com segurança avançada"""
     try:
         # Inicializar sistema de autenticação
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         user_repo = UsuarioRepository(db_manager)
         
         # Verificar credenciais usando método seguro
@@ -212,7 +213,7 @@ def autenticar_usuario_v2(usuario, senha):
 def init_backend_sistema():
     """Inicializa o sistema Richness"""
     try:
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         usuario_repo = UsuarioRepository(db_manager)
         transacao_repo = TransacaoRepository(db_manager)
         categoria_repo = CategoriaRepository(db_manager)
@@ -370,18 +371,17 @@ def carregar_dados_usuario(usuario, data_inicio=None, data_fim=None, force_refre
         transacao_service = backend_sistema['transacao_service']
         
         # Carregar transações
-        df_transacoes = transacao_service.listar_transacoes_usuario(usuario)
+        df_transacoes = transacao_service.listar_transacoes_usuario(usuario, tipado=True)
         
         if df_transacoes.empty:
             return {}, pd.DataFrame()
         
-        # Aplicar filtro de período se especificado
+        # Aplicar filtro de período se especificado ('data' já vem como datetime64)
         if data_inicio and data_fim and 'data' in df_transacoes.columns:
-            df_transacoes['data_dt'] = pd.to_datetime(df_transacoes['data'])
             df_transacoes = df_transacoes[
-                (df_transacoes['data_dt'] >= pd.to_datetime(data_inicio)) & 
-                (df_transacoes['data_dt'] <= pd.to_datetime(data_fim))
-            ].drop('data_dt', axis=1)
+                (df_transacoes['data'] >= pd.to_datetime(data_inicio)) & 
+                (df_transacoes['data'] <= pd.to_datetime(data_fim))
+            ]
         
         # Calcular saldos por origem
         saldos_info = transacao_service.calcular_saldos_por_origem(usuario)
@@ -414,8 +414,7 @@ st.sidebar.markdown("### 📅 Selecionar Período")
 data_inicio, data_fim = None, None
 if not df_inicial.empty and 'data' in df_inicial.columns:
     # Converter coluna de data se necessário
-    df_for_filter = df_inicial.copy()
-    df_for_filter['Data'] = pd.to_datetime(df_for_filter['data'])
+    df_for_filter = df_inicial.assign(Data=df_inicial['data'])
     data_inicio, data_fim = filtro_data(df_for_filter, key_prefix="home")
     
     st.sidebar.success(f"📅 Período: {data_inicio} a {data_fim}")
@@ -643,7 +642,7 @@ def exibir_grid_insights_personalizados(usuario):
         from services.insights_cache_service import InsightsCacheService
         
         # Obter user_id
-        db = DatabaseManager()
+        db = get_database_manager()
         usuario_repo = UsuarioRepository(db)
         user_data = usuario_repo.obter_usuario_por_username(usuario)
         if not user_data:
@@ -675,15 +674,21 @@ def exibir_grid_insights_personalizados(usuario):
         avatar_path = avatar_map.get(personalidade_sel, 'imgs/perfil_amigavel_fem.png')
         nome_ia = nome_map.get(personalidade_sel, 'Ana')
         
-        # Saldos e dados principais
-        saldo_info = insights_service.obter_valor_restante_mensal(user_id)
-        sugestoes = insights_service.sugerir_otimizacoes(user_id)
-        alertas = insights_service.detectar_alertas_financeiros(user_id)
-        
-        # Buscar últimas 15 transações de extrato e fatura separadamente
+        # Saldos, dados principais e transações (consultas independentes, em paralelo)
         from services.transacao_service_v2 import TransacaoService
         transacao_service = TransacaoService()
-        df_todas = transacao_service.listar_transacoes_usuario(usuario, limite=5000)
+        adb = AsyncDatabaseManager(db)
+        
+        async def _carregar_dados():
+            return await asyncio.gather(
+                adb.run(insights_service.obter_valor_restante_mensal, user_id),
+                adb.run(insights_service.sugerir_otimizacoes, user_id),
+                adb.run(insights_service.detectar_alertas_financeiros, user_id),
+                # Buscar últimas 15 transações de extrato e fatura separadamente
+                adb.run(transacao_service.listar_transacoes_usuario, usuario, limite=5000)
+            )
+        
+        saldo_info, sugestoes, alertas, df_todas = asyncio.run(_carregar_dados())
         if 'origem' in df_todas.columns:
             df_todas['origem'] = df_todas['origem'].astype(str)
         if 'data' in df_todas.columns:
@@ -759,9 +764,7 @@ def exibir_grid_insights_personalizados(usuario):
         if forcar_regeneracao:
             st.session_state['forcar_regeneracao_insights'] = False
         
-        # Gerar insights usando cache inteligente
-        insights = []
-        
+        # Contextos e prompts de cada insight
         # Insight 1: Saldo do mês
         contexto_saldo = {
             'personalidade': personalidade_sel,
@@ -771,27 +774,6 @@ def exibir_grid_insights_personalizados(usuario):
         }
         prompt_saldo = "Analise o saldo do mês de forma personalizada, considerando o perfil da IA. Cite o valor de forma objetiva, em até 250 caracteres. NÃO inclua saudações como 'Olá' ou cumprimentos."
         
-        insight_saldo = cache_service.gerar_insight_com_cache(
-            user_id=user_id,
-            insight_type='saldo_mensal',
-            personalidade=personalidade_sel,
-            data_context=contexto_saldo,
-            prompt=prompt_saldo,
-            personalidade_params=params or {},
-            forcar_regeneracao=forcar_regeneracao
-        )
-        
-        insights.append({
-            'tipo': 'neutro' if saldo_info['valor_restante'] >= 0 else 'negativo',
-            'titulo': insight_saldo['titulo'],
-            'valor': insight_saldo['valor'],
-            'comentario': insight_saldo['comentario'][:250] + ('...' if len(insight_saldo['comentario']) > 250 else ''),
-            'assinatura': nome_ia,
-            'avatar': avatar_path,
-            'saudacao': None,
-            'cache_info': f"Cache: {insight_saldo['source']}" if st.session_state.get('modo_depurador') else None
-        })
-        
         # Insight 2: Maior gasto
         maior_gasto = None
         if isinstance(ultimas_extrato, pd.DataFrame) and not ultimas_extrato.empty and 'valor' in ultimas_extrato.columns:
@@ -811,15 +793,79 @@ def exibir_grid_insights_personalizados(usuario):
         }
         prompt_maior_gasto = "Analise de forma personalizada qual foi o maior gasto recente, citando categoria, valor e contexto de forma objetiva, em até 250 caracteres. NÃO inclua saudações como 'Olá' ou cumprimentos."
         
-        insight_maior_gasto = cache_service.gerar_insight_com_cache(
-            user_id=user_id,
-            insight_type='maior_gasto',
-            personalidade=personalidade_sel,
-            data_context=contexto_maior_gasto,
-            prompt=prompt_maior_gasto,
-            personalidade_params=params or {},
-            forcar_regeneracao=forcar_regeneracao
-        )
+        # Insight 3: Economia potencial
+        economia_potencial = sugestoes[0] if sugestoes else None
+        contexto_economia = {
+            'personalidade': personalidade_sel,
+            'sugestao': economia_potencial,
+            'usuario': user_data
+        }
+        prompt_economia = "Analise e sugira de forma personalizada uma economia potencial para o usuário, citando categoria e valor de forma objetiva, em até 250 caracteres. NÃO inclua saudações como 'Olá' ou cumprimentos."
+        
+        # Insight 4: Alerta de gastos
+        alerta = alertas[0] if alertas else None
+        contexto_alerta = {
+            'personalidade': personalidade_sel,
+            'alerta': alerta,
+            'ultimas_transacoes': ultimas_fatura.to_dict('records') if isinstance(ultimas_fatura, pd.DataFrame) and not ultimas_fatura.empty else [],
+            'usuario': user_data
+        }
+        prompt_alerta = "Analise e alerte de forma personalizada sobre gastos, citando o motivo e recomendação de forma objetiva, em até 250 caracteres. NÃO inclua saudações como 'Olá' ou cumprimentos."
+        
+        # Gerar os 4 insights em paralelo (cache no banco, LLM em threads próprias)
+        async def _gerar_insights():
+            return await asyncio.gather(
+                cache_service.gerar_insight_com_cache_async(
+                    user_id=user_id,
+                    insight_type='saldo_mensal',
+                    personalidade=personalidade_sel,
+                    data_context=contexto_saldo,
+                    prompt=prompt_saldo,
+                    personalidade_params=params or {},
+                    forcar_regeneracao=forcar_regeneracao
+                ),
+                cache_service.gerar_insight_com_cache_async(
+                    user_id=user_id,
+                    insight_type='maior_gasto',
+                    personalidade=personalidade_sel,
+                    data_context=contexto_maior_gasto,
+                    prompt=prompt_maior_gasto,
+                    personalidade_params=params or {},
+                    forcar_regeneracao=forcar_regeneracao
+                ),
+                cache_service.gerar_insight_com_cache_async(
+                    user_id=user_id,
+                    insight_type='economia_potencial',
+                    personalidade=personalidade_sel,
+                    data_context=contexto_economia,
+                    prompt=prompt_economia,
+                    personalidade_params=params or {},
+                    forcar_regeneracao=forcar_regeneracao
+                ),
+                cache_service.gerar_insight_com_cache_async(
+                    user_id=user_id,
+                    insight_type='alerta_gastos',
+                    personalidade=personalidade_sel,
+                    data_context=contexto_alerta,
+                    prompt=prompt_alerta,
+                    personalidade_params=params or {},
+                    forcar_regeneracao=forcar_regeneracao
+                )
+            )
+        
+        insight_saldo, insight_maior_gasto, insight_economia, insight_alerta = asyncio.run(_gerar_insights())
+        
+        insights = []
+        insights.append({
+            'tipo': 'neutro' if saldo_info['valor_restante'] >= 0 else 'negativo',
+            'titulo': insight_saldo['titulo'],
+            'valor': insight_saldo['valor'],
+            'comentario': insight_saldo['comentario'][:250] + ('...' if len(insight_saldo['comentario']) > 250 else ''),
+            'assinatura': nome_ia,
+            'avatar': avatar_path,
+            'saudacao': None,
+            'cache_info': f"Cache: {insight_saldo['source']}" if st.session_state.get('modo_depurador') else None
+        })
         
         insights.append({
             'tipo': 'negativo',
@@ -832,25 +878,6 @@ def exibir_grid_insights_personalizados(usuario):
             'cache_info': f"Cache: {insight_maior_gasto['source']}" if st.session_state.get('modo_depurador') else None
         })
         
-        # Insight 3: Economia potencial
-        economia_potencial = sugestoes[0] if sugestoes else None
-        contexto_economia = {
-            'personalidade': personalidade_sel,
-            'sugestao': economia_potencial,
-            'usuario': user_data
-        }
-        prompt_economia = "Analise e sugira de forma personalizada uma economia potencial para o usuário, citando categoria e valor de forma objetiva, em até 250 caracteres. NÃO inclua saudações como 'Olá' ou cumprimentos."
-        
-        insight_economia = cache_service.gerar_insight_com_cache(
-            user_id=user_id,
-            insight_type='economia_potencial',
-            personalidade=personalidade_sel,
-            data_context=contexto_economia,
-            prompt=prompt_economia,
-            personalidade_params=params or {},
-            forcar_regeneracao=forcar_regeneracao
-        )
-        
         insights.append({
             'tipo': 'positivo',
             'titulo': insight_economia['titulo'],
@@ -862,26 +889,6 @@ def exibir_grid_insights_personalizados(usuario):
             'cache_info': f"Cache: {insight_economia['source']}" if st.session_state.get('modo_depurador') else None
         })
         
-        # Insight 4: Alerta de gastos
-        alerta = alertas[0] if alertas else None
-        contexto_alerta = {
-            'personalidade': personalidade_sel,
-            'alerta': alerta,
-            'ultimas_transacoes': ultimas_fatura.to_dict('records') if isinstance(ultimas_fatura, pd.DataFrame) and not ultimas_fatura.empty else [],
-            'usuario': user_data
-        }
-        prompt_alerta = "Analise e alerte de forma personalizada sobre gastos, citando o motivo e recomendação de forma objetiva, em até 250 caracteres. NÃO inclua saudações como 'Olá' ou cumprimentos."
-        
-        insight_alerta = cache_service.gerar_insight_com_cache(
-            user_id=user_id,
-            insight_type='alerta_gastos',
-            personalidade=personalidade_sel,
-            data_context=contexto_alerta,
-            prompt=prompt_alerta,
-            personalidade_params=params or {},
-            forcar_regeneracao=forcar_regeneracao
-        )
-        
         insights.append({
             'tipo': 'alerta',
             'titulo': insight_alerta['titulo'],
@@ -978,7 +985,7 @@ with st.expander("📊 Gráficos por Categoria", expanded=False):
         if not df.empty and 'categoria' in df.columns:
             df_despesas = df.loc[df['valor'] < 0].copy()
             if not df_despesas.empty:
-                gastos_categoria = df_despesas.groupby('categoria')['valor'].sum().abs().sort_values(ascending=False)
+                gastos_categoria = df_despesas.groupby('categoria', observed=True)['valor'].sum().abs().sort_values(ascending=False)
                 
                 fig_cat = px.pie(
                     values=gastos_categoria.values,
@@ -992,7 +999,7 @@ with st.expander("📊 Gráficos por Categoria", expanded=False):
         if not df.empty and 'categoria' in df.columns:
             df_receitas = df.loc[df['valor'] > 0].copy()
             if not df_receitas.empty:
-                receitas_categoria = df_receitas.groupby('categoria')['valor'].sum().sort_values(ascending=False)
+                receitas_categoria = df_receitas.groupby('categoria', observed=True)['valor'].sum().sort_values(ascending=False)
                 
                 fig_receitas = px.pie(
                     values=receitas_categoria.values,
@@ -1,6 +1,6 @@
 import streamlit as st
 import os
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
 from utils.repositories_v2 import PersonalidadeIARepository
 
 def render_personality_selector():
@@ -11,11 +11,11 @@ def render_personality_selector():
         if 'usuario' in st.session_state:
             from utils.repositories_v2 import UsuarioRepository
             usuario = st.session_state['usuario']
-            db = DatabaseManager()
+            db = get_database_manager()
             usuario_repo = UsuarioRepository(db)
             user_data = usuario_repo.obter_usuario_por_username(usuario)
             user_id = user_data['id'] if user_data else None
-        personalidade_repo = PersonalidadeIARepository(DatabaseManager())
+        personalidade_repo = PersonalidadeIARepository(get_database_manager())
         # Perfis padrão
         NOMES_PADRAO = {'clara': 'Ana', 'tecnica': 'Fernando', 'durona': 'Jorge'}
         personalidade_opcoes = {
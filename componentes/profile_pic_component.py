@@ -8,7 +8,7 @@ import functools
 
 # Imports Backend V2
 from utils.repositories_v2 import UsuarioRepository
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
 from utils.config import PROFILE_PICS_DIR
 
 # Cache para imagens de perfil para evitar carregamentos repetidos
@@ -19,7 +19,7 @@ _profile_pic_cache = {}
 def get_user_data_cached(username):
     """Obtém dados do usuário com cache usando Backend V2"""
     try:
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         user_repo = UsuarioRepository(db_manager)
         return user_repo.obter_usuario_por_username(username)
     except:
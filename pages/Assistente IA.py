@@ -6,6 +6,7 @@ Assistente virtual que responde perguntas financeiras inteligentemente
 import streamlit as st
 from datetime import datetime
 import time
+import asyncio
 import pandas as pd
 from typing import Optional
 import json
@@ -15,7 +16,7 @@ import uuid
 from utils.auth import verificar_autenticacao
 from services.ai_assistant_service import FinancialAIAssistant
 from services.ai_categorization_service import AICategorization
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
 from utils.repositories_v2 import UsuarioRepository, TransacaoRepository, PersonalidadeIARepository
 from utils.filtros import filtro_data
 from componentes.profile_pic_component import get_profile_pic_path
@@ -36,7 +37,7 @@ def obter_user_id_do_usuario():
         username = st.session_state['usuario']
         
         # Obter user_id do banco
-        db = DatabaseManager()
+        db = get_database_manager()
         usuario_repo = UsuarioRepository(db)
         user_data = usuario_repo.obter_usuario_por_username(username)
         
@@ -50,7 +51,7 @@ def render_chat_interface(user_id: int):
     """Renderiza a interface de chat"""
     try:
         # Inicializar variáveis de perfil e repositório no início da função
-        personalidade_repo = PersonalidadeIARepository(DatabaseManager())
+        personalidade_repo = PersonalidadeIARepository(get_database_manager())
         perfil_nome_amigavel = "Clara e Acolhedora"
         perfil_nome_tecnico = "Técnico e Formal"
         perfil_nome_durao = "Durão e Informal"
@@ -290,7 +291,7 @@ def render_chat_interface(user_id: int):
                                 'foco': 'Motivacional'
                             }
                         # Carregar nomes customizados do banco ou usar padrão
-                        personalidade_repo = PersonalidadeIARepository(DatabaseManager())
+                        personalidade_repo = PersonalidadeIARepository(get_database_manager())
                         def get_nome_customizado(user_id, nome_perfil, chave):
                             dados = personalidade_repo.obter_personalidade(user_id, nome_perfil)
                             if dados and dados.get('nome_customizado'):
@@ -351,7 +352,7 @@ def render_chat_interface(user_id: int):
                             submit = st.form_submit_button("Salvar alterações")
                             if submit and not nome_invalido:
                                 print(f"[DEBUG] Valor de emojis selecionado no formulário (amigável): {emojis}")
-                                personalidade_repo = PersonalidadeIARepository(DatabaseManager())
+                                personalidade_repo = PersonalidadeIARepository(get_database_manager())
                                 emojis_valor = emojis if emojis else 'Nenhum'
                                 print(f"[DEBUG] Valor de emojis salvo no session_state (amigável): {emojis_valor}")
                                 dados_amigavel = {
@@ -489,7 +490,7 @@ def render_chat_interface(user_id: int):
                             submit = st.form_submit_button("Salvar alterações")
                             if submit and not nome_invalido:
                                 print(f"[DEBUG] Valor de emojis selecionado no formulário (técnico): {emojis}")
-                                personalidade_repo = PersonalidadeIARepository(DatabaseManager())
+                                personalidade_repo = PersonalidadeIARepository(get_database_manager())
                                 emojis_valor = emojis if emojis else 'Nenhum'
                                 print(f"[DEBUG] Valor de emojis salvo no session_state (técnico): {emojis_valor}")
                                 dados_tecnico = {
@@ -626,7 +627,7 @@ def render_chat_interface(user_id: int):
                             submit = st.form_submit_button("Salvar alterações")
                             if submit and not nome_invalido:
                                 print(f"[DEBUG] Valor de emojis selecionado no formulário (durona): {emojis}")
-                                personalidade_repo = PersonalidadeIARepository(DatabaseManager())
+                                personalidade_repo = PersonalidadeIARepository(get_database_manager())
                                 emojis_valor = emojis if emojis else 'Nenhum'
                                 print(f"[DEBUG] Valor de emojis salvo no session_state (durona): {emojis_valor}")
                                 dados_durao = {
@@ -663,7 +664,7 @@ def render_chat_interface(user_id: int):
             # --- Listagem de Perfis Customizados ---
             st.markdown("---")
             st.markdown("#### 👤 Perfis Customizados Criados por Você")
-            personalidade_repo = PersonalidadeIARepository(DatabaseManager())
+            personalidade_repo = PersonalidadeIARepository(get_database_manager())
             perfis_customizados = []
             if 'perfis_customizados' in st.session_state and st.session_state['perfis_customizados']:
                 perfis_customizados = [p for p in st.session_state['perfis_customizados'] if p.get('tipo') == 'customizado']
@@ -952,7 +953,7 @@ def render_chat_interface(user_id: int):
                     if not idioma or not amigavel or not formalidade or not uso_emojis or not tom or not foco:
                         erros.append("Preencha todos os campos obrigatórios da seção 'Básico'.")
                     # Limite de perfis customizados
-                    personalidade_repo = PersonalidadeIARepository(DatabaseManager())
+                    personalidade_repo = PersonalidadeIARepository(get_database_manager())
                     perfis_customizados = [p for p in personalidade_repo.listar_personalidades_usuario(user_id) if p.get('tipo') == 'customizado']
                     if len(perfis_customizados) >= 3:
                         erros.append("Limite de 3 perfis customizados atingido. Exclua um perfil para criar outro.")
@@ -1046,7 +1047,7 @@ def process_user_message(user_id: int, message: str):
         if user_id is None:
             st.error("Usuário inválido. Não foi possível processar a mensagem.")
             return
-        personalidade_repo = PersonalidadeIARepository(DatabaseManager())
+        personalidade_repo = PersonalidadeIARepository(get_database_manager())
         st.session_state.chat_history.append({
             'role': 'user',
             'content': message,
@@ -1138,9 +1139,10 @@ def process_user_message(user_id: int, message: str):
             context = {'nome_ia': nome_ia}
             st.session_state['last_context'] = context
 
-            response_data = st.session_state.ai_assistant.process_message_with_personality(
+            # Contexto buscado com consultas em paralelo antes da chamada ao LLM
+            response_data = asyncio.run(st.session_state.ai_assistant.process_message_with_personality_async(
                 user_id, message, personalidade, data_inicio, data_fim, qtd_transacoes, prompt_customizado
-            )
+            ))
             response = response_data['response']
             print(f"[DEBUG] Resposta da IA: {response}")
         st.session_state.chat_history.append({
@@ -1349,7 +1351,7 @@ def render_personality_selector():
     """Renderiza o seletor de personalidade da IA"""
     try:
         user_id = obter_user_id_do_usuario() if 'obter_user_id_do_usuario' in globals() else None
-        personalidade_repo = PersonalidadeIARepository(DatabaseManager())
+        personalidade_repo = PersonalidadeIARepository(get_database_manager())
         # Perfis padrão
         personalidade_opcoes = {
             "clara": "🌟 Mais clara, acolhedora e engraçada",
@@ -1480,7 +1482,7 @@ def main():
         
         # --- Filtro de período na sidebar ---
         st.sidebar.header("🗓️ Período de Referência para a IA")
-        db = DatabaseManager()
+        db = get_database_manager()
         transacao_repo = TransacaoRepository(db)
         df_transacoes = transacao_repo.obter_transacoes_periodo(user_id, '1900-01-01', '2100-12-31')
         if not df_transacoes.empty:
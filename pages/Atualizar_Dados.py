@@ -6,7 +6,7 @@ from datetime import datetime
 
 # Imports Backend V2
 from utils.repositories_v2 import UsuarioRepository, TransacaoRepository
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
 from services.transacao_service_v2 import TransacaoService
 from utils.auth import verificar_autenticacao
 from utils.user_data_manager import UserDataManager
@@ -29,7 +29,7 @@ def handle_upload_v2(files, tipo_arquivo, usuario):
     """Processa upload de arquivos OFX usando Backend V2 - VERSÃO MELHORADA"""
     try:
         # Inicializar repositórios
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         usuario_repo = UsuarioRepository(db_manager)
         transacao_repo = TransacaoRepository(db_manager)        # Verificar se usuário existe
         user_data = usuario_repo.obter_usuario_por_username(usuario)
@@ -106,12 +106,12 @@ def handle_upload_v2(files, tipo_arquivo, usuario):
                         # 4. Inserir transações em lote (mais eficiente)
                         if transacoes_para_inserir:
                             try:
-                                transacao_repo.criar_transacoes_lote(
+                                resultado = transacao_repo.importar_transacoes_em_massa(
                                     user_id=user_id,
                                     transacoes=transacoes_para_inserir
                                 )
                                 
-                                total_transacoes += len(transacoes_para_inserir)
+                                total_transacoes += resultado['inseridas']
                                 
                             except Exception as e:
                                 # Fallback: inserir uma por uma
@@ -169,7 +169,7 @@ def remover_arquivo_e_transacoes(arquivo: str, diretorio: Path, usuario: str) ->
     """Remove um arquivo e suas transações associadas do banco de dados"""
     try:
         # Inicializar repositórios
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         usuario_repo = UsuarioRepository(db_manager)
         transacao_repo = TransacaoRepository(db_manager)
         
@@ -3,7 +3,7 @@ import os
 
 # Imports Backend V2
 from utils.repositories_v2 import UsuarioRepository
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
 from utils.config import PROFILE_PICS_DIR
 from security.auth.authentication import SecureAuthentication
 try:
@@ -41,7 +41,7 @@ apply_page_security('public')
 os.makedirs(PROFILE_PICS_DIR, exist_ok=True)
 
 # Inicializar Backend V2 e componentes de segurança
-db_manager = DatabaseManager()
+db_manager = get_database_manager()
 rate_limiter = RateLimiter()
 validator = InputValidator()
 logger = SecurityLogger()
@@ -16,13 +16,13 @@ import plotly.express as px
 from datetime import date, timedelta, datetime
 import json
 import os
-import hashlib
 import time
 import sys
 
 from componentes.profile_pic_component import boas_vindas_com_foto
 from utils.formatacao import formatar_valor_monetario, formatar_df_monetario
 from utils.filtros import filtro_data
+from utils.hash_transacao import gerar_hashes_df, atualizar_chaves_legadas
 from utils.config import (
     get_cache_categorias_file,
     get_descricoes_personalizadas_file,
@@ -37,7 +37,7 @@ from services.llm_service import LLMService
 from services.insights_service_v2 import InsightsServiceV2
 
 # BACKEND V2 OBRIGATÓRIO - Importações exclusivas
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
 from utils.repositories_v2 import TransacaoRepository, UsuarioRepository, CategoriaRepository
 from services.transacao_service_v2 import TransacaoService
 
@@ -57,7 +57,7 @@ verificar_autenticacao()
 def init_backend_v2_cartao():
     """Inicializa o Backend V2 para a página de Cartão"""
     try:
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         transacao_repo = TransacaoRepository(db_manager)
         usuario_repo = UsuarioRepository(db_manager)
         categoria_repo = CategoriaRepository(db_manager)
@@ -77,12 +77,9 @@ def init_backend_v2_cartao():
 backend_v2 = init_backend_v2_cartao()
 
 # Funções para sincronização com personalizações do usuário
-def gerar_hash_transacao(row):
-    """Gera um hash único para identificar uma transação de forma consistente"""
-    # Usar data, descrição e valor para criar um identificador único
-    data_str = row["Data"].strftime("%Y-%m-%d") if hasattr(row["Data"], 'strftime') else str(row["Data"])
-    chave = f"{data_str}|{row['Descrição']}|{row['Valor']}"
-    return hashlib.md5(chave.encode()).hexdigest()
+def gerar_hashes_transacoes(df):
+    """Hashes de identificação das linhas do DataFrame (Data, Descrição, Valor)"""
+    return gerar_hashes_df(df, 'Data', 'Descrição', 'Valor')
 
 def carregar_cache_categorias():
     """Carrega o cache de categorizações personalizadas do usuário"""
@@ -126,12 +123,10 @@ def filtrar_transacoes_excluidas(df):
     if not transacoes_excluidas:
         return df
     
-    # Aplicar filtro
-    def nao_esta_excluida(row):
-        hash_transacao = gerar_hash_transacao(row)
-        return hash_transacao not in transacoes_excluidas
-    
-    df_filtrado = df[df.apply(nao_esta_excluida, axis=1)]
+    # Aplicar filtro (arquivos antigos guardam o hash MD5 anterior)
+    hashes = gerar_hashes_transacoes(df)
+    transacoes_excluidas, _ = atualizar_chaves_legadas(transacoes_excluidas, df, hashes)
+    df_filtrado = df[~hashes.isin(set(transacoes_excluidas))]
     return df_filtrado
 
 def aplicar_personalizacoes_usuario(df):
@@ -153,11 +148,9 @@ def aplicar_personalizacoes_usuario(df):
     # Aplicar descrições personalizadas (adicionar coluna "Nota")
     descricoes = carregar_descricoes_personalizadas()
     if descricoes:
-        def obter_descricao_personalizada(row):
-            hash_transacao = gerar_hash_transacao(row)
-            return descricoes.get(hash_transacao, "")
-        
-        df["Nota"] = df.apply(obter_descricao_personalizada, axis=1)
+        hashes = gerar_hashes_transacoes(df)
+        descricoes, _ = atualizar_chaves_legadas(descricoes, df, hashes)
+        df["Nota"] = hashes.map(descricoes).fillna("")
     else:
         df["Nota"] = ""
     
@@ -188,11 +181,7 @@ def carregar_dados_cartao_v2(usuario, dias_limite):
         df_cartao = transacao_service.listar_transacoes_cartao(usuario, dias_limite)
         
         if not df_cartao.empty:
-            # Garantir que as colunas estão no formato correto
-            df_cartao["Data"] = pd.to_datetime(df_cartao["Data"])
-            df_cartao["Valor"] = pd.to_numeric(df_cartao["Valor"], errors="coerce")
-            
-            # Remover valores nulos
+            # Data/Valor já chegam como datetime64/float; remover valores nulos
             df_cartao = df_cartao.dropna(subset=["Valor"])
             
             # Aplicar personalizações do usuário (categorias, descrições, exclusões)
@@ -223,16 +212,15 @@ df_cartao = pd.DataFrame()
 
 if not df_cartao_completo.empty and 'Data' in df_cartao_completo.columns:
     # Converter coluna de data se necessário
-    df_for_filter = df_cartao_completo.copy()
-    df_for_filter['Data'] = pd.to_datetime(df_for_filter['Data'])
+    df_for_filter = df_cartao_completo
     data_inicio, data_fim = filtro_data(df_for_filter, key_prefix="cartao")
     
     st.sidebar.success(f"📅 Período: {data_inicio} a {data_fim}")
     
     # Aplicar filtro de data aos dados do cartão
     df_cartao = df_cartao_completo[
-        (pd.to_datetime(df_cartao_completo["Data"]).dt.date >= data_inicio) & 
-        (pd.to_datetime(df_cartao_completo["Data"]).dt.date <= data_fim)
+        (df_cartao_completo["Data"].dt.date >= data_inicio) & 
+        (df_cartao_completo["Data"].dt.date <= data_fim)
     ]
     
     periodo_info = f"{data_inicio} a {data_fim}"
@@ -286,7 +274,7 @@ if st.session_state.get('modo_depurador'):
                 cache_service = InsightsCacheService()
                 
                 # Obter user_id
-                db = DatabaseManager()
+                db = get_database_manager()
                 usuario_repo = UsuarioRepository(db)
                 user_data = usuario_repo.obter_usuario_por_username(usuario)
                 user_id = user_data.get('id') if user_data else None
@@ -313,7 +301,7 @@ if st.session_state.get('modo_depurador'):
     if st.sidebar.button("⚡ Forçar Regeneração", help="Força nova chamada ao LLM sem limpar cache", key="forcar_regeneracao_cartao_btn"):
         try:
             # Obter user_id
-            db = DatabaseManager()
+            db = get_database_manager()
             usuario_repo = UsuarioRepository(db)
             user_data = usuario_repo.obter_usuario_por_username(usuario)
             user_id = user_data.get('id') if user_data else None
@@ -427,7 +415,7 @@ def exibir_grid_insights_cartao(usuario):
         from services.insights_cache_service import InsightsCacheService
         
         # Obter user_id
-        db = DatabaseManager()
+        db = get_database_manager()
         usuario_repo = UsuarioRepository(db)
         user_data = usuario_repo.obter_usuario_por_username(usuario)
         if not user_data:
@@ -847,7 +835,7 @@ with st.expander("📈 Análises do Cartão", expanded=False):
     with col1:
         # Gráfico de gastos por categoria
         if "Categoria" in df_final.columns:
-            categoria_gastos = df_final.groupby("Categoria")["Valor"].sum().reset_index()
+            categoria_gastos = df_final.groupby("Categoria", observed=True)["Valor"].sum().reset_index()
             categoria_gastos["Valor_Abs"] = categoria_gastos["Valor"].abs()
             categoria_gastos = categoria_gastos.sort_values("Valor_Abs", ascending=False)
             
@@ -8,17 +8,17 @@ import pandas as pd
 import streamlit as st
 import json
 import os
-import hashlib
 import time
 from datetime import datetime, timedelta
 import numpy as np
 
 # BACKEND V2 OBRIGATÓRIO - Importações exclusivas
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
 from utils.repositories_v2 import TransacaoRepository, UsuarioRepository
 from services.transacao_service_v2 import TransacaoService
 from utils.filtros import filtro_data, filtro_categorias, aplicar_filtros
 from utils.formatacao import formatar_valor_monetario
+from utils.hash_transacao import gerar_hash_transacao as hash_transacao_canonico, gerar_hashes_df, atualizar_chaves_legadas
 from utils.ofx_reader import OFXReader
 from utils.exception_handler import ExceptionHandler
 
@@ -42,7 +42,7 @@ verificar_autenticacao()
 def init_backend_v2_gerenciar():
     """Inicializa e retorna instâncias do Backend V2"""
     try:
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         transacao_repo = TransacaoRepository(db_manager)
         usuario_repo = UsuarioRepository(db_manager)
         transacao_service = TransacaoService()
@@ -104,12 +104,12 @@ def atualizar_categorias_lote_no_banco(usuario, mapeamento_descricoes):
         # Converter descrições para hashes usando dados reais
         mapeamento_hashes = {}
         transacoes_encontradas = 0
+        descricoes_usuario = df_user['descricao'].str.lower().str.strip() if not df_user.empty else pd.Series(dtype=object)
         
         for descricao_normalizada, categoria in mapeamento_descricoes.items():
             # Buscar transações que contenham a descrição (busca mais flexível)
             # Primeiro tenta match exato
-            mask = df_user['descricao'].str.lower().str.strip() == descricao_normalizada
-            transacoes_match = df_user[mask]
+            transacoes_match = df_user[descricoes_usuario == descricao_normalizada]
             
             # Se não encontrou com match exato, tenta busca por substring
             if transacoes_match.empty:
@@ -118,21 +118,18 @@ def atualizar_categorias_lote_no_banco(usuario, mapeamento_descricoes):
                 palavras_chave = [p.strip() for p in descricao_limpa.split() if len(p.strip()) > 2]
                 
                 if palavras_chave:
-                    # Busca por qualquer palavra-chave na descrição
-                    pattern = '|'.join(palavras_chave)
-                    mask = df_user['descricao'].str.lower().str.contains(pattern, case=False, na=False)
-                    transacoes_match = df_user[mask]
+                    # Busca por qualquer palavra-chave na descrição (índice textual no banco)
+                    transacoes_match = transacao_repo.buscar_transacoes(
+                        user_data['id'], ' '.join(palavras_chave),
+                        colunas=['descricao'],
+                        qualquer_termo=True,
+                        limite=None
+                    )
             
-            # Processar transações encontradas
-            for _, row in transacoes_match.iterrows():
-                try:
-                    data_str = str(row['data'])[:10] if isinstance(row['data'], str) else row['data'].strftime('%Y-%m-%d')
-                    hash_transacao = transacao_repo.gerar_hash_transacao(data_str, row['descricao'], float(row['valor']))
-                    mapeamento_hashes[hash_transacao] = categoria
-                    transacoes_encontradas += 1
-                except Exception as ex:
-                    st.warning(f"Erro ao processar transação {row.get('descricao', 'N/A')}: {ex}")
-                    continue
+            # Processar transações encontradas (hash gravado no banco, sem recalcular por linha)
+            if not transacoes_match.empty:
+                mapeamento_hashes.update(dict.fromkeys(transacoes_match['hash_transacao'], categoria))
+                transacoes_encontradas += len(transacoes_match)
         
         if not mapeamento_hashes:
             st.warning(f"Nenhuma transação foi encontrada no banco para as {len(mapeamento_descricoes)} descrições fornecidas")
@@ -224,15 +221,16 @@ def gerar_hash_transacao(row):
     """Gera um hash único para identificar uma transação de forma consistente"""
     # Verificar se row é um dicionário ou objeto semelhante
     if isinstance(row, dict) or hasattr(row, '__getitem__'):
-        # Usar data, descrição e valor para criar um identificador único
-        data = row["Data"]
-        data_str = data.strftime("%Y-%m-%d") if hasattr(data, 'strftime') else str(data)
-        chave = f"{data_str}|{row['Descrição']}|{row['Valor']}"
-        return hashlib.md5(chave.encode()).hexdigest()
+        # Mesma chave canônica (data, descrição, valor) usada no banco
+        return hash_transacao_canonico(row["Data"], row['Descrição'], row['Valor'])
     else:
         # Se já for um hash, retornar como está
         return str(row)
 
+def gerar_hashes_transacoes(df):
+    """Hashes de todas as linhas do DataFrame de uma vez (colunas Data, Descrição, Valor)"""
+    return gerar_hashes_df(df, 'Data', 'Descrição', 'Valor')
+
 # Função principal para carregar transações usando Backend V2
 @st.cache_data(ttl=300, show_spinner="Carregando transações...")
 def carregar_transacoes_v2(usuario, periodo_dias=365, cache_version=None):
@@ -287,10 +285,11 @@ def carregar_transacoes_v2(usuario, periodo_dias=365, cache_version=None):
             # Adicionar coluna de notas a partir de descrições personalizadas
             descricoes = carregar_descricoes_personalizadas()
             if descricoes:
-                def obter_descricao_personalizada(row):
-                    hash_transacao = gerar_hash_transacao(row)
-                    return descricoes.get(hash_transacao, "")
-                df_transacoes["Nota"] = df_transacoes.apply(obter_descricao_personalizada, axis=1)
+                hashes = gerar_hashes_transacoes(df_transacoes)
+                descricoes, migrado = atualizar_chaves_legadas(descricoes, df_transacoes, hashes)
+                if migrado:
+                    salvar_descricoes_personalizadas(descricoes)
+                df_transacoes["Nota"] = hashes.map(descricoes).fillna("")
             else:
                 df_transacoes["Nota"] = ""
             
@@ -425,12 +424,12 @@ def filtrar_transacoes_excluidas(df):
     if not transacoes_excluidas:
         return df
     
-    # Aplicar filtro
-    def nao_esta_excluida(row):
-        hash_transacao = gerar_hash_transacao(row)
-        return hash_transacao not in transacoes_excluidas
-    
-    df_filtrado = df[df.apply(nao_esta_excluida, axis=1)]
+    # Aplicar filtro (arquivos antigos guardam o hash MD5 anterior; regravados uma vez)
+    hashes = gerar_hashes_transacoes(df)
+    transacoes_excluidas, migrado = atualizar_chaves_legadas(transacoes_excluidas, df, hashes)
+    if migrado:
+        salvar_transacoes_excluidas(transacoes_excluidas)
+    df_filtrado = df[~hashes.isin(set(transacoes_excluidas))]
     return df_filtrado
 
 # Funções para gerenciar descrições personalizadas
@@ -1657,15 +1656,86 @@ def salvar_edicoes_pagina_atual(df_pagina, inicio_idx):
 # Removido: Seleção de itens por página e paginação antigos (col_pag1, col_pag2, e selectbox duplicado)
 # O bloco de paginação agora está apenas abaixo da tabela, junto ao botão Salvar todas as alterações.
 
+# Função para buscar no banco apenas a página visível (paginação por cursor)
+def filtros_pagina_transacoes():
+    """Filtros atuais no formato do TransacaoRepository (os mesmos para a página e para o total)"""
+    sinal = None
+    if tipo_selecionado in ("Receitas", "Estornos"):
+        sinal = 1
+    elif tipo_selecionado in ("Despesas", "Compras"):
+        sinal = -1
+    
+    return {
+        'data_inicio': data_inicio.strftime("%Y-%m-%d"),
+        'data_fim': data_fim.strftime("%Y-%m-%d") + " 23:59:59",
+        'categorias': categorias_selecionadas or None,
+        'origem': 'ofx_cartao' if modo_credito else 'ofx_extrato',
+        'sinal': sinal
+    }
+
+def contar_transacoes_pagina():
+    """Total de transações com os filtros atuais (COUNT(*) no banco, base do total de páginas)"""
+    try:
+        user_data = backend_v2['usuario_repo'].obter_usuario_por_username(usuario)
+        if not user_data:
+            return 0
+        return backend_v2['transacao_repo'].contar_transacoes_periodo(
+            user_id=user_data['id'], **filtros_pagina_transacoes()
+        )
+    except Exception as e:
+        st.error(f"❌ Erro ao contar transações: {e}")
+        return 0
+
+def carregar_pagina_transacoes(token, itens_pagina):
+    """Busca uma página de transações com os filtros atuais e retorna (df_pagina, token da próxima página)"""
+    try:
+        user_data = backend_v2['usuario_repo'].obter_usuario_por_username(usuario)
+        if not user_data:
+            return pd.DataFrame(), None
+        
+        df_pag, proximo = backend_v2['transacao_repo'].obter_pagina_transacoes(
+            user_id=user_data['id'],
+            tamanho_pagina=itens_pagina,
+            token=token,
+            **filtros_pagina_transacoes()
+        )
+        df_pag = df_pag.rename(columns={
+            'data': 'Data',
+            'descricao': 'Descrição',
+            'valor': 'Valor',
+            'categoria': 'Categoria',
+            'nota': 'Nota',
+            'excluida': 'Excluída'
+        })
+        df_pag['Categoria'] = df_pag['Categoria'].astype(object)
+        df_pag['Nota'] = df_pag['Nota'].fillna('')
+        return df_pag, proximo
+    except Exception as e:
+        st.error(f"❌ Erro ao carregar página de transações: {e}")
+        return pd.DataFrame(), None
+
 # Calcular paginação com base nos valores atuais
 itens_pagina = st.session_state.transacoes_itens_pagina
-pagina_atual = st.session_state.transacoes_pagina_atual
 
-total_transacoes = len(df_filtrado)
-total_paginas = (total_transacoes - 1) // itens_pagina + 1
+# Os cursores dependem dos filtros: ao mudar qualquer filtro, voltar à primeira página
+filtros_pagina = (
+    str(data_inicio), str(data_fim), tuple(sorted(categorias_selecionadas or [])),
+    tipo_selecionado, modo_credito, itens_pagina
+)
+if st.session_state.get('transacoes_filtros_pagina') != filtros_pagina:
+    st.session_state.transacoes_filtros_pagina = filtros_pagina
+    st.session_state.transacoes_cursores = [None]
+
+# transacoes_cursores[i] é o token que busca a página i + 1
+cursores = st.session_state.transacoes_cursores
+pagina_atual = len(cursores)
+st.session_state.transacoes_pagina_atual = pagina_atual
+
+# Mesmos filtros da página: o total vem do banco, não do DataFrame carregado no topo
+total_transacoes = contar_transacoes_pagina()
+total_paginas = max(1, (total_transacoes - 1) // itens_pagina + 1)
 inicio_idx = (pagina_atual - 1) * itens_pagina
-fim_idx = min(inicio_idx + itens_pagina, total_transacoes)
-df_pagina = df_filtrado.iloc[inicio_idx:fim_idx].copy() if isinstance(df_filtrado, pd.DataFrame) else pd.DataFrame(df_filtrado)
+df_pagina, token_proxima_pagina = carregar_pagina_transacoes(cursores[-1], itens_pagina)
 
 # Carregar categorias disponíveis
 categorias_disponiveis = get_todas_categorias()
@@ -1829,33 +1899,22 @@ with col_itens_pagina:
     if itens_pagina != st.session_state.transacoes_itens_pagina:
         salvar_edicoes_pagina_atual(df_pagina, inicio_idx)
         st.session_state.transacoes_itens_pagina = itens_pagina
-        st.session_state.transacoes_pagina_atual = 1
+        st.session_state.transacoes_cursores = [None]
         st.rerun()
 
 with col_pagina:
-    total_paginas = (total_transacoes - 1) // itens_pagina + 1
-    pagina_atual = st.session_state.transacoes_pagina_atual
-    pagina_atual_novo = st.selectbox(
-        "Página",
-        options=list(range(1, total_paginas + 1)),
-        index=pagina_atual - 1 if pagina_atual <= total_paginas else 0,
-        key="pagina_atual_select_paginacao"
-    )
-    if pagina_atual_novo != pagina_atual:
-        salvar_edicoes_pagina_atual(df_pagina, inicio_idx)
-        st.session_state.transacoes_pagina_atual = pagina_atual_novo
-        st.rerun()
+    st.markdown(f"Página **{pagina_atual}** de **{total_paginas}**")
 
 with col_btn_anterior:
     if st.button('◀️', key='btn_anterior_paginacao', disabled=pagina_atual <= 1, use_container_width=False):
         salvar_edicoes_pagina_atual(df_pagina, inicio_idx)
-        st.session_state.transacoes_pagina_atual = max(1, pagina_atual - 1)
+        st.session_state.transacoes_cursores = cursores[:-1]
         st.rerun()
 
 with col_btn_proxima:
-    if st.button('▶️', key='btn_proxima_paginacao', disabled=pagina_atual >= total_paginas, use_container_width=False):
+    if st.button('▶️', key='btn_proxima_paginacao', disabled=token_proxima_pagina is None, use_container_width=False):
         salvar_edicoes_pagina_atual(df_pagina, inicio_idx)
-        st.session_state.transacoes_pagina_atual = min(total_paginas, pagina_atual + 1)
+        st.session_state.transacoes_cursores = cursores + [token_proxima_pagina]
         st.rerun()
 
 # Adicionar CSS para alinhar inputs e bordas da tabela
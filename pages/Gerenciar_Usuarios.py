@@ -4,8 +4,9 @@ import logging
 from datetime import datetime
 
 # Imports Backend V2
-from utils.repositories_v2 import UsuarioRepository
-from utils.database_manager_v2 import DatabaseManager
+from utils.repositories_v2 import UsuarioRepository, invalidar_perfil_usuario
+from services.analytics_service import AnalyticsService
+from utils.database_manager_v2 import get_database_manager
 from utils.auth import verificar_autenticacao
 
 # Funções auxiliares para Backend V2
@@ -13,7 +14,7 @@ from utils.auth import verificar_autenticacao
 def listar_usuarios_ativos():
     """Lista todos os usuários ativos usando Backend V2"""
     try:
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         # Filtrar apenas usuários ativos
         result = db_manager.executar_query(
             "SELECT * FROM usuarios WHERE is_active = 1 ORDER BY username", 
@@ -28,7 +29,7 @@ def listar_usuarios_ativos():
 def listar_usuarios_inativos():
     """Lista todos os usuários inativos usando Backend V2"""
     try:
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         # Filtrar apenas usuários inativos
         result = db_manager.executar_query(
             "SELECT * FROM usuarios WHERE is_active = 0 ORDER BY username", 
@@ -42,7 +43,7 @@ def listar_usuarios_inativos():
 def get_usuario_por_nome(username, campos=None):
     """Obtém dados do usuário por nome usando Backend V2"""
     try:
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         user_repo = UsuarioRepository(db_manager)
         return user_repo.obter_usuario_por_username(username)
     except Exception as e:
@@ -52,7 +53,7 @@ def get_usuario_por_nome(username, campos=None):
 def get_user_role(user_id):
     """Obtém o papel/nível do usuário - implementação simplificada"""
     try:
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         user_repo = UsuarioRepository(db_manager)
         usuario = user_repo.obter_usuario_por_id(user_id)
         if usuario:
@@ -69,7 +70,7 @@ def get_user_role(user_id):
 def alterar_nivel_acesso(user_id, novo_nivel):
     """Altera nível de acesso do usuário - implementação Backend V2"""
     try:
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         user_repo = UsuarioRepository(db_manager)
         # Implementação simplificada - pode ser expandida conforme necessário
         # Por ora, vamos apenas registrar a operação
@@ -82,7 +83,7 @@ def alterar_nivel_acesso(user_id, novo_nivel):
 def inativar_usuario_por_id(user_id):
     """Inativa usuário por ID - marca como is_active = 0"""
     try:
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         
         # Verificar se o usuário existe antes de tentar inativar
         existing_user = db_manager.executar_query(
@@ -108,6 +109,7 @@ def inativar_usuario_por_id(user_id):
         if affected > 0:
             # Limpa o cache da lista de usuários para forçar atualização
             st.cache_data.clear()
+            invalidar_perfil_usuario(user_id=user_id, db_manager=db_manager)
             return True, f"Usuário '{username}' foi inativado com sucesso!"
         else:
             return False, "Nenhum registro foi afetado."
@@ -119,7 +121,7 @@ def inativar_usuario_por_id(user_id):
 def remover_usuario_por_id(user_id):
     """Remove usuário por ID - deleta completamente do banco de dados com CASCADE"""
     try:
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         
         # Verificar se o usuário existe antes de tentar remover
         existing_user = db_manager.executar_query(
@@ -169,6 +171,12 @@ def remover_usuario_por_id(user_id):
         if affected > 0:
             # Limpa o cache da lista de usuários para forçar atualização
             st.cache_data.clear()
+            invalidar_perfil_usuario(user_id=user_id, db_manager=db_manager)
+            # Snapshot Parquet das transações (relatórios via DuckDB) também sai do disco
+            try:
+                AnalyticsService(db_manager).invalidar_snapshot(user_id)
+            except OSError as e:
+                logging.warning(f"Erro ao remover snapshot analítico do usuário {user_id}: {e}")
             msg = f"Usuário '{username}' foi removido permanentemente!"
             if total_removidos > 0:
                 msg += f" ({total_removidos} registros relacionados também foram removidos)"
@@ -183,7 +191,7 @@ def remover_usuario_por_id(user_id):
 def reativar_usuario_por_id(user_id):
     """Reativa usuário por ID - marca como is_active = 1"""
     try:
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         
         # Verificar se o usuário existe antes de tentar reativar
         existing_user = db_manager.executar_query(
@@ -209,6 +217,7 @@ def reativar_usuario_por_id(user_id):
         if affected > 0:
             # Limpa o cache da lista de usuários para forçar atualização
             st.cache_data.clear()
+            invalidar_perfil_usuario(user_id=user_id, db_manager=db_manager)
             return True, f"Usuário '{username}' foi reativado com sucesso!"
         else:
             return False, "Nenhum registro foi afetado."
@@ -19,7 +19,7 @@ if 'authenticated' not in st.session_state or not st.session_state['authenticate
     st.stop()
 
 # Importações do sistema
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
 from utils.repositories_v2 import UsuarioRepository
 from services.insights_service_v2 import InsightsServiceV2
 from componentes.insights_dashboard import exibir_insights_dashboard
@@ -33,7 +33,7 @@ usuario = st.session_state.get('usuario', 'default')
 def obter_user_id(usuario):
     """Obtém o ID do usuário a partir do username"""
     try:
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         usuario_repo = UsuarioRepository(db_manager)
         user_data = usuario_repo.obter_usuario_por_username(usuario)
         return user_data['id'] if user_data else None
@@ -7,7 +7,7 @@ import time
 # Imports Backend V2
 from componentes.profile_pic_component import boas_vindas_com_foto
 from utils.repositories_v2 import UsuarioRepository, TransacaoRepository, CompromissoRepository, MetaEconomiaRepository
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
 from utils.auth import verificar_autenticacao
 from utils.formatacao import formatar_valor_monetario, formatar_df_monetario
 from utils.exception_handler import ExceptionHandler
@@ -113,7 +113,7 @@ def carregar_categorias_usuario(usuario, cache_version=None):
         
         # 3. CATEGORIAS DAS TRANSAÇÕES EXISTENTES
         try:
-            db_manager = DatabaseManager()
+            db_manager = get_database_manager()
             user_repo = UsuarioRepository(db_manager)
             transacao_repo = TransacaoRepository(db_manager)
             
@@ -203,7 +203,7 @@ def exibir_grid_insights_metas(usuario):
     """Exibe insights personalizados específicos para metas e compromissos com cache ultra-estável"""
     try:
         # Obter user_id
-        db = DatabaseManager()
+        db = get_database_manager()
         usuario_repo = UsuarioRepository(db)
         user_data = usuario_repo.obter_usuario_por_username(usuario)
         if not user_data:
@@ -703,9 +703,9 @@ def exibir_grid_insights_metas(usuario):
                                                                 st.success(f"✅ Cache de teste criado com ID: {test_cache_id}")
                                                                 
                                                                 # Remover cache de teste
-                                                                cache_service.cache_repo.db.executar_query(
-                                                                    "DELETE FROM cache_insights_llm WHERE id = ?",
-                                                                    [test_cache_id]
+                                                                cache_service.cache_repo.db.executar_update(
+                                                                    "DELETE FROM cache_insights_llm WHERE id = ? AND user_id = ?",
+                                                                    [test_cache_id, user_id]
                                                                 )
                                                                 st.info("🗑️ Cache de teste removido")
                                                             else:
@@ -836,7 +836,7 @@ def exibir_grid_insights_metas(usuario):
 usuario = st.session_state.get('usuario', 'default')
 
 try:
-    db_manager = DatabaseManager()
+    db_manager = get_database_manager()
     user_repo = UsuarioRepository(db_manager)
     compromisso_repo = CompromissoRepository(db_manager)
     
@@ -7,7 +7,7 @@ import hashlib
 # Imports Backend V2
 from componentes.profile_pic_component import boas_vindas_com_foto
 from utils.repositories_v2 import UsuarioRepository, TransacaoRepository
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
 from services.transacao_service_v2 import TransacaoService
 from utils.auth import verificar_autenticacao
 from utils.formatacao import formatar_valor_monetario, formatar_df_monetario, calcular_resumo_financeiro
@@ -34,7 +34,7 @@ def carregar_dados_economias(usuario):
     def _carregar_dados():
         try:
             # Inicializar Backend V2
-            db_manager = DatabaseManager()
+            db_manager = get_database_manager()
             user_repo = UsuarioRepository(db_manager)
             transacao_repo = TransacaoRepository(db_manager)
             
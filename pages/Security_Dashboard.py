@@ -1,10 +1,12 @@
 import streamlit as st
 from datetime import datetime
 import pandas as pd
+import json
 
 # Imports Backend V2
 from utils.repositories_v2 import UsuarioRepository
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
+from utils.database_monitoring import QueryPlanAuditor
 from utils.auth import verificar_autenticacao
 
 # Configuração da página
@@ -27,7 +29,7 @@ def main():
         st.stop()
     
     try:
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         user_repo = UsuarioRepository(db_manager)
         user_data = user_repo.obter_usuario_por_username(usuario)
         
@@ -106,6 +108,68 @@ def main():
     
     st.markdown("---")
     
+    # Latência das queries medida pelo DatabaseManager
+    st.subheader("⏱️ Performance do Banco de Dados")
+    
+    latencia = db_manager._query_metrics.totals()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Queries executadas", latencia['queries'])
+    col2.metric("Latência p50", f"{latencia['p50_ms']:.2f} ms")
+    col3.metric("Latência p95", f"{latencia['p95_ms']:.2f} ms")
+    col4.metric("Latência p99", f"{latencia['p99_ms']:.2f} ms")
+    
+    metricas_queries = db_manager.obter_metricas_queries(limite=20, ordenar_por='total_ms')
+    if metricas_queries:
+        df_queries = pd.DataFrame(metricas_queries)[[
+            'query', 'count', 'cache_hits', 'avg_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'avg_rows', 'errors'
+        ]]
+        st.dataframe(df_queries, use_container_width=True, hide_index=True)
+    else:
+        st.info("Nenhuma query registrada desde a inicialização.")
+
+    # Auditoria dos planos de execução do workload capturado
+    with st.expander("🧭 Auditoria de Planos de Execução e Índices"):
+        workload = db_manager.obter_metricas_queries(limite=None, ordenar_por='total_ms')
+        st.download_button(
+            "⬇️ Exportar workload (JSON)",
+            data=json.dumps(workload, ensure_ascii=False, indent=2),
+            file_name=f"workload_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            mime="application/json",
+            help="Use com scripts/auditar_queries.py --workload"
+        )
+
+        if st.button("🔍 Auditar queries"):
+            relatorio = QueryPlanAuditor(db_manager).audit(workload)
+            st.caption(
+                f"{relatorio['queries_analyzed']} queries analisadas, "
+                f"{relatorio['queries_skipped']} ignoradas"
+            )
+
+            if relatorio['recommendations']:
+                st.markdown("**💡 Índices recomendados**")
+                df_rec = pd.DataFrame(relatorio['recommendations'])
+                df_rec['queries'] = df_rec['queries'].apply(len)
+                st.dataframe(
+                    df_rec[['sql', 'kind', 'estimated_benefit_ms', 'estimated_rows_avoided', 'queries']],
+                    use_container_width=True, hide_index=True
+                )
+            else:
+                st.success("Nenhuma recomendação de índice para o workload atual.")
+
+            if relatorio['findings']:
+                st.markdown("**⚠️ Varreduras e ordenações temporárias**")
+                st.dataframe(
+                    pd.DataFrame(relatorio['findings'])[['type', 'table', 'detail', 'count', 'total_ms', 'query']],
+                    use_container_width=True, hide_index=True
+                )
+
+            if relatorio['unused_indexes']:
+                st.markdown("**🗑️ Índices não usados no workload**")
+                st.dataframe(pd.DataFrame(relatorio['unused_indexes']), use_container_width=True, hide_index=True)
+                st.caption(relatorio['note'])
+
+    st.markdown("---")
+    
     # Logs de segurança (versão simplificada)
     st.subheader("📋 Logs de Segurança")
     
@@ -7,7 +7,7 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
 from datetime import datetime
 
 def adicionar_tipos_metas_cache():
@@ -15,7 +15,7 @@ def adicionar_tipos_metas_cache():
     print("🔄 Adicionando tipos de insight de metas ao constraint...")
     
     try:
-        db = DatabaseManager()
+        db = get_database_manager()
         
         # Verificar se a tabela existe
         tabelas = db.executar_query("SELECT name FROM sqlite_master WHERE type='table' AND name='cache_insights_llm'")
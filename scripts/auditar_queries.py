@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Auditoria de planos de execução (EXPLAIN QUERY PLAN) e recomendação de índices.
+
+O workload vem de um JSON exportado pelo Security Dashboard (métricas de queries do
+DatabaseManager) ou de um arquivo .sql com statements separados por ';'.
+
+Uso:
+    python scripts/auditar_queries.py --workload workload.json
+    python scripts/auditar_queries.py --sql queries.sql --db richness_v2.db --json
+"""
+
+import sys
+import os
+import json
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.database_manager_v2 import get_database_manager
+from utils.database_monitoring import QueryPlanAuditor
+
+def carregar_workload(caminho_json=None, caminho_sql=None):
+    """Lê o workload do JSON exportado ou de um arquivo SQL (cada statement conta 1 execução)"""
+    if caminho_json:
+        with open(caminho_json, encoding='utf-8') as f:
+            dados = json.load(f)
+        return dados['queries'] if isinstance(dados, dict) else dados
+
+    with open(caminho_sql, encoding='utf-8') as f:
+        statements = [s.strip() for s in f.read().split(';')]
+    return [{'query': s, 'count': 1, 'total_ms': 0.0} for s in statements if s]
+
+def imprimir_relatorio(relatorio):
+    """Imprime achados, recomendações e índices não usados"""
+    print(f"🔍 Queries analisadas: {relatorio['queries_analyzed']} "
+          f"(ignoradas: {relatorio['queries_skipped']})")
+
+    print("\n⚠️  Achados:")
+    if not relatorio['findings']:
+        print("   Nenhuma varredura completa ou B-tree temporária encontrada")
+    for achado in relatorio['findings']:
+        print(f"   [{achado['type']}] {achado['table']}: {achado['detail']}")
+        print(f"      {achado['count']}x, {achado['total_ms']:.1f} ms | {achado['query'][:100]}")
+
+    print("\n💡 Índices recomendados (maior benefício primeiro):")
+    if not relatorio['recommendations']:
+        print("   Nenhuma recomendação")
+    for i, rec in enumerate(relatorio['recommendations'], 1):
+        print(f"   {i}. {rec['sql']};")
+        print(f"      tipo: {rec['kind']} | benefício estimado: {rec['estimated_benefit_ms']:.1f} ms | "
+              f"linhas evitadas: {rec['estimated_rows_avoided']} | queries: {len(rec['queries'])}")
+
+    print("\n🗑️  Índices não usados no workload:")
+    if not relatorio['unused_indexes']:
+        print("   Nenhum")
+    for indice in relatorio['unused_indexes']:
+        print(f"   {indice['name']} ({indice['table']})")
+    print(f"\nℹ️  {relatorio['note']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Audita planos de execução e recomenda índices")
+    origem = parser.add_mutually_exclusive_group(required=True)
+    origem.add_argument('--workload', help="JSON de métricas de queries exportado pelo dashboard")
+    origem.add_argument('--sql', help="Arquivo com statements SQL separados por ';'")
+    parser.add_argument('--db', default="richness_v2.db", help="Caminho do banco (padrão: richness_v2.db)")
+    parser.add_argument('--limite', type=int, default=50, help="Máximo de queries analisadas")
+    parser.add_argument('--json', action='store_true', help="Imprime o relatório em JSON")
+    args = parser.parse_args()
+
+    try:
+        workload = carregar_workload(args.workload, args.sql)
+        db = get_database_manager(args.db)
+        relatorio = QueryPlanAuditor(db).audit(workload, limit=args.limite)
+    except Exception as e:
+        print(f"❌ Erro na auditoria: {e}")
+        return False
+
+    if args.json:
+        print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+    else:
+        imprimir_relatorio(relatorio)
+    return True
+
+if __name__ == "__main__":
+    sucesso = main()
+    sys.exit(0 if sucesso else 1)
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Converte um banco existente para auto_vacuum=INCREMENTAL.
+
+A conversão é um VACUUM completo: bloqueia leituras e escritas enquanto reescreve o
+arquivo e precisa de espaço livre próximo ao tamanho do banco. A manutenção noturna
+só a faz sozinha em bancos pequenos; use este script (com a aplicação parada) nos demais.
+
+Uso:
+    python scripts/migrar_auto_vacuum.py --db richness_v2.db
+    python scripts/migrar_auto_vacuum.py --db richness_v2.db --limite-mb 2048
+"""
+
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.database_manager_v2 import get_database_manager
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra o banco para auto_vacuum=INCREMENTAL")
+    parser.add_argument('--db', default="richness_v2.db", help="Caminho do banco (padrão: richness_v2.db)")
+    parser.add_argument('--limite-mb', type=float, default=None,
+                        help="Não migra bancos maiores que isso (padrão: sem limite)")
+    args = parser.parse_args()
+
+    try:
+        db = get_database_manager(args.db)
+        resultado = db.migrar_auto_vacuum(limite_mb=args.limite_mb)
+    except Exception as e:
+        print(f"❌ Erro na migração: {e}")
+        return False
+
+    if resultado['executado']:
+        print(f"✅ auto_vacuum=INCREMENTAL aplicado em {resultado['duracao_s']}s ({resultado['tamanho_mb']} MB)")
+    else:
+        print(f"ℹ️  Migração não executada: {resultado['motivo']}")
+    return True
+
+if __name__ == "__main__":
+    sucesso = main()
+    sys.exit(0 if sucesso else 1)
@@ -8,14 +8,14 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
 
 def migrar_constraint_cache_insights():
     """Migra o constraint da tabela cache_insights_llm"""
     print("🔄 Migrando constraint da tabela cache_insights_llm...")
     
     try:
-        db = DatabaseManager()
+        db = get_database_manager()
         
         # Verificar se a tabela existe
         result = db.executar_query("""
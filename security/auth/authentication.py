@@ -13,7 +13,7 @@ import streamlit as st
 
 # Imports Backend V2
 from utils.repositories_v2 import UsuarioRepository
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
 from security.audit.security_logger import SecurityLogger
 from security.validation.input_validator import InputValidator
 
@@ -66,7 +66,7 @@ class SecureAuthentication:
     def __init__(self):
         self.logger = SecurityLogger()
         self.validator = InputValidator()
-        self.db_manager = DatabaseManager()
+        self.db_manager = get_database_manager()
         self.user_repo = UsuarioRepository(self.db_manager)
         
         # Configurações de segurança
@@ -119,7 +119,7 @@ class SecureAuthentication:
                 return False, "Username inválido", {}
             
             # Buscar usuário
-            user_data = self.user_repo.obter_usuario_por_username(username)
+            user_data = self.user_repo.obter_usuario_por_username(username, usar_cache=False)
             if not user_data:
                 self.logger.log_authentication_attempt(
                     username=username,
@@ -5,11 +5,12 @@ Sistema conversacional que responde perguntas financeiras baseado em dados do us
 
 from typing import Dict, List, Any, Optional
 import re
+import asyncio
 from datetime import datetime
 import json
 import pandas as pd
 
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager, AsyncDatabaseManager
 from utils.repositories_v2 import TransacaoRepository, UsuarioRepository
 from services.insights_service_v2 import InsightsServiceV2
 from services.transacao_service_v2 import TransacaoService
@@ -20,7 +21,7 @@ class FinancialAIAssistant:
     """Assistente virtual financeiro com capacidades de IA"""
     
     def __init__(self):
-        self.db = DatabaseManager()
+        self.db = get_database_manager()
         self.transacao_repo = TransacaoRepository(self.db)
         self.usuario_repo = UsuarioRepository(self.db)
         self.insights_service = InsightsServiceV2()
@@ -37,85 +38,133 @@ class FinancialAIAssistant:
             if data_inicio_str and data_fim_str:
                 # Buscar transações do período
                 df_transacoes = self.transacao_repo.obter_transacoes_periodo(user_id, data_inicio_str, data_fim_str)
-                # Adicionar todas as transações do período (limitadas)
-                if not df_transacoes.empty:
-                    transacoes_periodo = df_transacoes[['data', 'descricao', 'valor', 'categoria']].copy()
-                    if not isinstance(transacoes_periodo, pd.DataFrame):
-                        transacoes_periodo = pd.DataFrame(transacoes_periodo)
-                    transacoes_periodo['data'] = pd.to_datetime(transacoes_periodo['data'])
-                    transacoes_periodo = transacoes_periodo.sort_values('data', ascending=False).head(qtd_transacoes)
-                    context['todas_transacoes_periodo'] = transacoes_periodo.to_dict('records')
-                # Calcular receitas e gastos do período
-                receitas = df_transacoes.loc[df_transacoes['valor'] > 0, 'valor'].sum() if not df_transacoes.empty else 0
-                gastos = abs(df_transacoes.loc[df_transacoes['valor'] < 0, 'valor'].sum()) if not df_transacoes.empty else 0
-                valor_restante = receitas - gastos
-                percentual_gasto = (gastos / receitas * 100) if receitas > 0 else 0
-                context['saldo'] = {
-                    'valor_restante': valor_restante,
-                    'total_receitas': receitas,
-                    'total_gastos': gastos,
-                    'percentual_gasto': percentual_gasto,
-                    'dias_restantes': 0,
-                    'media_diaria_disponivel': 0,
-                    'status': 'positivo' if valor_restante >= 0 else 'negativo',
-                    'periodo': f'{data_inicio_str} a {data_fim_str}'
-                }
-                # Gastos por categoria
-                if not df_transacoes.empty:
-                    df_gastos = df_transacoes.loc[df_transacoes['valor'] < 0].copy()
-                    if not df_gastos.empty:
-                        df_gastos['valor_abs'] = abs(df_gastos['valor'])
-                        gastos_categoria = df_gastos.groupby('categoria')['valor_abs'].agg(['sum', 'mean', 'count']).round(2)
-                        total_gastos = gastos_categoria['sum'].sum()
-                        gastos_categoria['percentual'] = (gastos_categoria['sum'] / total_gastos * 100).round(2) if total_gastos > 0 else 0
-                        context['categorias'] = gastos_categoria.to_dict('index')
-                        context['total_gastos_periodo'] = total_gastos
-                        context['periodo_analise'] = f'{data_inicio_str} a {data_fim_str}'
-                # Últimas transações do período
-                if not df_transacoes.empty:
-                    df_transacoes = df_transacoes.sort_values('data', ascending=False).head(5)
-                    context['ultimas_transacoes'] = df_transacoes.to_dict('records')
+                self._contexto_periodo(context, df_transacoes, data_inicio_str, data_fim_str, qtd_transacoes)
             else:
                 # Fallback: usar métodos padrão (mês atual)
-                saldo_info = self.insights_service.obter_valor_restante_mensal(user_id)
-                if saldo_info:
-                    context['saldo'] = {
-                        'valor_restante': saldo_info.get('valor_restante', 0),
-                        'total_receitas': saldo_info.get('total_receitas', 0),
-                        'total_gastos': saldo_info.get('total_gastos', 0),
-                        'percentual_gasto': saldo_info.get('percentual_gasto', 0),
-                        'dias_restantes': saldo_info.get('dias_restantes', 0),
-                        'media_diaria_disponivel': saldo_info.get('media_diaria_disponivel', 0),
-                        'status': saldo_info.get('status', '')
-                    }
-                gastos_info = self.insights_service.analisar_gastos_por_categoria(user_id)
-                if gastos_info and gastos_info.get('status') == 'ok':
-                    context['categorias'] = gastos_info.get('resumo_categorias', {})
-                    context['total_gastos_periodo'] = gastos_info.get('total_periodo', 0)
-                    context['periodo_analise'] = gastos_info.get('periodo_analisado', '')
-                alertas = self.insights_service.detectar_alertas_financeiros(user_id)
-                if alertas:
-                    context['alertas'] = alertas
+                self._contexto_padrao(
+                    context,
+                    self.insights_service.obter_valor_restante_mensal(user_id),
+                    self.insights_service.analisar_gastos_por_categoria(user_id),
+                    self.insights_service.detectar_alertas_financeiros(user_id)
+                )
                 # Últimas transações padrão
                 user_data = self.usuario_repo.obter_usuario_por_id(user_id)
                 if user_data:
                     username = user_data.get('username', '')
                     df_transacoes = self.transacao_service.listar_transacoes_usuario(username)
-                    if not df_transacoes.empty:
-                        df_transacoes = df_transacoes.sort_values('data', ascending=False).head(5)
-                        context['ultimas_transacoes'] = df_transacoes.to_dict('records')
+                    self._contexto_ultimas_transacoes(context, df_transacoes)
             # Dados do usuário
-            user_data = self.usuario_repo.obter_usuario_por_id(user_id)
-            if user_data:
-                context['usuario'] = {
-                    'username': user_data.get('username', ''),
-                    'nome': user_data.get('nome', ''),
-                    'email': user_data.get('email', '')
-                }
+            self._contexto_usuario(context, self.usuario_repo.obter_usuario_por_id(user_id))
         except Exception as e:
             context['erro'] = str(e)
         return context
     
+    async def _get_user_financial_context_async(self, user_id: int, data_inicio: str = '', data_fim: str = '', qtd_transacoes: int = 50) -> Dict[str, Any]:
+        """Versão assíncrona do contexto: as consultas independentes rodam em paralelo"""
+        context = {}
+        try:
+            data_inicio_str = str(data_inicio) if data_inicio else ''
+            data_fim_str = str(data_fim) if data_fim else ''
+            if data_inicio_str and data_fim_str:
+                df_transacoes, user_data = await asyncio.gather(
+                    self.transacao_repo.obter_transacoes_periodo_async(user_id, data_inicio_str, data_fim_str),
+                    self.usuario_repo.obter_usuario_por_id_async(user_id)
+                )
+                self._contexto_periodo(context, df_transacoes, data_inicio_str, data_fim_str, qtd_transacoes)
+            else:
+                adb = AsyncDatabaseManager(self.db)
+                saldo_info, gastos_info, alertas, user_data = await asyncio.gather(
+                    adb.run(self.insights_service.obter_valor_restante_mensal, user_id),
+                    adb.run(self.insights_service.analisar_gastos_por_categoria, user_id),
+                    adb.run(self.insights_service.detectar_alertas_financeiros, user_id),
+                    self.usuario_repo.obter_usuario_por_id_async(user_id)
+                )
+                self._contexto_padrao(context, saldo_info, gastos_info, alertas)
+                if user_data:
+                    df_transacoes = await adb.run(
+                        self.transacao_service.listar_transacoes_usuario, user_data.get('username', '')
+                    )
+                    self._contexto_ultimas_transacoes(context, df_transacoes)
+            self._contexto_usuario(context, user_data)
+        except Exception as e:
+            context['erro'] = str(e)
+        return context
+    
+    def _contexto_periodo(self, context: Dict[str, Any], df_transacoes: pd.DataFrame,
+                          data_inicio_str: str, data_fim_str: str, qtd_transacoes: int):
+        """Saldo, gastos por categoria e transações do período selecionado"""
+        # Adicionar todas as transações do período (limitadas)
+        if not df_transacoes.empty:
+            transacoes_periodo = df_transacoes[['data', 'descricao', 'valor', 'categoria']].copy()
+            if not isinstance(transacoes_periodo, pd.DataFrame):
+                transacoes_periodo = pd.DataFrame(transacoes_periodo)
+            transacoes_periodo['data'] = pd.to_datetime(transacoes_periodo['data'])
+            transacoes_periodo = transacoes_periodo.sort_values('data', ascending=False).head(qtd_transacoes)
+            context['todas_transacoes_periodo'] = transacoes_periodo.to_dict('records')
+        # Calcular receitas e gastos do período
+        receitas = df_transacoes.loc[df_transacoes['valor'] > 0, 'valor'].sum() if not df_transacoes.empty else 0
+        gastos = abs(df_transacoes.loc[df_transacoes['valor'] < 0, 'valor'].sum()) if not df_transacoes.empty else 0
+        valor_restante = receitas - gastos
+        percentual_gasto = (gastos / receitas * 100) if receitas > 0 else 0
+        context['saldo'] = {
+            'valor_restante': valor_restante,
+            'total_receitas': receitas,
+            'total_gastos': gastos,
+            'percentual_gasto': percentual_gasto,
+            'dias_restantes': 0,
+            'media_diaria_disponivel': 0,
+            'status': 'positivo' if valor_restante >= 0 else 'negativo',
+            'periodo': f'{data_inicio_str} a {data_fim_str}'
+        }
+        # Gastos por categoria
+        if not df_transacoes.empty:
+            df_gastos = df_transacoes.loc[df_transacoes['valor'] < 0].copy()
+            if not df_gastos.empty:
+                df_gastos['valor_abs'] = abs(df_gastos['valor'])
+                gastos_categoria = df_gastos.groupby('categoria')['valor_abs'].agg(['sum', 'mean', 'count']).round(2)
+                total_gastos = gastos_categoria['sum'].sum()
+                gastos_categoria['percentual'] = (gastos_categoria['sum'] / total_gastos * 100).round(2) if total_gastos > 0 else 0
+                context['categorias'] = gastos_categoria.to_dict('index')
+                context['total_gastos_periodo'] = total_gastos
+                context['periodo_analise'] = f'{data_inicio_str} a {data_fim_str}'
+        # Últimas transações do período
+        self._contexto_ultimas_transacoes(context, df_transacoes)
+    
+    def _contexto_padrao(self, context: Dict[str, Any], saldo_info: Dict[str, Any],
+                         gastos_info: Dict[str, Any], alertas: List[Any]):
+        """Saldo, gastos por categoria e alertas do mês atual"""
+        if saldo_info:
+            context['saldo'] = {
+                'valor_restante': saldo_info.get('valor_restante', 0),
+                'total_receitas': saldo_info.get('total_receitas', 0),
+                'total_gastos': saldo_info.get('total_gastos', 0),
+                'percentual_gasto': saldo_info.get('percentual_gasto', 0),
+                'dias_restantes': saldo_info.get('dias_restantes', 0),
+                'media_diaria_disponivel': saldo_info.get('media_diaria_disponivel', 0),
+                'status': saldo_info.get('status', '')
+            }
+        if gastos_info and gastos_info.get('status') == 'ok':
+            context['categorias'] = gastos_info.get('resumo_categorias', {})
+            context['total_gastos_periodo'] = gastos_info.get('total_periodo', 0)
+            context['periodo_analise'] = gastos_info.get('periodo_analisado', '')
+        if alertas:
+            context['alertas'] = alertas
+    
+    def _contexto_ultimas_transacoes(self, context: Dict[str, Any], df_transacoes: pd.DataFrame):
+        """Cinco transações mais recentes"""
+        if not df_transacoes.empty:
+            df_transacoes = df_transacoes.sort_values('data', ascending=False).head(5)
+            context['ultimas_transacoes'] = df_transacoes.to_dict('records')
+    
+    def _contexto_usuario(self, context: Dict[str, Any], user_data: Optional[Dict[str, Any]]):
+        """Dados básicos do usuário"""
+        if user_data:
+            context['usuario'] = {
+                'username': user_data.get('username', ''),
+                'nome': user_data.get('nome', ''),
+                'email': user_data.get('email', '')
+            }
+    
     def process_message(self, user_id: int, message: str, data_inicio: str = '', data_fim: str = '', qtd_transacoes: int = 50) -> Dict[str, Any]:
         """Processa mensagem do usuário e gera resposta inteligente baseada nos dados do usuário, período e quantidade de transações"""
         try:
@@ -154,6 +203,23 @@ class FinancialAIAssistant:
         except Exception as e:
             raise e
 
+    async def process_message_with_personality_async(self, user_id: int, message: str, personalidade: str = "clara", data_inicio: str = '', data_fim: str = '', qtd_transacoes: int = 50, prompt_customizado: Optional[str] = None) -> Dict[str, Any]:
+        """Versão assíncrona: contexto buscado em paralelo e LLM chamado fora do event loop"""
+        data_inicio_str = str(data_inicio) if data_inicio else ''
+        data_fim_str = str(data_fim) if data_fim else ''
+        context = await self._get_user_financial_context_async(user_id, data_inicio_str, data_fim_str, qtd_transacoes)
+        context['personalidade'] = personalidade
+        if prompt_customizado:
+            context['prompt_customizado'] = prompt_customizado
+        llm_result = await asyncio.to_thread(self.llm_service.generate_response, message, context)
+        return {
+            'response': llm_result['response'],
+            'context': context,
+            'personalidade': llm_result.get('personalidade'),
+            'prompt': llm_result.get('prompt'),
+            'timestamp': datetime.now().isoformat()
+        }
+
     def get_quick_insights(self, user_id: int) -> Dict[str, Any]:
         """Retorna insights rápidos para exibição na interface"""
         try:
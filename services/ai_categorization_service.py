@@ -9,7 +9,7 @@ from datetime import datetime, date
 from collections import defaultdict, Counter
 import json
 
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
 from utils.repositories_v2 import TransacaoRepository, UsuarioRepository
 
 
@@ -17,7 +17,7 @@ class AICategorization:
     """Sistema de auto-categorização inteligente baseado em IA"""
     
     def __init__(self):
-        self.db = DatabaseManager()
+        self.db = get_database_manager()
         self.transacao_repo = TransacaoRepository(self.db)
         self.usuario_repo = UsuarioRepository(self.db)
         
@@ -121,7 +121,7 @@ class AICategorization:
         """Analisa histórico do usuário para encontrar padrões similares"""
         try:
             # Obter transações já categorizadas do usuário
-            with self.db.get_connection() as conn:
+            with self.db.get_connection(user_id) as conn:
                 query = """
                 SELECT descricao, categoria
                 FROM transacoes 
@@ -181,7 +181,7 @@ class AICategorization:
         """Analisa categoria baseada em padrões de valor do usuário"""
         try:
             # Obter distribuição de valores por categoria para o usuário
-            with self.db.get_connection() as conn:
+            with self.db.get_connection(user_id) as conn:
                 query = """
                 SELECT categoria, AVG(ABS(valor)) as media_valor, COUNT(*) as qtd
                 FROM transacoes 
@@ -217,13 +217,9 @@ class AICategorization:
     def obter_estatisticas_precisao(self, user_id: int) -> Dict[str, Any]:
         """Obtém estatísticas de precisão da categorização IA"""
         try:
-            with self.db.get_connection() as conn:
-                # Total de transações
-                cursor = conn.execute(
-                    "SELECT COUNT(*) FROM transacoes WHERE user_id = ?",
-                    (user_id,)
-                )
-                total_transacoes = cursor.fetchone()[0]
+            with self.db.get_connection(user_id) as conn:
+                # Total de transações (contador mantido por trigger)
+                total_transacoes = self.db.contar_linhas('transacoes', user_id)
                 
                 # Transações categorizadas
                 cursor = conn.execute(
@@ -274,7 +270,7 @@ class AICategorization:
     def contar_transacoes_sem_categoria(self, user_id: int) -> int:
         """Conta transações sem categoria para o usuário"""
         try:
-            with self.db.get_connection() as conn:
+            with self.db.get_connection(user_id) as conn:
                 cursor = conn.execute(
                     "SELECT COUNT(*) FROM transacoes WHERE user_id = ? AND (categoria IS NULL OR categoria = '')",
                     (user_id,)
@@ -292,7 +288,7 @@ class AICategorization:
         """Treina/atualiza o modelo de IA para um usuário específico"""
         try:
             # Obter todas as transações categorizadas do usuário para treino
-            with self.db.get_connection() as conn:
+            with self.db.get_connection(user_id) as conn:
                 cursor = conn.execute(
                     """SELECT descricao, categoria, valor 
                     FROM transacoes 
@@ -0,0 +1,316 @@
+"""
+Serviço Analítico - agregações de relatórios fora do pandas.
+
+As agregações (totais, por categoria, por mês, por semana) rodam em um motor
+colunar embarcado (DuckDB) quando ele está instalado:
+- lendo o arquivo SQLite diretamente (ATTACH somente leitura, extensão sqlite);
+- ou, se a extensão não estiver disponível, sobre um snapshot Parquet por usuário,
+  regenerado quando as transações mudam (arquivos 0600 em `<banco>_analytics/`,
+  removidos junto com o usuário).
+Sem DuckDB, a mesma agregação é executada em SQL no próprio SQLite. Em todos os
+casos só o resultado agregado chega ao Python.
+"""
+
+import os
+import json
+import logging
+import threading
+from typing import Dict, Optional, Any
+
+import pandas as pd
+
+from utils.database_manager_v2 import get_database_manager
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+class AnalyticsService:
+    """Consultas analíticas (somente leitura) sobre as transações de um usuário"""
+
+    MOTORES = ('auto', 'duckdb', 'sqlite')
+
+    # Expressões que dependem do dialeto (DuckDB recebe `data` como DATE)
+    _EXPRESSOES = {
+        'duckdb': {'mes': "strftime(data, '%Y-%m')", 'semana': "strftime(data, '%Y-%W')"},
+        'sqlite': {'mes': "substr(data, 1, 7)", 'semana': "strftime('%Y-%W', data)"},
+    }
+
+    _SQL_RESUMO = """
+        SELECT
+            COUNT(*) AS total_transacoes,
+            COALESCE(SUM(CASE WHEN valor > 0 THEN valor END), 0) AS receitas,
+            COALESCE(-SUM(CASE WHEN valor < 0 THEN valor END), 0) AS despesas,
+            COUNT(CASE WHEN valor < 0 THEN 1 END) AS qtd_despesas
+        FROM {fonte}
+    """
+
+    _SQL_CATEGORIAS = """
+        SELECT
+            categoria,
+            COUNT(*) AS quantidade,
+            SUM(valor) AS total,
+            AVG(valor) AS media,
+            MIN(data) AS data_min,
+            MAX(data) AS data_max
+        FROM {fonte}
+        GROUP BY categoria
+        ORDER BY categoria
+    """
+
+    _SQL_MENSAL = """
+        SELECT
+            {mes} AS ano_mes,
+            COUNT(*) AS quantidade,
+            SUM(valor) AS total,
+            COALESCE(SUM(CASE WHEN valor > 0 THEN valor END), 0) AS receitas,
+            COALESCE(-SUM(CASE WHEN valor < 0 THEN valor END), 0) AS despesas,
+            COUNT(DISTINCT categoria) AS categorias_distintas
+        FROM {fonte}
+        GROUP BY 1
+        ORDER BY 1
+    """
+
+    _SQL_SEMANAL = """
+        SELECT {semana} AS semana{colunas}, -SUM(valor) AS despesas
+        FROM {fonte}
+        WHERE valor < 0
+        GROUP BY {grupos}
+        ORDER BY {grupos}
+    """
+
+    # Colunas lidas do SQLite (sem DuckDB ou para gerar o snapshot)
+    _SQL_TRANSACOES = """
+        SELECT data, valor, categoria
+        FROM transacoes
+        WHERE user_id = ? AND excluida = 0
+    """
+
+    # Assinatura das transações do usuário: snapshot diferente = regenerar
+    _SQL_ASSINATURA = """
+        SELECT
+            COUNT(*) AS quantidade,
+            COALESCE(MAX(id), 0) AS max_id,
+            COALESCE(MAX(updated_at), '') AS atualizado_em,
+            TOTAL(valor) AS soma
+        FROM transacoes
+        WHERE user_id = ? AND excluida = 0
+    """
+
+    def __init__(self, db=None, motor: str = 'auto'):
+        if motor not in self.MOTORES:
+            raise ValueError(f"motor deve ser um de {self.MOTORES}")
+        if motor == 'duckdb' and duckdb is None:
+            raise ImportError("DuckDB não está instalado (pip install duckdb)")
+
+        self.db = db or get_database_manager()
+        self.motor = 'duckdb' if motor == 'auto' and duckdb is not None else motor
+        self.logger = logging.getLogger(__name__)
+
+        self._duck = None
+        self._lock = threading.Lock()
+        self._anexados: Dict[str, str] = {}  # arquivo SQLite -> alias no DuckDB
+        self._attach_disponivel = True
+        self._snapshots: Dict[str, tuple] = {}  # arquivo Parquet -> (assinatura, geração)
+
+    # ---- API ----
+
+    def obter_resumo(self, user_id: int, data_inicio: str, data_fim: str) -> Dict[str, Any]:
+        """Total de transações, receitas, despesas, saldo e ticket médio do período"""
+        linha = self._consultar(self._SQL_RESUMO, user_id, data_inicio, data_fim).iloc[0]
+        receitas, despesas = float(linha['receitas']), float(linha['despesas'])
+        qtd_despesas = int(linha['qtd_despesas'])
+        return {
+            'total_transacoes': int(linha['total_transacoes']),
+            'receitas': receitas,
+            'despesas': despesas,
+            'saldo': receitas - despesas,
+            'ticket_medio': despesas / qtd_despesas if qtd_despesas > 0 else 0
+        }
+
+    def obter_por_categoria(self, user_id: int, data_inicio: str, data_fim: str) -> pd.DataFrame:
+        """Quantidade, total, média e primeira/última data por categoria"""
+        df = self._consultar(self._SQL_CATEGORIAS, user_id, data_inicio, data_fim)
+        for coluna in ('data_min', 'data_max'):
+            df[coluna] = df[coluna].astype(str).str[:10]
+        return df
+
+    def obter_serie_mensal(self, user_id: int, data_inicio: str, data_fim: str) -> pd.DataFrame:
+        """Quantidade, total, receitas, despesas e categorias distintas por mês (AAAA-MM)"""
+        return self._consultar(self._SQL_MENSAL, user_id, data_inicio, data_fim)
+
+    def obter_despesas_semanais(self, user_id: int, data_inicio: str, data_fim: str,
+                                por_categoria: bool = False) -> pd.DataFrame:
+        """Despesas (valor absoluto) por semana (AAAA-SS), opcionalmente por categoria"""
+        return self._consultar(
+            self._SQL_SEMANAL, user_id, data_inicio, data_fim,
+            colunas=', categoria' if por_categoria else '',
+            grupos='semana, categoria' if por_categoria else 'semana'
+        )
+
+    def invalidar_snapshot(self, user_id: Optional[int] = None) -> int:
+        """Remove snapshots Parquet (de um usuário ou todos) do disco; retorna quantos foram removidos
+
+        Procura no diretório do banco, não só entre os snapshots gerados por esta
+        instância: é chamado ao excluir usuários, de onde quer que o snapshot tenha vindo.
+        """
+        if user_id is not None:
+            caminhos = {self._caminho_snapshot(int(user_id))}
+        else:
+            caminhos = set(self._snapshots)
+            diretorio = self._diretorio_snapshots(self.db.db_path)
+            if os.path.isdir(diretorio):
+                caminhos.update(
+                    os.path.join(diretorio, nome) for nome in os.listdir(diretorio)
+                    if nome.startswith('usuario_') and nome.endswith('.parquet')
+                )
+
+        removidos = 0
+        with self._lock:
+            for caminho in caminhos:
+                self._snapshots.pop(caminho, None)
+                existia = os.path.exists(caminho)
+                for arquivo in (caminho, caminho + '.json', caminho + '.tmp'):
+                    if os.path.exists(arquivo):
+                        os.remove(arquivo)
+                removidos += existia
+        return removidos
+
+    # ---- Execução ----
+
+    def _consultar(self, sql: str, user_id: int, data_inicio: str, data_fim: str,
+                   **formato) -> pd.DataFrame:
+        """Executa a agregação no DuckDB, recorrendo ao SQLite se ele falhar"""
+        if self.motor == 'duckdb':
+            try:
+                return self._consultar_duckdb(sql, int(user_id), data_inicio, data_fim, formato)
+            except Exception as e:
+                self.logger.warning(f"⚠️ Agregação no DuckDB falhou, usando SQLite: {e}")
+
+        fonte = f"({self._SQL_TRANSACOES} AND data BETWEEN ? AND ?) t"
+        query = sql.format(fonte=fonte, **self._EXPRESSOES['sqlite'], **formato)
+        return self.db.executar_query_df(query, [user_id, data_inicio, data_fim])
+
+    def _consultar_duckdb(self, sql: str, user_id: int, data_inicio: str, data_fim: str,
+                          formato: Dict[str, str]) -> pd.DataFrame:
+        cursor = self._cursor()
+        try:
+            fonte, params = self._fonte_duckdb(cursor, user_id)
+            fonte = f"({fonte} WHERE data BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)) t"
+            query = sql.format(fonte=fonte, **self._EXPRESSOES['duckdb'], **formato)
+            return cursor.execute(query, params + [data_inicio, data_fim]).fetchdf()
+        finally:
+            cursor.close()
+
+    def _cursor(self):
+        """Cursor próprio da thread sobre a conexão DuckDB em memória (criada sob demanda)"""
+        with self._lock:
+            if self._duck is None:
+                # Sem download de extensões no caminho da requisição: offline, cai direto no Parquet
+                self._duck = duckdb.connect(':memory:', config={
+                    'autoinstall_known_extensions': False,
+                    'autoload_known_extensions': False,
+                })
+            return self._duck.cursor()
+
+    def _gerenciador_usuario(self, user_id: int):
+        """DatabaseManager do arquivo que guarda as transações do usuário (o shard, se houver)"""
+        if hasattr(self.db, 'shard_do_usuario'):
+            return self.db.shard_do_usuario(user_id)
+        return self.db
+
+    def _fonte_duckdb(self, cursor, user_id: int):
+        """SELECT (data, valor, categoria) das transações do usuário e seus parâmetros"""
+        arquivo = os.path.abspath(self._gerenciador_usuario(user_id).db_path)
+
+        alias = self._anexar(cursor, arquivo) if self._attach_disponivel else None
+        if alias:
+            return (
+                f"""SELECT CAST(data AS DATE) AS data, CAST(valor AS DOUBLE) AS valor, categoria
+                    FROM (SELECT * FROM "{alias}".transacoes WHERE user_id = ? AND excluida = '0')""",
+                [str(user_id)]
+            )
+
+        caminho = self._snapshot(cursor, arquivo, user_id)
+        return f"SELECT * FROM read_parquet('{caminho.replace(chr(39), chr(39) * 2)}')", []
+
+    def _anexar(self, cursor, arquivo: str) -> Optional[str]:
+        """Anexa o SQLite somente leitura; None se a extensão sqlite não estiver instalada localmente"""
+        with self._lock:
+            alias = self._anexados.get(arquivo)
+            if alias:
+                return alias
+            alias = f"sqlite_{len(self._anexados)}"
+            try:
+                cursor.execute("LOAD sqlite")
+                # Ler tudo do SQLite como texto e converter explicitamente (tipagem dinâmica)
+                cursor.execute("SET GLOBAL sqlite_all_varchar = true")
+                cursor.execute(
+                    f"ATTACH '{arquivo.replace(chr(39), chr(39) * 2)}' AS \"{alias}\" (TYPE sqlite, READ_ONLY)"
+                )
+            except Exception as e:
+                self._attach_disponivel = False
+                self.logger.info(f"ℹ️ DuckDB sem extensão sqlite, usando snapshots Parquet: {e}")
+                return None
+            self._anexados[arquivo] = alias
+            return alias
+
+    @staticmethod
+    def _diretorio_snapshots(arquivo: str) -> str:
+        return os.path.splitext(os.path.abspath(arquivo))[0] + '_analytics'
+
+    def _caminho_snapshot(self, user_id: int) -> str:
+        arquivo = self._gerenciador_usuario(user_id).db_path
+        return os.path.join(self._diretorio_snapshots(arquivo), f"usuario_{user_id}.parquet")
+
+    def _snapshot(self, cursor, arquivo: str, user_id: int) -> str:
+        """Caminho do snapshot Parquet do usuário, regenerado se as transações mudaram"""
+        diretorio = self._diretorio_snapshots(arquivo)
+        caminho = os.path.join(diretorio, f"usuario_{user_id}.parquet")
+
+        linha = self.db.executar_query(self._SQL_ASSINATURA, [user_id])[0]
+        assinatura = (linha['quantidade'], linha['max_id'], str(linha['atualizado_em']), round(linha['soma'], 2))
+        # Escritas deste processo (updated_at tem resolução de segundos)
+        geracoes = self._gerenciador_usuario(user_id)._table_generations
+        geracao = (geracoes.get('transacoes', 0), geracoes.get('*', 0))
+
+        with self._lock:
+            if self._snapshots.get(caminho) == (assinatura, geracao) and os.path.exists(caminho):
+                return caminho
+            # Snapshot gerado por outro processo (ou antes de reiniciar): vale a assinatura em disco
+            try:
+                with open(caminho + '.json', encoding='utf-8') as f:
+                    if caminho not in self._snapshots and tuple(json.load(f)) == assinatura and os.path.exists(caminho):
+                        self._snapshots[caminho] = (assinatura, geracao)
+                        return caminho
+            except (OSError, ValueError):
+                pass
+
+            # Cópia das transações em claro: só o dono do processo lê (como o próprio banco)
+            os.makedirs(diretorio, mode=0o700, exist_ok=True)
+            tabela = f"snapshot_{user_id}"
+            cursor.execute(f"CREATE OR REPLACE TEMP TABLE {tabela} (data DATE, valor DOUBLE, categoria VARCHAR)")
+            try:
+                for lote in self.db.executar_query_df_chunks(self._SQL_TRANSACOES, [user_id], chunksize=50000):
+                    cursor.register('lote', lote)
+                    cursor.execute(f"""
+                        INSERT INTO {tabela}
+                        SELECT CAST(data AS DATE), CAST(valor AS DOUBLE), CAST(categoria AS VARCHAR) FROM lote
+                    """)
+                    cursor.unregister('lote')
+
+                # Ordenado por data: as estatísticas de cada row group permitem pular períodos
+                temporario = caminho + '.tmp'
+                destino = temporario.replace("'", "''")
+                cursor.execute(f"COPY (SELECT * FROM {tabela} ORDER BY data) TO '{destino}' (FORMAT parquet)")
+                os.chmod(temporario, 0o600)
+                os.replace(temporario, caminho)
+            finally:
+                cursor.execute(f"DROP TABLE IF EXISTS {tabela}")
+
+            with open(caminho + '.json', 'w', encoding='utf-8') as f:
+                json.dump(list(assinatura), f)
+            self._snapshots[caminho] = (assinatura, geracao)
+            return caminho
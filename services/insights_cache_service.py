@@ -3,12 +3,13 @@ Serviço de Cache de Insights LLM
 Gerencia cache inteligente para insights gerados por LLM, otimizando performance e reduzindo custos
 """
 
+import asyncio
 import hashlib
 import json
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
 
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager, AsyncDatabaseManager
 from utils.repositories_v2 import CacheInsightsRepository
 from services.llm_service import LLMService
 
@@ -17,7 +18,7 @@ class InsightsCacheService:
     """Serviço para gerenciamento inteligente de cache de insights LLM"""
     
     def __init__(self):
-        self.db = DatabaseManager()
+        self.db = get_database_manager()
         self.cache_repo = CacheInsightsRepository(self.db)
         self.llm_service = LLMService()
         
@@ -240,6 +241,30 @@ class InsightsCacheService:
                 'used_count': 0
             }
     
+    async def gerar_insight_com_cache_async(self, user_id: int, insight_type: str, personalidade: str,
+                                            data_context: Dict[str, Any], prompt: str,
+                                            personalidade_params: Dict[str, Any],
+                                            forcar_regeneracao: bool = False) -> Dict[str, Any]:
+        """Versão assíncrona de gerar_insight_com_cache.
+        
+        A consulta ao cache roda no executor do banco; a chamada ao LLM, em uma thread
+        própria (não ocupa workers do banco enquanto espera a rede). Com asyncio.gather,
+        os insights de uma tela são gerados em paralelo.
+        """
+        if not forcar_regeneracao:
+            cached_result = await AsyncDatabaseManager(self.db).run(
+                self.obter_insight_cached,
+                user_id, insight_type, personalidade, data_context, prompt, personalidade_params
+            )
+            if cached_result:
+                return cached_result
+        
+        # Cache miss: o caminho síncrono sem cache chama o LLM e grava o resultado
+        return await asyncio.to_thread(
+            self.gerar_insight_com_cache, user_id, insight_type, personalidade,
+            data_context, prompt, personalidade_params, True
+        )
+    
     def _extrair_titulo_por_tipo(self, insight_type: str) -> str:
         """Extrai título padrão baseado no tipo de insight"""
         titulos = {
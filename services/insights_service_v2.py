@@ -9,8 +9,8 @@ from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 import calendar
 
-from utils.database_manager_v2 import DatabaseManager
-from utils.repositories_v2 import TransacaoRepository, CategoriaRepository
+from utils.database_manager_v2 import get_database_manager
+from utils.repositories_v2 import TransacaoRepository, CategoriaRepository, ResumoMensalRepository
 from utils.formatacao import formatar_valor_monetario
 
 
@@ -18,9 +18,10 @@ class InsightsServiceV2:
     """Serviço para geração de insights financeiros avançados - versão corrigida"""
     
     def __init__(self):
-        self.db = DatabaseManager()
+        self.db = get_database_manager()
         self.transacao_repo = TransacaoRepository(self.db)
         self.categoria_repo = CategoriaRepository(self.db)
+        self.resumo_repo = ResumoMensalRepository(self.db)
         
         # Categorias baseadas na planilha de referência
         self.CATEGORIAS_PREDEFINIDAS = {
@@ -57,20 +58,18 @@ class InsightsServiceV2:
         if ano is None:
             ano = datetime.now().year
         
-        # Definir período do mês
-        data_inicio = f"{ano}-{mes:02d}-01"
-        ultimo_dia = calendar.monthrange(ano, mes)[1]
-        data_fim = f"{ano}-{mes:02d}-{ultimo_dia}"
-        
-        # Obter transações do período
+        # Totais do mês a partir dos agregados (resumo_mensal)
+        ano_mes = f"{ano}-{mes:02d}"
         try:
-            df_transacoes = self.transacao_repo.obter_transacoes_periodo(
-                user_id, data_inicio, data_fim
-            )
+            totais = self.resumo_repo.obter_totais_mensais(user_id, ano_mes, ano_mes)
         except Exception:
-            df_transacoes = pd.DataFrame()
+            totais = {}
         
-        if df_transacoes.empty:
+        return self._calcular_valor_restante(totais.get(ano_mes), mes, ano)
+    
+    def _calcular_valor_restante(self, totais_mes: Optional[Dict[str, Any]], mes: int, ano: int) -> Dict[str, Any]:
+        """Monta as métricas do mês a partir dos totais agregados (None = sem transações)"""
+        if not totais_mes:
             return {
                 'valor_restante': 0.0,
                 'total_receitas': 0.0,
@@ -82,8 +81,8 @@ class InsightsServiceV2:
                 'mes_ano': f"{mes:02d}/{ano}"            }
         
         # Calcular totais
-        receitas = df_transacoes.loc[df_transacoes['valor'] > 0, 'valor'].sum()
-        gastos = abs(df_transacoes.loc[df_transacoes['valor'] < 0, 'valor'].sum())
+        receitas = float(totais_mes['receitas'] or 0)
+        gastos = float(totais_mes['despesas'] or 0)
         valor_restante = receitas - gastos
         
         # Calcular percentual gasto
@@ -91,6 +90,7 @@ class InsightsServiceV2:
         
         # Calcular dias restantes no mês
         hoje = datetime.now()
+        ultimo_dia = calendar.monthrange(ano, mes)[1]
         if hoje.month == mes and hoje.year == ano:
             ultimo_dia_mes = datetime(ano, mes, ultimo_dia)
             dias_restantes = (ultimo_dia_mes - hoje).days + 1
@@ -122,30 +122,27 @@ class InsightsServiceV2:
     
     def analisar_gastos_por_categoria(self, user_id: int, meses: int = 6) -> Dict[str, Any]:
         """Analisa distribuição de gastos por categoria nos últimos meses"""
-        data_inicio = (datetime.now() - relativedelta(months=meses)).strftime('%Y-%m-%d')
-        data_fim = datetime.now().strftime('%Y-%m-%d')
+        # Granularidade mensal: do mês de (hoje - meses) até o mês atual
+        ano_mes_inicio = (datetime.now() - relativedelta(months=meses)).strftime('%Y-%m')
+        ano_mes_fim = datetime.now().strftime('%Y-%m')
         
         try:
-            df_transacoes = self.transacao_repo.obter_transacoes_periodo(
-                user_id, data_inicio, data_fim
+            df_gastos = self.resumo_repo.obter_gastos_por_categoria(
+                user_id, ano_mes_inicio, ano_mes_fim
             )
         except Exception:
             return {'status': 'sem_dados'}
         
-        if df_transacoes.empty:
-            return {'status': 'sem_dados'}
-        
-        # Filtrar apenas gastos
-        df_gastos = df_transacoes.loc[df_transacoes['valor'] < 0].copy()
         if df_gastos.empty:
             return {'status': 'sem_dados'}
-            
-        df_gastos['valor_abs'] = abs(df_gastos['valor'])
         
-        # Agrupar por categoria
-        gastos_categoria = df_gastos.groupby('categoria')['valor_abs'].agg([
-            'sum', 'mean', 'count'
-        ]).round(2)
+        # Agregados por categoria
+        gastos_categoria = pd.DataFrame({
+            'sum': df_gastos['despesas'].astype(float).values,
+            'mean': (df_gastos['despesas'] / df_gastos['qtd_despesas']).astype(float).values,
+            'count': df_gastos['qtd_despesas'].astype(int).values
+        }, index=df_gastos['categoria'].values).round(2)
+        gastos_categoria.index.name = 'categoria'
         
         # Calcular percentuais
         total_gastos = gastos_categoria['sum'].sum()
@@ -243,11 +240,20 @@ class InsightsServiceV2:
         """Gera comparativo de receitas vs despesas por mês"""
         dados_mensais = []
         
+        # Uma única consulta aos agregados para todo o intervalo
+        inicio = datetime.now() - relativedelta(months=meses - 1)
+        try:
+            totais = self.resumo_repo.obter_totais_mensais(
+                user_id, inicio.strftime('%Y-%m'), datetime.now().strftime('%Y-%m')
+            )
+        except Exception:
+            totais = {}
+        
         for i in range(meses):
             data_ref = datetime.now() - relativedelta(months=i)
             mes, ano = data_ref.month, data_ref.year
             
-            info_mes = self.obter_valor_restante_mensal(user_id, mes, ano)
+            info_mes = self._calcular_valor_restante(totais.get(f"{ano}-{mes:02d}"), mes, ano)
             dados_mensais.append({
                 'mes_ano': info_mes['mes_ano'],
                 'receitas': info_mes['total_receitas'],
@@ -290,10 +290,10 @@ Use Markdown para organizar as respostas.
                     if count > 0:
                         # Buscar detalhes dos compromissos do repositório
                         try:
-                            from utils.database_manager_v2 import DatabaseManager
+                            from utils.database_manager_v2 import get_database_manager
                             from utils.repositories_v2 import CompromissoRepository
                             
-                            db = DatabaseManager()
+                            db = get_database_manager()
                             compromisso_repo = CompromissoRepository(db)
                             df_compromissos = compromisso_repo.obter_compromissos(user_id, "pendente")
                             
@@ -14,19 +14,20 @@ import logging
 from concurrent.futures import ThreadPoolExecutor
 import asyncio
 
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
 from utils.repositories_v2 import (
     UsuarioRepository, TransacaoRepository, CategoriaRepository,
     DescricaoRepository, ExclusaoRepository, CacheIARepository,
-    ArquivoOFXRepository, SystemLogRepository
+    ArquivoOFXRepository, SystemLogRepository, resolve_user_id
 )
 from utils.exception_handler import ExceptionHandler
+from services.analytics_service import AnalyticsService
 
 class TransacaoService:
     """Serviço otimizado para operações com transações"""
     
     def __init__(self):
-        self.db = DatabaseManager()
+        self.db = get_database_manager()
         
         # Inicializar repositories
         self.usuario_repo = UsuarioRepository(self.db)
@@ -38,6 +39,9 @@ class TransacaoService:
         self.arquivo_repo = ArquivoOFXRepository(self.db)
         self.log_repo = SystemLogRepository(self.db)
         
+        # Agregações de relatórios (DuckDB quando instalado, senão SQL no SQLite)
+        self.analytics = AnalyticsService(self.db)
+        
         # Configurar executor para operações assíncronas
         self.executor = ThreadPoolExecutor(max_workers=3)
         
@@ -145,12 +149,11 @@ class TransacaoService:
             
             # Obter dados usando queries otimizadas
             transacoes = self.transacao_repo.obter_transacoes_periodo(
-                user_id, data_inicio, data_fim, limite=1000
+                user_id, data_inicio, data_fim, limite=1000, tipado=True
             )
               # Calcular métricas usando pandas para performance
             if not transacoes.empty:
-                # Garantir que valores estão em formato numérico
-                transacoes['valor'] = pd.to_numeric(transacoes['valor'], errors='coerce')
+                # Valores já chegam numéricos (schema tipado); descartar os inválidos
                 transacoes = transacoes.dropna(subset=['valor'])
                 
                 receitas = transacoes[transacoes['valor'] > 0]['valor'].sum()
@@ -158,13 +161,14 @@ class TransacaoService:
                 saldo = receitas - despesas
                 
                 # Estatísticas por categoria
-                estatisticas_cat = transacoes.groupby('categoria').agg({
+                estatisticas_cat = transacoes.groupby('categoria', observed=True).agg({
                     'valor': ['count', 'sum'],
                     'data': 'max'
-                }).round(2)
+                })
+                estatisticas_cat['valor'] = estatisticas_cat['valor'].round(2)
                 
                 # Top categorias por gasto
-                despesas_por_cat = transacoes[transacoes['valor'] < 0].groupby('categoria')['valor'].sum().abs().sort_values(ascending=False).head(10)
+                despesas_por_cat = transacoes[transacoes['valor'] < 0].groupby('categoria', observed=True)['valor'].sum().abs().sort_values(ascending=False).head(10)
                 
             else:
                 receitas = despesas = saldo = 0
@@ -180,7 +184,7 @@ class TransacaoService:
             stats_usuario = {}
             
             # Análise de tendências
-            tendencias = self._analisar_tendencias(transacoes) if not transacoes.empty else {}
+            tendencias = self._analisar_tendencias(user_id, data_inicio, data_fim) if not transacoes.empty else {}
             
             return {
                 'periodo': {
@@ -197,7 +201,7 @@ class TransacaoService:
                 },
                 'categorias_top': despesas_por_cat.to_dict() if not despesas_por_cat.empty else {},
                 'evolucao_mensal': evolucao if isinstance(evolucao, list) else [],
-                'transacoes_recentes': transacoes.head(20).to_dict('records') if not transacoes.empty else [],
+                'transacoes_recentes': transacoes.head(20).astype({'data': str}).to_dict('records') if not transacoes.empty else [],
                 'estatisticas_usuario': stats_usuario,
                 'tendencias': tendencias,
                 'health_check': self.db.health_check()
@@ -208,20 +212,17 @@ class TransacaoService:
             default_return={'erro': True}
         )
     
-    def _analisar_tendencias(self, transacoes_df: pd.DataFrame) -> Dict[str, Any]:
-        """Análise de tendências baseada nos dados"""
-        if transacoes_df.empty:
-            return {}
-        
+    def _analisar_tendencias(self, user_id: int, data_inicio: str, data_fim: str) -> Dict[str, Any]:
+        """Análise de tendências semanais (agregadas pela camada analítica)"""
         try:
-            # Converter data para datetime e valor para numeric
-            transacoes_df['data'] = pd.to_datetime(transacoes_df['data'])
-            transacoes_df['valor'] = pd.to_numeric(transacoes_df['valor'], errors='coerce')
-            transacoes_df = transacoes_df.dropna(subset=['valor'])
+            semanal = self.analytics.obter_despesas_semanais(
+                user_id, data_inicio, data_fim, por_categoria=True
+            )
+            if semanal.empty:
+                return {}
             
             # Agrupar por semana
-            transacoes_df['semana'] = transacoes_df['data'].dt.isocalendar().week
-            gastos_semanais = transacoes_df[transacoes_df['valor'] < 0].groupby('semana')['valor'].sum().abs()
+            gastos_semanais = semanal.groupby('semana')['despesas'].sum()
             
             # Calcular tendência
             if len(gastos_semanais) >= 2:
@@ -232,7 +233,7 @@ class TransacaoService:
                 tendencia = 'estavel'
             
             # Categoria com maior crescimento
-            cat_crescimento = transacoes_df[transacoes_df['valor'] < 0].groupby(['categoria', 'semana'])['valor'].sum().abs()
+            cat_crescimento = semanal.set_index(['categoria', 'semana'])['despesas']
             cat_tendencias = {}
             
             for categoria in cat_crescimento.index.get_level_values(0).unique():
@@ -260,7 +261,7 @@ class TransacaoService:
         """Categorização em lote com cache de IA e otimizações"""
         def _process_batch():
             # Obter transações sem categoria (método não implementado - uso query direta)
-            with self.db.get_connection() as conn:
+            with self.db.get_connection(user_id) as conn:
                 query = """
                 SELECT id, descricao, valor, data, categoria 
                 FROM transacoes 
@@ -375,12 +376,15 @@ class TransacaoService:
     def obter_relatorio_avancado(self, user_id: int, data_inicio: str, data_fim: str, 
                                 tipo_relatorio: str = 'completo') -> Dict[str, Any]:
         """Gera relatório avançado com análises detalhadas"""
-        def _generate_report():            # Obter transações do período
-            transacoes = self.transacao_repo.obter_transacoes_periodo(
-                user_id, data_inicio, data_fim, incluir_excluidas=False
-            )
+        def _generate_report():
+            # Agregações na camada analítica; só a detecção de anomalias lê linhas
+            incluir_categorias = tipo_relatorio in ['completo', 'categorias']
+            incluir_temporal = tipo_relatorio in ['completo', 'temporal']
+            incluir_anomalias = tipo_relatorio in ['completo', 'deteccao_anomalias']
             
-            if transacoes.empty:
+            resumo = self.analytics.obter_resumo(user_id, data_inicio, data_fim)
+            
+            if resumo['total_transacoes'] == 0:
                 return {
                     'tipo': tipo_relatorio,
                     'periodo': f'{data_inicio} a {data_fim}',
@@ -388,50 +392,43 @@ class TransacaoService:
                     'dados': {}
                 }
             
-            # Garantir que valores estão em formato numérico
-            transacoes['valor'] = pd.to_numeric(transacoes['valor'], errors='coerce')
-            transacoes = transacoes.dropna(subset=['valor'])
-            
-            # Análises básicas
-            receitas = transacoes[transacoes['valor'] > 0]['valor'].sum()
-            despesas = abs(transacoes[transacoes['valor'] < 0]['valor'].sum())
-            
             relatorio = {
                 'tipo': tipo_relatorio,
                 'periodo': f'{data_inicio} a {data_fim}',
-                'resumo': {
-                    'total_transacoes': len(transacoes),
-                    'receitas': float(receitas),
-                    'despesas': float(despesas),
-                    'saldo': float(receitas - despesas),
-                    'ticket_medio': float(despesas / len(transacoes[transacoes['valor'] < 0])) if len(transacoes[transacoes['valor'] < 0]) > 0 else 0
-                }
+                'resumo': resumo
             }
             
-            if tipo_relatorio in ['completo', 'categorias']:
+            if incluir_categorias:
                 # Análise por categorias
-                cat_analysis = transacoes.groupby('categoria').agg({
-                    'valor': ['count', 'sum', 'mean'],
-                    'data': ['min', 'max']
+                por_categoria = self.analytics.obter_por_categoria(
+                    user_id, data_inicio, data_fim
+                ).set_index('categoria')
+                cat_analysis = pd.DataFrame({
+                    ('valor', 'count'): por_categoria['quantidade'],
+                    ('valor', 'sum'): por_categoria['total'],
+                    ('valor', 'mean'): por_categoria['media'],
+                    ('data', 'min'): por_categoria['data_min'],
+                    ('data', 'max'): por_categoria['data_max']
                 }).round(2)
                 
                 relatorio['analise_categorias'] = cat_analysis.to_dict()
             
-            if tipo_relatorio in ['completo', 'temporal']:
-                # Análise temporal
-                transacoes['data'] = pd.to_datetime(transacoes['data'])
-                transacoes['mes'] = transacoes['data'].dt.to_period('M')
-                
-                temporal_analysis = transacoes.groupby('mes').agg({
-                    'valor': ['count', 'sum'],
-                    'categoria': 'nunique'
+            if incluir_temporal:
+                # Análise temporal (meses AAAA-MM)
+                por_mes = self.analytics.obter_serie_mensal(
+                    user_id, data_inicio, data_fim
+                ).set_index('ano_mes')
+                temporal_analysis = pd.DataFrame({
+                    ('valor', 'count'): por_mes['quantidade'],
+                    ('valor', 'sum'): por_mes['total'],
+                    ('categoria', 'nunique'): por_mes['categorias_distintas']
                 })
                 
                 relatorio['analise_temporal'] = temporal_analysis.to_dict()
             
-            if tipo_relatorio in ['completo', 'deteccao_anomalias']:
-                # Detecção de anomalias
-                anomalias = self._detectar_anomalias(transacoes)
+            if incluir_anomalias:
+                # Estatísticas por categoria em SQL; dos lotes só ficam as linhas marcadas
+                anomalias = self._detectar_anomalias_periodo(user_id, data_inicio, data_fim)
                 relatorio['anomalias'] = anomalias
             
             return relatorio
@@ -442,6 +439,60 @@ class TransacaoService:
             default_return={'erro': True}
         )
     
+    def _detectar_anomalias_periodo(self, user_id: int, data_inicio: str, data_fim: str,
+                                    desvios: float = 3.0) -> Dict[str, List]:
+        """Detecta anomalias do período sem carregar todas as transações.
+        
+        Despesa alta = valor absoluto acima de média + `desvios` desvios padrão da
+        sua categoria; média, desvio e contagens vêm de uma agregação em SQL.
+        """
+        anomalias = {
+            'valores_altos': [],
+            'duplicatas_suspeitas': [],
+            'frequencia_anormal': []
+        }
+        
+        try:
+            estatisticas = self.transacao_repo.obter_estatisticas_categorias_periodo(
+                user_id, data_inicio, data_fim
+            )
+            limites = {
+                categoria: est['media_despesa'] + desvios * est['desvio_despesa']
+                for categoria, est in estatisticas.items()
+                if est['qtd_despesas'] > 1 and est['desvio_despesa'] > 0
+            }
+            
+            if limites:
+                for lote in self.transacao_repo.iterar_transacoes_periodo(
+                    user_id, data_inicio, data_fim, incluir_excluidas=False
+                ):
+                    lote = lote[['data', 'descricao', 'valor', 'categoria']]
+                    valor = pd.to_numeric(lote['valor'], errors='coerce')
+                    limite = lote['categoria'].map(limites)
+                    marcadas = lote[(valor < 0) & (valor.abs() > limite)].copy()
+                    if marcadas.empty:
+                        continue
+                    marcadas['valor'] = valor[marcadas.index]
+                    marcadas['data'] = pd.to_datetime(marcadas['data'])
+                    anomalias['valores_altos'].extend(
+                        marcadas[['data', 'descricao', 'valor']].to_dict('records')
+                    )
+            
+            # Frequência alta por categoria (mais de 20 transações no período)
+            anomalias['frequencia_anormal'] = [
+                {
+                    'categoria': str(categoria),
+                    'total_transacoes': int(est['quantidade']),
+                    'tipo': 'alta_frequencia'
+                }
+                for categoria, est in estatisticas.items()
+                if est['quantidade'] > 20
+            ]
+        except Exception as e:
+            self.logger.error(f"Erro na detecção de anomalias: {e}")
+        
+        return anomalias
+    
     def _detectar_anomalias(self, transacoes_df: pd.DataFrame) -> Dict[str, List]:
         """Detecta transações anômalas"""
         anomalias = {
@@ -512,14 +563,17 @@ class TransacaoService:
                         padrao = regra['padrao']
                         categoria = regra['categoria']
                         
-                        # Buscar transações que correspondem ao padrão
-                        transacoes = self.db.executar_query("""
-                            SELECT hash_transacao FROM transacoes 
-                            WHERE user_id = ? AND descricao LIKE ? AND categoria = 'Outros'
-                        """, [user_id, f'%{padrao}%'])
+                        # Buscar no índice textual as transações que correspondem ao padrão
+                        transacoes = self.transacao_repo.buscar_transacoes(
+                            user_id, padrao,
+                            categorias=['Outros'],
+                            colunas=['descricao'],
+                            incluir_excluidas=True,
+                            limite=None
+                        )
                         
-                        if transacoes:
-                            mapeamento = {t['hash_transacao']: categoria for t in transacoes}
+                        if not transacoes.empty:
+                            mapeamento = {h: categoria for h in transacoes['hash_transacao']}
                             self.transacao_repo.atualizar_categorias_lote(user_id, mapeamento)
                             aplicadas += len(mapeamento)
                     
@@ -689,15 +743,14 @@ class TransacaoService:
             default_return={'erro': True}
         )
     
-    def listar_transacoes_usuario(self, usuario: str, limite: int = 1000) -> pd.DataFrame:
-        """Lista todas as transações de um usuário"""
+    def listar_transacoes_usuario(self, usuario: str, limite: int = 1000,
+                                  tipado: bool = False) -> pd.DataFrame:
+        """Lista todas as transações de um usuário (`tipado=True`: dtypes de SCHEMA_TRANSACOES)"""
         try:            # Buscar usuário pelo username
-            user_data = self.usuario_repo.obter_usuario_por_username(usuario)
-            if not user_data:
+            user_id = resolve_user_id(usuario, self.db)
+            if user_id is None:
                 return pd.DataFrame()
             
-            user_id = user_data['id']
-            
             # Usar método do repository para obter transações
             from datetime import datetime, timedelta
             data_fim = datetime.now().strftime('%Y-%m-%d')
@@ -705,7 +758,7 @@ class TransacaoService:
             
             return self.transacao_repo.obter_transacoes_periodo(
                 user_id, data_inicio, data_fim, 
-                categorias=None, incluir_excluidas=False, limite=limite
+                categorias=None, incluir_excluidas=False, limite=limite, tipado=tipado
             )
             
         except Exception as e:
@@ -716,7 +769,7 @@ class TransacaoService:
         """Lista transações de cartão de crédito de um usuário"""
         try:
             # Buscar todas as transações do usuário
-            df_todas = self.listar_transacoes_usuario(usuario, limite=5000)
+            df_todas = self.listar_transacoes_usuario(usuario, limite=5000, tipado=True)
             
             if df_todas.empty:
                 return pd.DataFrame()
@@ -734,7 +787,7 @@ class TransacaoService:
             if dias_limite > 0:
                 from datetime import datetime, timedelta
                 data_limite = datetime.now() - timedelta(days=dias_limite)
-                df_cartao = df_cartao[pd.to_datetime(df_cartao['data']) >= data_limite]
+                df_cartao = df_cartao[df_cartao['data'] >= data_limite]
             
             # Converter colunas para o formato esperado pela página Cartão (compatibilidade)
             if not df_cartao.empty:
@@ -788,12 +841,10 @@ class TransacaoService:
     def processar_categorizacao_ai(self, usuario: str) -> Dict[str, Any]:
         """Processa categorização automática com IA para um usuário"""
         try:
-            user_data = self.usuario_repo.obter_usuario_por_username(usuario)
-            if not user_data:
+            user_id = resolve_user_id(usuario, self.db)
+            if user_id is None:
                 return {'success': False, 'error': 'Usuário não encontrado'}
             
-            user_id = user_data['id']
-            
             # Usar método existente do serviço
             resultado = self.aplicar_categorizacao_ia_lote(user_id, limite=100)
             
@@ -839,12 +890,10 @@ class TransacaoService:
     def gerar_relatorio_tendencias(self, usuario: str) -> Dict[str, Any]:
         """Gera relatório de tendências para um usuário"""
         try:
-            user_data = self.usuario_repo.obter_usuario_por_username(usuario)
-            if not user_data:
+            user_id = resolve_user_id(usuario, self.db)
+            if user_id is None:
                 return {'success': False, 'error': 'Usuário não encontrado'}
             
-            user_id = user_data['id']
-            
             # Usar método existente para obter dados do dashboard
             dashboard_data = self.obter_dashboard_data(user_id, periodo_meses=6)
             
@@ -10,7 +10,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 import pandas as pd
 from datetime import datetime
 from services.insights_cache_service import InsightsCacheService
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
 from utils.repositories_v2 import UsuarioRepository
 
 
@@ -22,7 +22,7 @@ def testar_cache_cartao():
     try:
         # Inicializar serviços
         cache_service = InsightsCacheService()
-        db = DatabaseManager()
+        db = get_database_manager()
         usuario_repo = UsuarioRepository(db)
         
         # Simular dados do usuário (substitua por usuário real se necessário)
@@ -3,12 +3,12 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Script utilitário para listar usuários ativos e conceder admin - Backend V2
-from utils.database_manager_v2 import DatabaseManager
+from utils.database_manager_v2 import get_database_manager
 from utils.repositories_v2 import UsuarioRepository
 
 def listar_usuarios_ativos():
     """Lista usuários ativos usando Backend V2"""
-    db_manager = DatabaseManager()
+    db_manager = get_database_manager()
     user_repo = UsuarioRepository(db_manager)
     
     # Buscar todos os usuários
@@ -30,7 +30,7 @@ def listar_usuarios_ativos():
 def conceder_admin_para_usuario(username):
     """Concede permissão de admin para um usuário usando Backend V2"""
     try:
-        db_manager = DatabaseManager()
+        db_manager = get_database_manager()
         
         # Verificar se usuário existe
         result = db_manager.executar_query(
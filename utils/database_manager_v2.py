@@ -10,34 +10,570 @@ from datetime import datetime, timedelta
 from pathlib import Path
 import hashlib
 from contextlib import contextmanager
-from typing import List, Dict, Optional, Tuple, Any
+from typing import List, Dict, Optional, Tuple, Any, Iterator, Callable, Union, Iterable, Sequence
 import streamlit as st
 import json
 import os
+import shutil
+import sys
 import threading
 import time
+import re
+import random
+from collections import OrderedDict, deque
+from itertools import islice
 from functools import lru_cache
 import logging
-from concurrent.futures import ThreadPoolExecutor
+import queue
+import asyncio
+import atexit
+import functools
+from concurrent.futures import ThreadPoolExecutor, Future
+from .hash_transacao import gerar_hashes_transacoes
+
+# Diretórios da stdlib/site-packages, ignorados na pilha do chamador do slow-query log
+_STDLIB_PREFIXOS = tuple({
+    os.path.dirname(os.__file__),
+    os.path.dirname(os.path.dirname(pd.__file__)),
+    '<'
+})
+
+class _BackupReiniciado(Exception):
+    """Interrompe o backup paginado quando a cópia recomeça vezes demais"""
+
+
+class QueryResultCache:
+    """Cache LRU de resultados de queries com orçamento de memória, TTL e tags.
+    
+    Não é thread-safe: o DatabaseManager serializa o acesso com `_cache_lock`.
+    """
+    
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entries: int = 5000,
+                 default_ttl: float = 300.0):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # chave -> (resultado, tags, bytes, expira_em)
+        self._tag_index = {}  # tag -> chaves
+        self.current_bytes = 0
+        self.stats = {
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+            'rejected': 0
+        }
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+    
+    @staticmethod
+    def estimate_size(result: List[sqlite3.Row]) -> int:
+        """Estima bytes ocupados por uma lista de linhas (amostra até 20 linhas)"""
+        size = sys.getsizeof(result)
+        if not result:
+            return size
+        sample = result[:20]
+        sample_size = sum(
+            sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+            for row in sample
+        )
+        return size + sample_size * len(result) // len(sample)
+    
+    def get(self, key: str) -> Optional[List[sqlite3.Row]]:
+        """Retorna o resultado (None se ausente ou expirado) e marca como usado recentemente"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[3] <= time.monotonic():
+            self.discard(key)
+            self.stats['expirations'] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+    
+    def put(self, key: str, result: List[sqlite3.Row], tags: set, ttl: Optional[float] = None) -> bool:
+        """Armazena resultado, removendo as entradas menos usadas se exceder o orçamento"""
+        size = self.estimate_size(result)
+        if size > self.max_bytes // 4:
+            # Um único resultado não pode ocupar mais de 1/4 do orçamento
+            self.stats['rejected'] += 1
+            return False
+        
+        self.discard(key)
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        self._entries[key] = (result, tags, size, expires_at)
+        self.current_bytes += size
+        for tag in tags:
+            self._tag_index.setdefault(tag, set()).add(key)
+        
+        while self._entries and (self.current_bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            self.discard(next(iter(self._entries)))
+            self.stats['evictions'] += 1
+        return True
+    
+    def discard(self, key: str) -> bool:
+        """Remove uma entrada e suas tags"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.current_bytes -= entry[2]
+        for tag in entry[1]:
+            keys = self._tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_index[tag]
+        return True
+    
+    def invalidate(self, table: str, scope: Optional[str] = None) -> int:
+        """Remove entradas que leem a tabela; com escopo, só as do usuário e as sem escopo"""
+        if scope is None:
+            keys = set()
+            for tag in [t for t in self._tag_index if t[0] == table]:
+                keys.update(self._tag_index[tag])
+        else:
+            keys = set(self._tag_index.get((table, scope), ()))
+            keys.update(self._tag_index.get((table, None), ()))
+        
+        for key in keys:
+            self.discard(key)
+        self.stats['invalidations'] += len(keys)
+        return len(keys)
+    
+    def clear(self) -> int:
+        """Remove todas as entradas"""
+        removed = len(self._entries)
+        self._entries.clear()
+        self._tag_index.clear()
+        self.current_bytes = 0
+        self.stats['invalidations'] += removed
+        return removed
+    
+    def trim(self, max_entries: int) -> int:
+        """Mantém apenas as `max_entries` entradas usadas mais recentemente"""
+        removed = 0
+        while len(self._entries) > max_entries:
+            self.discard(next(iter(self._entries)))
+            removed += 1
+        self.stats['evictions'] += removed
+        return removed
+    
+    def purge_expired(self) -> int:
+        """Remove entradas com TTL vencido"""
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if entry[3] <= now]
+        for key in expired:
+            self.discard(key)
+        self.stats['expirations'] += len(expired)
+        return len(expired)
+    
+    def status(self) -> Dict[str, Any]:
+        """Tamanho, orçamento e contadores do cache"""
+        return {
+            'cache_size': len(self._entries),
+            'max_entries': self.max_entries,
+            'memory_bytes': self.current_bytes,
+            'max_memory_bytes': self.max_bytes,
+            'memory_usage_pct': round(self.current_bytes / self.max_bytes * 100, 2) if self.max_bytes else 0.0,
+            'default_ttl_seconds': self.default_ttl,
+            **self.stats
+        }
+
+class QueryMetrics:
+    """Histogramas de latência por fingerprint de query (SQL normalizado)"""
+    
+    # Limites superiores dos buckets em ms (o último é aberto)
+    BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+    MAX_FINGERPRINTS = 500
+    
+    _RE_STRING = re.compile(r"'(?:[^']|'')*'")
+    _RE_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+    _RE_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+    _RE_SPACES = re.compile(r'\s+')
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}  # fingerprint -> estatísticas agregadas
+        self.started_at = time.time()
+    
+    @classmethod
+    def fingerprint(cls, query: str) -> str:
+        """Normaliza a query: literais e listas IN viram placeholders, espaços colapsados"""
+        normalized = cls._RE_STRING.sub('?', query)
+        normalized = cls._RE_NUMBER.sub('?', normalized)
+        normalized = cls._RE_IN_LIST.sub('(?+)', normalized)
+        return cls._RE_SPACES.sub(' ', normalized).strip().lower()
+    
+    def record(self, query: str, duration_ms: float, rows: int = 0, error: bool = False, cache_hit: bool = False):
+        """Registra uma execução (cache hits só incrementam o contador)"""
+        fingerprint = self.fingerprint(query)
+        with self._lock:
+            stats = self._stats.get(fingerprint)
+            if stats is None:
+                if len(self._stats) >= self.MAX_FINGERPRINTS:
+                    # Descartar a fingerprint menos executada para manter memória limitada
+                    del self._stats[min(self._stats, key=lambda k: self._stats[k]['count'])]
+                stats = {
+                    'count': 0, 'cache_hits': 0, 'errors': 0, 'rows': 0,
+                    'total_ms': 0.0, 'max_ms': 0.0,
+                    'buckets': [0] * len(self.BUCKETS_MS),
+                    # SQL original (sem parâmetros) para EXPLAIN QUERY PLAN
+                    'sample': self._RE_SPACES.sub(' ', query).strip()
+                }
+                self._stats[fingerprint] = stats
+            
+            if cache_hit:
+                stats['cache_hits'] += 1
+                return
+            
+            stats['count'] += 1
+            stats['rows'] += rows
+            stats['total_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+            if error:
+                stats['errors'] += 1
+            for i, limit in enumerate(self.BUCKETS_MS):
+                if duration_ms <= limit:
+                    stats['buckets'][i] += 1
+                    break
+    
+    def _percentile(self, buckets: List[int], count: int, max_ms: float, pct: float) -> float:
+        """Estima o percentil interpolando linearmente dentro do bucket"""
+        if count == 0:
+            return 0.0
+        target = count * pct / 100
+        cumulative = 0
+        lower = 0.0
+        for limit, bucket_count in zip(self.BUCKETS_MS, buckets):
+            if bucket_count and cumulative + bucket_count >= target:
+                upper = min(limit, max_ms)
+                return round(lower + (upper - lower) * (target - cumulative) / bucket_count, 3)
+            cumulative += bucket_count
+            lower = limit
+        return round(max_ms, 3)
+    
+    def snapshot(self, limit: Optional[int] = None, order_by: str = 'total_ms') -> List[Dict[str, Any]]:
+        """Resumo por fingerprint (count, p50/p95/p99, linhas), ordenado de forma decrescente"""
+        with self._lock:
+            items = [(fp, dict(stats, buckets=list(stats['buckets']))) for fp, stats in self._stats.items()]
+        
+        summary = []
+        for fingerprint, stats in items:
+            count = stats['count']
+            summary.append({
+                'query': fingerprint,
+                'count': count,
+                'cache_hits': stats['cache_hits'],
+                'errors': stats['errors'],
+                'total_ms': round(stats['total_ms'], 2),
+                'avg_ms': round(stats['total_ms'] / count, 3) if count else 0.0,
+                'p50_ms': self._percentile(stats['buckets'], count, stats['max_ms'], 50),
+                'p95_ms': self._percentile(stats['buckets'], count, stats['max_ms'], 95),
+                'p99_ms': self._percentile(stats['buckets'], count, stats['max_ms'], 99),
+                'max_ms': round(stats['max_ms'], 3),
+                'rows_total': stats['rows'],
+                'avg_rows': round(stats['rows'] / count, 1) if count else 0.0,
+                'sample': stats['sample']
+            })
+        
+        summary.sort(key=lambda item: item.get(order_by, 0), reverse=True)
+        return summary[:limit] if limit else summary
+    
+    def totals(self) -> Dict[str, Any]:
+        """Totais agregados de todas as fingerprints"""
+        with self._lock:
+            count = sum(s['count'] for s in self._stats.values())
+            total_ms = sum(s['total_ms'] for s in self._stats.values())
+            buckets = [sum(column) for column in zip(*(s['buckets'] for s in self._stats.values()))] or [0] * len(self.BUCKETS_MS)
+            max_ms = max((s['max_ms'] for s in self._stats.values()), default=0.0)
+        
+        elapsed_min = max((time.time() - self.started_at) / 60, 1e-9)
+        return {
+            'queries': count,
+            'fingerprints': len(self._stats),
+            'avg_ms': round(total_ms / count, 3) if count else 0.0,
+            'p50_ms': self._percentile(buckets, count, max_ms, 50),
+            'p95_ms': self._percentile(buckets, count, max_ms, 95),
+            'p99_ms': self._percentile(buckets, count, max_ms, 99),
+            'queries_per_minute': round(count / elapsed_min, 2)
+        }
+    
+    def reset(self):
+        """Zera as métricas"""
+        with self._lock:
+            self._stats.clear()
+            self.started_at = time.time()
+
+
+class BufferLogsSistema:
+    """Fila limitada de registros de system_logs, gravados em lote por uma thread própria.
+    
+    registrar() só enfileira, sem esperar a thread escritora. A descarga acontece a
+    cada `intervalo` segundos ou quando a fila chega a `tamanho_lote` registros,
+    com um executemany por bloco. Com a fila cheia, os registros excedentes são
+    contados por (user_id, action) e gravados como uma linha de resumo na próxima
+    descarga. fechar() grava o que restou (também chamado no atexit).
+    """
+    
+    # user_id inexistente vira NULL em vez de derrubar o lote inteiro pela foreign key
+    SQL_INSERT = (
+        "INSERT INTO system_logs (user_id, action, details, ip_address) "
+        "VALUES ((SELECT id FROM usuarios WHERE id = ?), ?, ?, ?)"
+    )
+    
+    def __init__(self, db: 'DatabaseManager', capacidade: int = 10000,
+                 tamanho_lote: int = 500, intervalo: float = 2.0):
+        self.db = db
+        self.capacidade = max(1, int(capacidade))
+        self.tamanho_lote = max(1, int(tamanho_lote))
+        self.intervalo = max(0.01, float(intervalo))
+        self._fila: queue.Queue = queue.Queue(maxsize=self.capacidade)
+        self._agregados: Dict[Tuple[Optional[int], str], int] = {}
+        self._lock = threading.Lock()
+        self._descarga_lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._encerrado = False
+        self._stats = {'registrados': 0, 'agregados': 0, 'gravados': 0, 'descartados': 0, 'descargas': 0}
+        self.logger = logging.getLogger(__name__)
+        self._thread = threading.Thread(target=self._loop, name="richness-log-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.fechar)
+    
+    def registrar(self, action: str, details: Any = None, user_id: Optional[int] = None,
+                  ip_address: Optional[str] = None) -> bool:
+        """Enfileira um registro; False se foi agregado (fila cheia) ou o buffer já foi fechado"""
+        if self._encerrado:
+            return False
+        if details is not None and not isinstance(details, str):
+            details = json.dumps(details, ensure_ascii=False, default=str)
+        try:
+            self._fila.put_nowait((user_id, action, details, ip_address))
+        except queue.Full:
+            with self._lock:
+                chave = (user_id, action)
+                self._agregados[chave] = self._agregados.get(chave, 0) + 1
+                self._stats['agregados'] += 1
+            self._acordar.set()
+            return False
+        with self._lock:
+            self._stats['registrados'] += 1
+        if self._fila.qsize() >= self.tamanho_lote:
+            self._acordar.set()
+        return True
+    
+    def descarregar(self) -> int:
+        """Grava agora tudo o que está na fila e os resumos de excedentes; retorna as linhas gravadas"""
+        with self._descarga_lock:
+            linhas = []
+            while True:
+                try:
+                    linhas.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+            with self._lock:
+                agregados, self._agregados = self._agregados, {}
+            linhas.extend(
+                (user_id, action, json.dumps({'agregados': total, 'motivo': 'fila de logs cheia'}), None)
+                for (user_id, action), total in agregados.items()
+            )
+            if not linhas:
+                return 0
+            
+            try:
+                self.db.executar_many(self.SQL_INSERT, linhas, self.tamanho_lote)
+            except Exception as e:
+                # Sem nova tentativa: logs não podem segurar a fila de escrita
+                with self._lock:
+                    self._stats['descartados'] += len(linhas)
+                self.logger.warning(f"Falha ao gravar {len(linhas)} logs do sistema: {e}")
+                return 0
+            with self._lock:
+                self._stats['gravados'] += len(linhas)
+                self._stats['descargas'] += 1
+            return len(linhas)
+    
+    def _loop(self):
+        """Descarrega a cada intervalo ou quando registrar() sinaliza fila no tamanho do lote"""
+        while not self._encerrado:
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            if not self._encerrado:
+                self.descarregar()
+    
+    def fechar(self, timeout: float = 10.0) -> int:
+        """Para a thread e grava o que restou na fila (antes de encerrar a thread escritora)"""
+        if self._encerrado:
+            return 0
+        self._encerrado = True
+        self._acordar.set()
+        self._thread.join(timeout)
+        atexit.unregister(self.fechar)
+        return self.descarregar()
+    
+    def estatisticas(self) -> Dict[str, Any]:
+        """Contadores do buffer e ocupação atual da fila"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pendentes_agregados'] = sum(self._agregados.values())
+        stats['na_fila'] = self._fila.qsize()
+        stats['capacidade'] = self.capacidade
+        return stats
 
 class DatabaseManager:
     """Gerenciador central do banco de dados com melhores práticas e otimizações"""
     
-    def __init__(self, db_path="richness_v2.db", pool_size=5):
+    # Tabelas base lidas por cada view (usado na invalidação do cache)
+    _VIEW_TABLES = {
+        'vw_dashboard_resumo': ('transacoes',),
+        'vw_estatisticas_categoria': ('resumo_mensal',),
+    }
+    
+    # Tabelas com contagem de linhas mantida por triggers em table_stats
+    _TABELAS_CONTADAS = (
+        'usuarios', 'transacoes', 'categorias_personalizadas',
+        'descricoes_personalizadas', 'transacoes_excluidas',
+        'cache_categorizacao_ia', 'transacoes_manuais', 'system_logs'
+    )
+    
+    # Tabelas escritas indiretamente por triggers
+    _TRIGGER_TABLES = {
+        **{tabela: ('table_stats',) for tabela in _TABELAS_CONTADAS},
+        'transacoes': ('table_stats', 'resumo_mensal', 'transacoes_fts'),
+        'descricoes_personalizadas': ('table_stats', 'transacoes_fts'),
+        'transacoes_excluidas': ('transacoes', 'system_logs', 'table_stats', 'resumo_mensal'),
+    }
+    
+    # Coluna que identifica o usuário em cada tabela (padrão: user_id)
+    _USER_COLUMN = {
+        'usuarios': 'id',
+    }
+    
+    # Máximo de jobs de escrita agrupados em um único commit
+    MAX_GROUP_COMMIT = 64
+    
+    # Jobs em massa (executemany) que sempre têm a transação só para si
+    _JOBS_ISOLADOS = ('many', 'temp')
+    
+    _RE_NOME_TEMPORARIA = re.compile(r'^[a-z_][a-z0-9_]*$', re.IGNORECASE)
+    
+    # Reinícios tolerados no backup paginado antes de cair para cópia em passo único
+    BACKUP_MAX_REINICIOS = 3
+    
+    # Versão do schema criado por init_database (PRAGMA user_version).
+    # Incrementar sempre que tabelas, índices, triggers, views ou o modo de
+    # armazenamento (auto_vacuum) forem alterados, ou quando dados precisarem
+    # ser regravados (v9: hash_transacao canônico em blake2b).
+    SCHEMA_VERSION = 9
+    
+    # Primeira versão com hash_transacao canônico (bancos anteriores são rehasheados)
+    VERSAO_HASH_CANONICO = 9
+    
+    # Transações rehasheadas por commit na migração de hashes
+    MIGRACAO_HASH_LOTE = 5000
+    
+    # Orçamento por execução de manutenção: páginas liberadas pelo incremental_vacuum
+    # (4 MB com páginas de 4 KB) e alterações numa tabela que disparam ANALYZE
+    MANUTENCAO_VACUUM_PAGINAS = 1024
+    MANUTENCAO_ANALYZE_ALTERACOES = 1000
+    # Tamanho do WAL a partir do qual o checkpoint tenta truncar o arquivo
+    MANUTENCAO_WAL_TRUNCATE_MB = 64
+    # Migração para auto_vacuum=INCREMENTAL em banco existente (VACUUM completo):
+    # feita sozinha na janela noturna só até este tamanho; maiores, por
+    # migrar_auto_vacuum(limite_mb=None). Exige espaço livre de FOLGA x o tamanho.
+    MIGRACAO_AUTO_VACUUM_MAX_MB = 256
+    MIGRACAO_AUTO_VACUUM_FOLGA = 1.5
+    
+    # Agenda das verificações de integridade (fora do caminho das requisições):
+    # quick_check periódico e integrity_check completo uma vez por noite
+    QUICK_CHECK_INTERVALO_S = 900
+    INTEGRITY_CHECK_HORA = 3
+    
+    # Slow-query log: limite padrão, capacidade do buffer circular e quadros da
+    # pilha do chamador guardados por registro
+    SLOW_QUERY_MS = 250.0
+    SLOW_QUERY_BUFFER = 200
+    SLOW_QUERY_QUADROS = 4
+    
+    # Buffer de system_logs: capacidade da fila, linhas por executemany e
+    # intervalo máximo entre descargas
+    LOG_BUFFER_CAPACIDADE = 10000
+    LOG_BUFFER_LOTE = 500
+    LOG_BUFFER_INTERVALO_S = 2.0
+    
+    # Marca os jobs que gravam o próprio slow-query log (não são registrados de novo)
+    _CHAMADOR_SLOW_LOG = ['(slow-query log)']
+    
+    _RE_READ_TABLES = re.compile(r'\b(?:from|join)\s+([a-z_][a-z0-9_]*)', re.IGNORECASE)
+    _RE_WRITE_TABLE = re.compile(
+        r'^\s*(?:insert(?:\s+or\s+\w+)?\s+into|replace\s+into|update(?:\s+or\s+\w+)?|delete\s+from)\s+([a-z_][a-z0-9_]*)',
+        re.IGNORECASE
+    )
+    _RE_INSERT_VALUES = re.compile(
+        r'\binto\s+[a-z_][a-z0-9_]*\s*\(([^)]*)\)\s*values\s*\(([^)]*)\)',
+        re.IGNORECASE
+    )
+    
+    def __init__(self, db_path="richness_v2.db", pool_size=5,
+                 cache_max_mb: int = 64, cache_ttl_seconds: float = 300.0):
         self.db_path = db_path
         self.pool_size = pool_size
         self._connection_pool = []
         self._pool_lock = threading.Lock()
-        self._query_cache = {}
+        self._query_cache = QueryResultCache(
+            max_bytes=cache_max_mb * 1024 * 1024,
+            default_ttl=cache_ttl_seconds
+        )
+        self._table_generations = {}  # tabela -> contador de escritas ('*' = limpeza total)
         self._cache_lock = threading.Lock()
-        self._executor = ThreadPoolExecutor(max_workers=3)
+        self._executor = self._criar_executor()
+        self._query_metrics = QueryMetrics()
+        self._backup_config = {
+            'diretorio': 'backups',
+            'max_backups': 7,
+            'paginas_por_passo': 1024,  # 4 MB por passo com páginas de 4 KB
+            'pausa_ms': 50.0
+        }
+        self._backup_lock = threading.Lock()
+        self._backup_cancelar = threading.Event()
+        self._backup_status: Dict[str, Any] = {'em_andamento': False}
+        self._manutencao_config = {
+            'vacuum_paginas': self.MANUTENCAO_VACUUM_PAGINAS,
+            'analyze_alteracoes': self.MANUTENCAO_ANALYZE_ALTERACOES,
+            'wal_truncate_mb': self.MANUTENCAO_WAL_TRUNCATE_MB
+        }
+        self._table_changes: Dict[str, int] = {}  # tabela -> linhas alteradas desde o último ANALYZE
+        self._changes_lock = threading.Lock()
+        self._maintenance_history: List[Dict[str, Any]] = []
+        # Tarefas extras da manutenção agendada (ex.: os shards abertos, no modo particionado)
+        self._ganchos_manutencao: List[Tuple[str, Callable[[], Any]]] = []
+        self._busca_textual: Optional[bool] = None  # transacoes_fts existe (FTS5 disponível)
+        self._slow_query_config = {
+            'ativo': True,
+            'limite_ms': self.SLOW_QUERY_MS,
+            'amostragem': 1.0,  # fração das queries lentas guardadas (todas são contadas)
+            'persistir': False  # também gravar em system_logs (action='slow_query')
+        }
+        self._slow_queries = deque(maxlen=self.SLOW_QUERY_BUFFER)
+        self._buffer_logs: Optional[BufferLogsSistema] = None  # criado no primeiro registro
+        self._buffer_logs_lock = threading.Lock()
+        self._slow_lock = threading.Lock()
+        self._integridade: Dict[str, Optional[Dict[str, Any]]] = {
+            'quick_check': None,
+            'integrity_check': None
+        }
         self._health_stats = {
             'connections_created': 0,
             'queries_executed': 0,
             'cache_hits': 0,
             'cache_misses': 0,
+            'write_jobs': 0,
+            'write_transactions': 0,
             'last_backup': None,
-            'errors': 0
+            'errors': 0,
+            'slow_queries': 0
         }
         
         # Configurar logging
@@ -45,7 +581,13 @@ class DatabaseManager:
         self.logger = logging.getLogger(__name__)
         
         self.init_database()
+        self._start_writer()
         self._schedule_maintenance()
+        self._schedule_health_probe()
+    
+    def _criar_executor(self) -> ThreadPoolExecutor:
+        """Um worker por conexão do pool: chamadas assíncronas não esperam por conexão"""
+        return ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="richness-db")
     
     def _create_connection(self) -> sqlite3.Connection:
         """Cria nova conexão otimizada"""
@@ -63,14 +605,18 @@ class DatabaseManager:
         conn.execute("PRAGMA cache_size = 10000")
         conn.execute("PRAGMA temp_store = MEMORY")
         conn.execute("PRAGMA mmap_size = 268435456")  # 256MB
+        conn.execute("PRAGMA journal_size_limit = 67108864")  # WAL volta a 64MB após checkpoint
         
         conn.row_factory = sqlite3.Row
         self._health_stats['connections_created'] += 1
         return conn
     
     @contextmanager
-    def get_connection(self):
-        """Context manager para conexões com pooling otimizado"""
+    def get_connection(self, user_id: Optional[int] = None):
+        """Context manager para conexões com pooling otimizado.
+        
+        user_id é ignorado aqui; no ShardedDatabaseManager escolhe o shard do usuário.
+        """
         conn = None
         
         # Tentar reutilizar conexão do pool
@@ -112,10 +658,150 @@ class DatabaseManager:
             'random()' not in query_lower and
             len(query) < 1000
         )
+    
+    def _resolve_param(self, params: Optional[List[Any]], position: int) -> Optional[str]:
+        """Retorna o parâmetro da posição indicada como string (None se indisponível)"""
+        if not params or isinstance(params, dict) or position < 0 or position >= len(params):
+            return None
+        value = params[position]
+        return None if value is None else str(value)
+    
+    def _resolve_user_scope(self, query: str, params: Optional[List[Any]], column: str) -> Optional[str]:
+        """Identifica o usuário filtrado por `coluna = ?` na query"""
+        match = re.search(rf'(?<![\w.])(?:\w+\.)?{column}\s*=\s*\?', query, re.IGNORECASE)
+        if not match:
+            return None
+        return self._resolve_param(params, query[:match.end()].count('?') - 1)
+    
+    def _expand_tables(self, tables) -> set:
+        """Substitui views pelas tabelas base que elas leem"""
+        expanded = set()
+        for table in tables:
+            expanded.update(self._VIEW_TABLES.get(table, (table,)))
+        return expanded
+    
+    def _read_tags(self, query: str, params: Optional[List[Any]]) -> set:
+        """Tags (tabela, user_id) de uma query de leitura; user_id None = tabela inteira"""
+        tables = self._expand_tables(t.lower() for t in self._RE_READ_TABLES.findall(query))
+        scope = self._resolve_user_scope(query, params, 'user_id')
+        tags = set()
+        for table in tables:
+            if table in self._USER_COLUMN:
+                # Só é seguro usar a coluna alternativa quando a tabela é lida sozinha
+                table_scope = (
+                    self._resolve_user_scope(query, params, self._USER_COLUMN[table])
+                    if len(tables) == 1 else None
+                )
+            else:
+                table_scope = scope
+            tags.add((table, table_scope))
+        return tags
+    
+    def _write_target(self, query: str, params: Optional[List[Any]]) -> Tuple[Optional[str], Optional[str]]:
+        """Identifica tabela e usuário afetados por um INSERT/UPDATE/DELETE"""
+        match = self._RE_WRITE_TABLE.match(query)
+        if not match:
+            return None, None
+        
+        table = match.group(1).lower()
+        column = self._USER_COLUMN.get(table, 'user_id')
+        
+        if query.lstrip()[:6].lower() in ('insert', 'replac'):
+            values_match = self._RE_INSERT_VALUES.search(query)
+            if not values_match:
+                return table, None
+            columns = [c.strip().lower() for c in values_match.group(1).split(',')]
+            values = [v.strip() for v in values_match.group(2).split(',')]
+            if column not in columns or len(columns) != len(values):
+                return table, None
+            index = columns.index(column)
+            if values[index] != '?':
+                return table, None
+            position = query[:values_match.start(2)].count('?') + sum(v.count('?') for v in values[:index])
+            return table, self._resolve_param(params, position)
+        
+        return table, self._resolve_user_scope(query, params, column)
+    
+    def _cache_store(self, cache_key: str, result: List[sqlite3.Row], tags: set, generations: Dict[str, int]):
+        """Armazena resultado no cache se nenhuma tabela lida foi escrita durante a query"""
+        with self._cache_lock:
+            for table, generation in generations.items():
+                if self._table_generations.get(table, 0) != generation:
+                    return
+            self._query_cache.put(cache_key, result, tags)
+    
+    def _trim_cache(self, max_entries: int):
+        """Remove entradas expiradas e mantém apenas as usadas mais recentemente"""
+        with self._cache_lock:
+            self._query_cache.purge_expired()
+            self._query_cache.trim(max_entries)
+    
+    def configurar_cache(self, max_entries: Optional[int] = None, max_mb: Optional[float] = None,
+                         ttl_seconds: Optional[float] = None):
+        """Ajusta limites do cache de queries, removendo o excedente imediatamente"""
+        with self._cache_lock:
+            if max_entries is not None:
+                self._query_cache.max_entries = max_entries
+            if max_mb is not None:
+                self._query_cache.max_bytes = int(max_mb * 1024 * 1024)
+            if ttl_seconds is not None:
+                self._query_cache.default_ttl = ttl_seconds
+            self._query_cache.trim(self._query_cache.max_entries)
+            while len(self._query_cache) and self._query_cache.current_bytes > self._query_cache.max_bytes:
+                self._query_cache.trim(len(self._query_cache) - 1)
+    
+    def invalidar_cache(self, tabela: Optional[str] = None, user_id: Optional[Any] = None) -> int:
+        """Invalida entradas do cache que leem a tabela (opcionalmente só de um usuário).
+        
+        Sem tabela, limpa o cache inteiro. Com user_id, remove as leituras daquele
+        usuário e as leituras da tabela sem filtro de usuário.
+        """
+        with self._cache_lock:
+            if tabela is None:
+                self._table_generations['*'] = self._table_generations.get('*', 0) + 1
+                return self._query_cache.clear()
+            
+            tables = {tabela.lower()}
+            tables.update(self._TRIGGER_TABLES.get(tabela.lower(), ()))
+            scope = None if user_id is None else str(user_id)
+            
+            removed = 0
+            for table in tables:
+                self._table_generations[table] = self._table_generations.get(table, 0) + 1
+                removed += self._query_cache.invalidate(table, scope)
+            return removed
+    
+    def _invalidate_for_writes(self, queries: List[Tuple[str, Optional[List[Any]]]]):
+        """Invalida o cache das tabelas afetadas pelas escritas"""
+        targets = set()
+        for query, params in queries:
+            table, user_id = self._write_target(query, params)
+            if table is None or (table == 'usuarios' and query.lstrip()[:6].lower() == 'delete'):
+                # DDL, statements não reconhecidos ou cascata de usuário: limpar tudo
+                self.invalidar_cache()
+                return
+            targets.add((table, user_id))
+        
+        for table, user_id in targets:
+            self.invalidar_cache(table, user_id)
 
+    def _schema_atualizado(self) -> bool:
+        """Verifica se o schema do arquivo já está na versão atual"""
+        with self.get_connection() as conn:
+            versao_atual = conn.execute("PRAGMA user_version").fetchone()[0]
+        return versao_atual >= self.SCHEMA_VERSION
+    
     def init_database(self):
         """Inicializa o banco com as tabelas necessárias usando melhores práticas"""
+        if self._schema_atualizado():
+            return
+        
         with self.get_connection() as conn:
+            versao_anterior = conn.execute("PRAGMA user_version").fetchone()[0]
+            
+            # Modo de armazenamento precisa ser definido antes das tabelas
+            self._configurar_auto_vacuum(conn)
+            
             # Tabela de usuários
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS usuarios (
@@ -147,6 +833,7 @@ class DatabaseManager:
                     origem TEXT CHECK(origem IN ('ofx_extrato', 'ofx_cartao', 'manual')) NOT NULL,
                     conta TEXT,
                     arquivo_origem TEXT,
+                    excluida INTEGER NOT NULL DEFAULT 0, -- espelho de transacoes_excluidas (triggers)
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (user_id) REFERENCES usuarios(id) ON DELETE CASCADE,
@@ -358,16 +1045,209 @@ class DatabaseManager:
                 )
             """)
             
+            # Contagem de linhas mantida por triggers (user_id = 0: total da tabela)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS table_stats (
+                    tabela TEXT NOT NULL,
+                    user_id INTEGER NOT NULL DEFAULT 0,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (tabela, user_id)
+                ) WITHOUT ROWID
+            """)
+            table_stats_nova = conn.execute(
+                "SELECT COUNT(*) FROM table_stats"
+            ).fetchone()[0] == 0
+            
+            # Agregados mensais por usuário/categoria/origem (mantidos por triggers;
+            # só transações não excluídas; despesas em valor absoluto)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS resumo_mensal (
+                    user_id INTEGER NOT NULL,
+                    ano_mes TEXT NOT NULL, -- AAAA-MM
+                    categoria TEXT NOT NULL,
+                    origem TEXT NOT NULL,
+                    receitas DECIMAL(15,2) NOT NULL DEFAULT 0,
+                    despesas DECIMAL(15,2) NOT NULL DEFAULT 0,
+                    qtd_receitas INTEGER NOT NULL DEFAULT 0,
+                    qtd_despesas INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (user_id, ano_mes, categoria, origem)
+                ) WITHOUT ROWID
+            """)
+            resumo_mensal_novo = conn.execute(
+                "SELECT COUNT(*) FROM resumo_mensal"
+            ).fetchone()[0] == 0
+            
+            # Coluna excluida em bancos anteriores (precisa existir antes dos índices parciais)
+            self._migrar_coluna_excluida(conn)
+            
             # Índices para performance otimizada
             self._criar_indices(conn)
             
             # Triggers para auditoria automática
             self._criar_triggers(conn)
+            
+            # Índice textual (FTS5) de descrições e notas
+            indice_busca_novo = self._criar_indice_busca(conn)
               # Views materializadas para relatórios
             self._criar_views(conn)
             
             # Executar migrações necessárias
             self._migrate_database()
+            
+            # Hashes MD5 antigos -> chave canônica (o resumo é refeito logo abaixo)
+            if versao_anterior < self.VERSAO_HASH_CANONICO and self._migrar_hashes_transacoes(conn):
+                resumo_mensal_novo = True
+            
+            # Popular os contadores a partir dos dados já existentes
+            if table_stats_nova:
+                for query, params in self._queries_recontagem():
+                    conn.execute(query, params)
+            if resumo_mensal_novo:
+                for query, params in self._queries_resumo_mensal():
+                    conn.execute(query, params)
+            if indice_busca_novo:
+                for query, params in self._queries_indice_busca():
+                    conn.execute(query, params)
+            
+            conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+    
+    def _configurar_auto_vacuum(self, conn):
+        """Cria bancos novos com auto_vacuum=INCREMENTAL (libera páginas sem VACUUM completo).
+        
+        Em banco que já tem tabelas a troca exige reescrever o arquivo inteiro; isso
+        não é feito na inicialização, e sim por migrar_auto_vacuum().
+        """
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return
+        
+        if conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0:
+            # Arquivo vazio (já inicializado pelo journal_mode=WAL): o VACUUM é instantâneo
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            return
+        
+        self.logger.warning(
+            "auto_vacuum não é INCREMENTAL neste banco: migração pendente "
+            "(migrar_auto_vacuum, na manutenção noturna ou por script)"
+        )
+    
+    def migrar_auto_vacuum(self, limite_mb: Optional[float] = None) -> Dict[str, Any]:
+        """Converte um banco existente para auto_vacuum=INCREMENTAL com um VACUUM completo.
+        
+        O VACUUM bloqueia leituras e escritas enquanto reescreve o arquivo e precisa
+        de espaço livre próximo ao tamanho do banco. Só roda se o banco couber em
+        `limite_mb` (None = sem limite) e houver MIGRACAO_AUTO_VACUUM_FOLGA vezes o
+        tamanho livre em disco.
+        """
+        conn = self._create_connection()
+        try:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                return {'executado': False, 'motivo': 'auto_vacuum já é INCREMENTAL'}
+            
+            tamanho = conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+            tamanho_mb = tamanho / (1024 * 1024)
+            livre = shutil.disk_usage(os.path.dirname(os.path.abspath(self.db_path))).free
+            resultado = {'tamanho_mb': round(tamanho_mb, 2), 'livre_mb': round(livre / (1024 * 1024), 2)}
+            if limite_mb is not None and tamanho_mb > limite_mb:
+                return {**resultado, 'executado': False, 'motivo': f'banco acima de {limite_mb} MB'}
+            if livre < tamanho * self.MIGRACAO_AUTO_VACUUM_FOLGA:
+                return {**resultado, 'executado': False, 'motivo': 'espaço livre insuficiente para o VACUUM'}
+            
+            start = time.perf_counter()
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            resultado['duracao_s'] = round(time.perf_counter() - start, 2)
+        finally:
+            conn.close()
+        
+        # Conexões do pool abertas antes podem reportar o modo antigo até a próxima leitura
+        with self._pool_lock:
+            conexoes, self._connection_pool = self._connection_pool, []
+        for antiga in conexoes:
+            antiga.close()
+        
+        self.logger.info(f"auto_vacuum=INCREMENTAL aplicado em {resultado['duracao_s']}s ({resultado['tamanho_mb']} MB)")
+        return {**resultado, 'executado': True}
+    
+    def _migrar_coluna_excluida(self, conn):
+        """Adiciona transacoes.excluida e preenche a partir de transacoes_excluidas"""
+        colunas = [row[1] for row in conn.execute("PRAGMA table_info(transacoes)")]
+        if 'excluida' in colunas:
+            return
+        
+        conn.execute("ALTER TABLE transacoes ADD COLUMN excluida INTEGER NOT NULL DEFAULT 0")
+        marcadas = conn.execute("""
+            UPDATE transacoes SET excluida = 1
+            WHERE EXISTS (
+                SELECT 1 FROM transacoes_excluidas te
+                WHERE te.user_id = transacoes.user_id AND te.hash_transacao = transacoes.hash_transacao
+            )
+        """).rowcount
+        self.logger.info(f"Adicionada coluna excluida à tabela transacoes ({marcadas} marcadas)")
+    
+    def _migrar_hashes_transacoes(self, conn) -> int:
+        """Regrava hash_transacao com o hash canônico, em lotes de MIGRACAO_HASH_LOTE.
+        
+        Exclusões e descrições personalizadas acompanham o novo hash no mesmo
+        commit. Uma transação cujo hash novo colidiria com outra do usuário
+        (mesma data, descrição e centavos) mantém o antigo, assim como as
+        linhas ligadas a ela.
+        """
+        start = time.perf_counter()
+        migradas = 0
+        ultimo_id = 0
+        while True:
+            linhas = conn.execute("""
+                SELECT id, user_id, hash_transacao, data, descricao, valor
+                FROM transacoes WHERE id > ? ORDER BY id LIMIT ?
+            """, [ultimo_id, self.MIGRACAO_HASH_LOTE]).fetchall()
+            if not linhas:
+                break
+            ultimo_id = linhas[-1]['id']
+            
+            novos = gerar_hashes_transacoes(
+                [row['data'] for row in linhas],
+                [row['descricao'] for row in linhas],
+                [row['valor'] for row in linhas],
+            )
+            alteradas = [(row, novo) for row, novo in zip(linhas, novos) if novo != row['hash_transacao']]
+            if not alteradas:
+                continue
+            
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = conn.executemany(
+                    "UPDATE OR IGNORE transacoes SET hash_transacao = ? WHERE id = ?",
+                    [(novo, row['id']) for row, novo in alteradas]
+                )
+                # Só acompanham o hash novo as linhas cuja transação foi de fato regravada
+                mapa = [(novo, row['user_id'], row['hash_transacao'], row['id'], novo) for row, novo in alteradas]
+                for tabela in ('transacoes_excluidas', 'descricoes_personalizadas'):
+                    conn.executemany(f"""
+                        UPDATE OR IGNORE {tabela} SET hash_transacao = ?
+                        WHERE user_id = ? AND hash_transacao = ?
+                          AND EXISTS (SELECT 1 FROM transacoes WHERE id = ? AND hash_transacao = ?)
+                    """, mapa)
+                # O trigger de update recalculou excluida antes das exclusões mudarem de hash
+                conn.executemany("""
+                    UPDATE transacoes SET excluida = EXISTS (
+                        SELECT 1 FROM transacoes_excluidas te
+                        WHERE te.user_id = transacoes.user_id AND te.hash_transacao = transacoes.hash_transacao
+                    )
+                    WHERE id = ?
+                """, [(row['id'],) for row, _ in alteradas])
+                migradas += max(cursor.rowcount, 0)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        
+        if migradas:
+            self.logger.info(
+                f"hash_transacao migrado para blake2b em {migradas} transações "
+                f"({time.perf_counter() - start:.1f}s)"
+            )
+        return migradas
     
     def _criar_indices(self, conn):
         """Cria índices otimizados para performance"""
@@ -378,6 +1258,10 @@ class DatabaseManager:
             "CREATE INDEX IF NOT EXISTS idx_transacoes_hash ON transacoes(user_id, hash_transacao)",
             "CREATE INDEX IF NOT EXISTS idx_transacoes_origem_data ON transacoes(user_id, origem, data DESC)",
             
+            # Índices parciais só com transações ativas (consultas com excluida = 0)
+            "CREATE INDEX IF NOT EXISTS idx_transacoes_ativas_data ON transacoes(user_id, data DESC, id DESC) WHERE excluida = 0",
+            "CREATE INDEX IF NOT EXISTS idx_transacoes_ativas_categoria ON transacoes(user_id, categoria, data DESC) WHERE excluida = 0",
+            
             # Índices para joins otimizados
             "CREATE INDEX IF NOT EXISTS idx_descricoes_hash ON descricoes_personalizadas(user_id, hash_transacao)",
             "CREATE INDEX IF NOT EXISTS idx_excluidas_hash ON transacoes_excluidas(user_id, hash_transacao)",
@@ -465,6 +1349,136 @@ class DatabaseManager:
             END
         """)
         
+        # Triggers de contagem de linhas (table_stats)
+        for tabela in self._TABELAS_CONTADAS:
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS table_stats_{tabela}_insert
+                AFTER INSERT ON {tabela}
+                BEGIN
+                    INSERT INTO table_stats (tabela, user_id, total) VALUES ('{tabela}', 0, 1)
+                    ON CONFLICT(tabela, user_id) DO UPDATE SET total = total + 1;
+                END
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS table_stats_{tabela}_delete
+                AFTER DELETE ON {tabela}
+                BEGIN
+                    UPDATE table_stats SET total = total - 1
+                    WHERE tabela = '{tabela}' AND user_id = 0;
+                END
+            """)
+        
+        # Contagem por usuário das transações
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS table_stats_transacoes_usuario_insert
+            AFTER INSERT ON transacoes
+            BEGIN
+                INSERT INTO table_stats (tabela, user_id, total) VALUES ('transacoes', NEW.user_id, 1)
+                ON CONFLICT(tabela, user_id) DO UPDATE SET total = total + 1;
+            END
+        """)
+        
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS table_stats_transacoes_usuario_delete
+            AFTER DELETE ON transacoes
+            BEGIN
+                UPDATE table_stats SET total = total - 1
+                WHERE tabela = 'transacoes' AND user_id = OLD.user_id;
+            END
+        """)
+        
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS table_stats_transacoes_usuario_update
+            AFTER UPDATE OF user_id ON transacoes
+            WHEN NEW.user_id != OLD.user_id
+            BEGIN
+                UPDATE table_stats SET total = total - 1
+                WHERE tabela = 'transacoes' AND user_id = OLD.user_id;
+                INSERT INTO table_stats (tabela, user_id, total) VALUES ('transacoes', NEW.user_id, 1)
+                ON CONFLICT(tabela, user_id) DO UPDATE SET total = total + 1;
+            END
+        """)
+        
+        # Triggers do resumo_mensal: cada evento soma (+1) ou subtrai (-1) a transação
+        # do agregado do seu mês/categoria/origem
+        nao_excluida = """
+            WHERE NOT EXISTS (
+                SELECT 1 FROM transacoes_excluidas te
+                WHERE te.user_id = {ref}.user_id AND te.hash_transacao = {ref}.hash_transacao
+            )
+        """
+        da_exclusao = """
+            FROM transacoes t
+            WHERE t.user_id = {ref}.user_id AND t.hash_transacao = {ref}.hash_transacao
+        """
+        gatilhos_resumo = [
+            ('resumo_mensal_insert', 'AFTER INSERT ON transacoes',
+             [self._sql_ajuste_resumo('NEW', 1, nao_excluida.format(ref='NEW'))]),
+            ('resumo_mensal_delete', 'AFTER DELETE ON transacoes',
+             [self._sql_ajuste_resumo('OLD', -1, nao_excluida.format(ref='OLD'))]),
+            ('resumo_mensal_update',
+             'AFTER UPDATE OF user_id, hash_transacao, data, valor, categoria, origem ON transacoes',
+             [self._sql_ajuste_resumo('OLD', -1, nao_excluida.format(ref='OLD')),
+              self._sql_ajuste_resumo('NEW', 1, nao_excluida.format(ref='NEW'))]),
+            ('resumo_mensal_exclusao', 'AFTER INSERT ON transacoes_excluidas',
+             [self._sql_ajuste_resumo('t', -1, da_exclusao.format(ref='NEW'))]),
+            ('resumo_mensal_restauracao', 'AFTER DELETE ON transacoes_excluidas',
+             [self._sql_ajuste_resumo('t', 1, da_exclusao.format(ref='OLD'))]),
+        ]
+        for nome, evento, comandos in gatilhos_resumo:
+            corpo = ";\n".join(comandos)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {nome}
+                {evento}
+                BEGIN
+                    {corpo};
+                END
+            """)
+        
+        # Flag excluida em transacoes espelha transacoes_excluidas
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS marcar_transacao_excluida
+            AFTER INSERT ON transacoes_excluidas
+            BEGIN
+                UPDATE transacoes SET excluida = 1
+                WHERE user_id = NEW.user_id AND hash_transacao = NEW.hash_transacao;
+            END
+        """)
+        
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS desmarcar_transacao_excluida
+            AFTER DELETE ON transacoes_excluidas
+            BEGIN
+                UPDATE transacoes SET excluida = 0
+                WHERE user_id = OLD.user_id AND hash_transacao = OLD.hash_transacao;
+            END
+        """)
+        
+        # Transação (re)importada cujo hash já estava excluído
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS sincronizar_excluida_transacao
+            AFTER INSERT ON transacoes
+            WHEN EXISTS (
+                SELECT 1 FROM transacoes_excluidas te
+                WHERE te.user_id = NEW.user_id AND te.hash_transacao = NEW.hash_transacao
+            )
+            BEGIN
+                UPDATE transacoes SET excluida = 1 WHERE id = NEW.id;
+            END
+        """)
+        
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS sincronizar_excluida_transacao_update
+            AFTER UPDATE OF user_id, hash_transacao ON transacoes
+            BEGIN
+                UPDATE transacoes SET excluida = EXISTS (
+                    SELECT 1 FROM transacoes_excluidas te
+                    WHERE te.user_id = NEW.user_id AND te.hash_transacao = NEW.hash_transacao
+                )
+                WHERE id = NEW.id;
+            END
+        """)
+        
         # Trigger para log de exclusões
         conn.execute("""
             CREATE TRIGGER IF NOT EXISTS log_exclusoes
@@ -476,11 +1490,151 @@ class DatabaseManager:
             END
         """)
     
+    def _criar_indice_busca(self, conn) -> bool:
+        """Cria a tabela FTS5 transacoes_fts (rowid = transacoes.id) e seus triggers.
+        
+        Retorna True se o índice está vazio e precisa ser populado. Sem suporte a
+        FTS5 no SQLite, apenas registra o aviso: a busca cai para LIKE.
+        """
+        try:
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS transacoes_fts USING fts5(
+                    descricao,
+                    nota,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '2 3'
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            self.logger.warning(f"FTS5 indisponível, busca textual usará LIKE: {e}")
+            return False
+        
+        nota_sql = """(
+            SELECT dp.descricao FROM descricoes_personalizadas dp
+            WHERE dp.user_id = NEW.user_id AND dp.hash_transacao = NEW.hash_transacao
+        )"""
+        gatilhos_busca = [
+            ("transacoes_fts_insert", "AFTER INSERT ON transacoes",
+             [f"INSERT INTO transacoes_fts (rowid, descricao, nota) VALUES (NEW.id, NEW.descricao, {nota_sql})"]),
+            ("transacoes_fts_delete", "AFTER DELETE ON transacoes",
+             ["DELETE FROM transacoes_fts WHERE rowid = OLD.id"]),
+            ("transacoes_fts_update", "AFTER UPDATE OF descricao, user_id, hash_transacao ON transacoes",
+             [f"UPDATE transacoes_fts SET descricao = NEW.descricao, nota = {nota_sql} WHERE rowid = NEW.id"]),
+            ("transacoes_fts_nota_insert", "AFTER INSERT ON descricoes_personalizadas",
+             ["""UPDATE transacoes_fts SET nota = NEW.descricao WHERE rowid IN (
+                    SELECT id FROM transacoes WHERE user_id = NEW.user_id AND hash_transacao = NEW.hash_transacao
+                )"""]),
+            ("transacoes_fts_nota_update", "AFTER UPDATE OF user_id, hash_transacao, descricao ON descricoes_personalizadas",
+             ["""UPDATE transacoes_fts SET nota = NULL WHERE rowid IN (
+                    SELECT id FROM transacoes WHERE user_id = OLD.user_id AND hash_transacao = OLD.hash_transacao
+                )""",
+              """UPDATE transacoes_fts SET nota = NEW.descricao WHERE rowid IN (
+                    SELECT id FROM transacoes WHERE user_id = NEW.user_id AND hash_transacao = NEW.hash_transacao
+                )"""]),
+            ("transacoes_fts_nota_delete", "AFTER DELETE ON descricoes_personalizadas",
+             ["""UPDATE transacoes_fts SET nota = NULL WHERE rowid IN (
+                    SELECT id FROM transacoes WHERE user_id = OLD.user_id AND hash_transacao = OLD.hash_transacao
+                )"""]),
+        ]
+        for nome, evento, comandos in gatilhos_busca:
+            corpo = ";\n".join(comandos)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {nome}
+                {evento}
+                BEGIN
+                    {corpo};
+                END
+            """)
+        
+        return conn.execute("SELECT COUNT(*) FROM transacoes_fts").fetchone()[0] == 0
+    
+    @staticmethod
+    def _queries_indice_busca() -> List[Tuple[str, List[Any]]]:
+        """Statements que reconstroem o transacoes_fts a partir de transacoes e descricoes_personalizadas"""
+        return [
+            ("DELETE FROM transacoes_fts", []),
+            ("""
+                INSERT INTO transacoes_fts (rowid, descricao, nota)
+                SELECT t.id, t.descricao, dp.descricao
+                FROM transacoes t
+                LEFT JOIN descricoes_personalizadas dp
+                    ON dp.user_id = t.user_id AND dp.hash_transacao = t.hash_transacao
+            """, []),
+        ]
+    
+    def reconstruir_indice_busca(self) -> int:
+        """Recria o índice textual a partir das tabelas de origem; retorna as linhas indexadas"""
+        if not self.busca_textual_disponivel():
+            return 0
+        resultados = self.executar_batch(self._queries_indice_busca())
+        return resultados[-1]
+    
+    def busca_textual_disponivel(self) -> bool:
+        """Indica se o índice FTS5 transacoes_fts existe neste banco"""
+        if self._busca_textual is None:
+            with self.get_connection() as conn:
+                self._busca_textual = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transacoes_fts'"
+                ).fetchone() is not None
+        return self._busca_textual
+    
+    @staticmethod
+    def _sql_ajuste_resumo(ref: str, sinal: int, origem_sql: str) -> str:
+        """UPSERT que soma (sinal=1) ou subtrai (sinal=-1) a transação `ref` do resumo_mensal"""
+        return f"""
+            INSERT INTO resumo_mensal (
+                user_id, ano_mes, categoria, origem,
+                receitas, despesas, qtd_receitas, qtd_despesas
+            )
+            SELECT
+                {ref}.user_id, substr({ref}.data, 1, 7), COALESCE({ref}.categoria, 'Outros'), {ref}.origem,
+                {sinal} * (CASE WHEN {ref}.valor > 0 THEN {ref}.valor ELSE 0 END),
+                {sinal} * (CASE WHEN {ref}.valor < 0 THEN -{ref}.valor ELSE 0 END),
+                {sinal} * (CASE WHEN {ref}.valor > 0 THEN 1 ELSE 0 END),
+                {sinal} * (CASE WHEN {ref}.valor < 0 THEN 1 ELSE 0 END)
+            {origem_sql}
+            ON CONFLICT(user_id, ano_mes, categoria, origem) DO UPDATE SET
+                receitas = receitas + excluded.receitas,
+                despesas = despesas + excluded.despesas,
+                qtd_receitas = qtd_receitas + excluded.qtd_receitas,
+                qtd_despesas = qtd_despesas + excluded.qtd_despesas
+        """
+    
+    def _queries_resumo_mensal(self, user_id: Optional[int] = None) -> List[Tuple[str, List[Any]]]:
+        """Statements que reconstroem o resumo_mensal (todo ou de um usuário) a partir de transacoes"""
+        filtro = "" if user_id is None else "WHERE user_id = ?"
+        filtro_t = "" if user_id is None else "AND t.user_id = ?"
+        params = [] if user_id is None else [user_id]
+        return [
+            (f"DELETE FROM resumo_mensal {filtro}", params),
+            (f"""
+                INSERT INTO resumo_mensal (
+                    user_id, ano_mes, categoria, origem,
+                    receitas, despesas, qtd_receitas, qtd_despesas
+                )
+                SELECT
+                    t.user_id, substr(t.data, 1, 7), COALESCE(t.categoria, 'Outros'), t.origem,
+                    SUM(CASE WHEN t.valor > 0 THEN t.valor ELSE 0 END),
+                    SUM(CASE WHEN t.valor < 0 THEN -t.valor ELSE 0 END),
+                    SUM(CASE WHEN t.valor > 0 THEN 1 ELSE 0 END),
+                    SUM(CASE WHEN t.valor < 0 THEN 1 ELSE 0 END)
+                FROM transacoes t
+                WHERE t.excluida = 0 {filtro_t}
+                GROUP BY t.user_id, substr(t.data, 1, 7), COALESCE(t.categoria, 'Outros'), t.origem
+            """, params),
+        ]
+    
+    def reconstruir_resumo_mensal(self, user_id: Optional[int] = None) -> int:
+        """Recalcula o resumo_mensal a partir das transações (correção de divergências)"""
+        resultados = self.executar_batch(self._queries_resumo_mensal(user_id))
+        return resultados[-1]
+    
     def _criar_views(self, conn):
         """Cria views materializadas para relatórios"""
         # View para dashboard resumo
+        conn.execute("DROP VIEW IF EXISTS vw_dashboard_resumo")
         conn.execute("""
-            CREATE VIEW IF NOT EXISTS vw_dashboard_resumo AS
+            CREATE VIEW vw_dashboard_resumo AS
             SELECT 
                 t.user_id,
                 COUNT(*) as total_transacoes,
@@ -489,26 +1643,25 @@ class DatabaseManager:
                 MAX(t.data) as ultima_transacao,
                 COUNT(DISTINCT t.categoria) as categorias_utilizadas
             FROM transacoes t
-            LEFT JOIN transacoes_excluidas te ON t.user_id = te.user_id AND t.hash_transacao = te.hash_transacao
-            WHERE te.hash_transacao IS NULL
+            WHERE t.excluida = 0
             GROUP BY t.user_id
         """)
         
-        # View para estatísticas por categoria
+        # View para estatísticas por categoria (lida dos agregados do resumo_mensal)
+        conn.execute("DROP VIEW IF EXISTS vw_estatisticas_categoria")
         conn.execute("""
-            CREATE VIEW IF NOT EXISTS vw_estatisticas_categoria AS
+            CREATE VIEW vw_estatisticas_categoria AS
             SELECT 
-                t.user_id,
-                t.categoria,
-                COUNT(*) as total_transacoes,
-                SUM(CASE WHEN t.valor > 0 THEN t.valor ELSE 0 END) as receitas,
-                SUM(CASE WHEN t.valor < 0 THEN ABS(t.valor) ELSE 0 END) as despesas,
-                AVG(CASE WHEN t.valor < 0 THEN ABS(t.valor) END) as media_despesas,
-                strftime('%Y-%m', MAX(t.data)) as ultimo_mes
-            FROM transacoes t
-            LEFT JOIN transacoes_excluidas te ON t.user_id = te.user_id AND t.hash_transacao = te.hash_transacao
-            WHERE te.hash_transacao IS NULL
-            GROUP BY t.user_id, t.categoria
+                r.user_id,
+                r.categoria,
+                SUM(r.qtd_receitas + r.qtd_despesas) as total_transacoes,
+                SUM(r.receitas) as receitas,
+                SUM(r.despesas) as despesas,
+                SUM(r.despesas) / NULLIF(SUM(r.qtd_despesas), 0) as media_despesas,
+                MAX(CASE WHEN r.qtd_receitas + r.qtd_despesas > 0 THEN r.ano_mes END) as ultimo_mes
+            FROM resumo_mensal r
+            GROUP BY r.user_id, r.categoria
+            HAVING SUM(r.qtd_receitas + r.qtd_despesas) > 0
         """)
     
     def _schedule_maintenance(self):
@@ -524,91 +1677,559 @@ class DatabaseManager:
         maintenance_thread = threading.Thread(target=maintenance_worker, daemon=True)
         maintenance_thread.start()
     
-    def _run_maintenance(self):
-        """Executa tarefas de manutenção"""
-        try:
-            # Limpeza de cache antigo
-            with self._cache_lock:
-                if len(self._query_cache) > 500:
-                    # Manter apenas os 200 mais recentes
-                    items = list(self._query_cache.items())[-200:]
-                    self._query_cache = dict(items)
-            
-            # Backup automático diário
-            now = datetime.now()
-            last_backup = self._health_stats.get('last_backup')
-            
-            if not last_backup or (now - last_backup).days >= 1:
-                self.backup_database()
-                self._health_stats['last_backup'] = now
-            
-            # VACUUM periódico
-            if now.hour == 3:  # 3h da manhã
-                with self.get_connection() as conn:
-                    conn.execute("VACUUM")
-                    
-        except Exception as e:
-            self.logger.error(f"Erro na manutenção: {e}")
-
-    def executar_query(self, query: str, params: Optional[List[Any]] = None) -> List[sqlite3.Row]:
-        """Executa query SELECT de forma segura com cache"""
-        cache_key = f"{query}|{str(params or [])}"
-        
-        # Verificar cache
-        if self._should_cache_query(query):
-            with self._cache_lock:
-                if cache_key in self._query_cache:
-                    self._health_stats['cache_hits'] += 1
-                    return self._query_cache[cache_key]
-                else:
-                    self._health_stats['cache_misses'] += 1
+    def _schedule_health_probe(self):
+        """Agenda o quick_check periódico (o primeiro roda logo na inicialização)"""
+        def health_worker():
+            while True:
+                try:
+                    self.verificar_integridade(completa=False)
+                except Exception as e:
+                    self.logger.error(f"Erro no quick_check: {e}")
+                time.sleep(self.QUICK_CHECK_INTERVALO_S)
         
-        with self.get_connection() as conn:
-            self._health_stats['queries_executed'] += 1
-            if params:
-                result = conn.execute(query, params).fetchall()
-            else:
-                result = conn.execute(query).fetchall()
-            
-            # Salvar no cache se apropriado
-            if self._should_cache_query(query) and len(result) < 1000:
-                with self._cache_lock:
-                    self._query_cache[cache_key] = result
-            
-            return result
+        health_thread = threading.Thread(target=health_worker, daemon=True, name="richness-db-health")
+        health_thread.start()
     
-    def executar_query_df(self, query: str, params: Optional[List[Any]] = None) -> pd.DataFrame:
-        """Executa query e retorna DataFrame pandas"""
+    def verificar_integridade(self, completa: bool = False) -> Dict[str, Any]:
+        """Executa PRAGMA quick_check (ou integrity_check, se completa) e guarda o resultado"""
+        pragma = 'integrity_check' if completa else 'quick_check'
+        start = time.perf_counter()
         with self.get_connection() as conn:
-            self._health_stats['queries_executed'] += 1
-            return pd.read_sql_query(query, conn, params=params or [])
+            mensagens = [row[0] for row in conn.execute(f"PRAGMA {pragma}(20)").fetchall()]
+        
+        resultado = {
+            'ok': mensagens == ['ok'],
+            'mensagens': [] if mensagens == ['ok'] else mensagens,
+            'verificado_em': datetime.now(),
+            'duracao_ms': round((time.perf_counter() - start) * 1000, 2)
+        }
+        self._integridade[pragma] = resultado
+        if not resultado['ok']:
+            self.logger.error(f"PRAGMA {pragma} encontrou problemas: {mensagens[:5]}")
+        return resultado
     
-    def executar_insert(self, query: str, params: Optional[List[Any]] = None) -> int:
-        """Executa INSERT e retorna o ID gerado"""
-        with self.get_connection() as conn:
-            cursor = conn.execute(query, params or [])
-            return cursor.lastrowid or 0
+    def obter_status_integridade(self) -> Dict[str, Any]:
+        """Últimos resultados de quick_check/integrity_check, sem executar nada"""
+        return {
+            tipo: dict(resultado) if resultado else None
+            for tipo, resultado in self._integridade.items()
+        }
     
-    def executar_update(self, query: str, params: Optional[List[Any]] = None) -> int:
-        """Executa UPDATE/DELETE e retorna quantidade de linhas afetadas"""
-        with self.get_connection() as conn:
-            cursor = conn.execute(query, params or [])
-            return cursor.rowcount
+    def _integrity_check_noturno(self) -> Dict[str, Any]:
+        """integrity_check completo na janela noturna, no máximo uma vez por dia"""
+        ultimo = self._integridade['integrity_check']
+        now = datetime.now()
+        if now.hour != self.INTEGRITY_CHECK_HORA:
+            return {'executado': False}
+        if ultimo and now - ultimo['verificado_em'] < timedelta(hours=20):
+            return {'executado': False}
+        
+        resultado = self.verificar_integridade(completa=True)
+        return {'executado': True, 'ok': resultado['ok']}
     
-    def executar_batch(self, queries: List[Tuple[str, List[Any]]]) -> List[int]:
-        """Executa múltiplas queries em uma transação"""
-        results = []
-        with self.get_connection() as conn:
-            conn.execute("BEGIN TRANSACTION")
+    def _run_maintenance(self) -> Dict[str, Any]:
+        """Executa tarefas de manutenção e registra o que foi feito e quanto levou"""
+        relatorio = {'inicio': datetime.now().isoformat(), 'tarefas': {}}
+        inicio = time.perf_counter()
+        
+        def _tarefa(nome, func):
+            start = time.perf_counter()
             try:
-                for query, params in queries:
-                    cursor = conn.execute(query, params)
-                    results.append(cursor.rowcount)
-                conn.execute("COMMIT")
-                return results
+                resultado = func()
+                relatorio['tarefas'][nome] = {'resultado': resultado}
             except Exception as e:
+                self.logger.error(f"Erro na manutenção ({nome}): {e}")
+                relatorio['tarefas'][nome] = {'erro': str(e)}
+            relatorio['tarefas'][nome]['duracao_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        
+        # Limpeza de entradas expiradas do cache
+        def _limpar_cache():
+            with self._cache_lock:
+                return {'entradas_removidas': self._query_cache.purge_expired()}
+        _tarefa('cache', _limpar_cache)
+        
+        # Backup automático diário
+        last_backup = self._health_stats.get('last_backup')
+        if not last_backup or (datetime.now() - last_backup).days >= 1:
+            def _backup():
+                arquivo = self.backup_database()
+                return {'arquivo': arquivo, 'removidos': len(self.rotacionar_backups())}
+            _tarefa('backup', _backup)
+        
+        _tarefa('wal_checkpoint', self._checkpoint_wal)
+        _tarefa('incremental_vacuum', self._vacuum_incremental)
+        if datetime.now().hour == self.INTEGRITY_CHECK_HORA:
+            _tarefa('migrar_auto_vacuum', lambda: self.migrar_auto_vacuum(self.MIGRACAO_AUTO_VACUUM_MAX_MB))
+        _tarefa('optimize', self._otimizar_estatisticas)
+        _tarefa('integrity_check', self._integrity_check_noturno)
+        if datetime.now().hour == self.INTEGRITY_CHECK_HORA:
+            _tarefa('reconcile_table_stats', self.reconciliar_table_stats)
+        for nome, func in list(self._ganchos_manutencao):
+            _tarefa(nome, func)
+        
+        relatorio['duracao_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+        self._maintenance_history.append(relatorio)
+        del self._maintenance_history[:-50]
+        self.logger.info(
+            f"Manutenção concluída em {relatorio['duracao_ms']}ms: "
+            + ", ".join(f"{nome}={dados['duracao_ms']}ms" for nome, dados in relatorio['tarefas'].items())
+        )
+        return relatorio
+    
+    def _checkpoint_wal(self) -> Dict[str, Any]:
+        """Checkpoint PASSIVE (não bloqueia); TRUNCATE quando o WAL passa do limite"""
+        wal_path = f"{self.db_path}-wal"
+        wal_mb = os.path.getsize(wal_path) / (1024 * 1024) if os.path.exists(wal_path) else 0.0
+        modo = 'TRUNCATE' if wal_mb > self._manutencao_config['wal_truncate_mb'] else 'PASSIVE'
+        
+        with self.get_connection() as conn:
+            busy, log, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({modo})").fetchone()
+        
+        return {
+            'modo': modo,
+            'wal_mb_antes': round(wal_mb, 2),
+            'ocupado': bool(busy),
+            'paginas_wal': log,
+            'paginas_copiadas': checkpointed
+        }
+    
+    def _vacuum_incremental(self) -> Dict[str, Any]:
+        """Devolve ao sistema até `vacuum_paginas` páginas livres (PRAGMA incremental_vacuum)"""
+        with self.get_connection() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                self.logger.info("incremental_vacuum ignorado: migração para auto_vacuum=INCREMENTAL pendente")
+                return {'executado': False, 'motivo': 'auto_vacuum não é INCREMENTAL (migração pendente)'}
+            
+            livres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if livres == 0:
+                return {'executado': False, 'paginas_livres': 0}
+            
+            paginas = min(livres, self._manutencao_config['vacuum_paginas'])
+            # executescript percorre todos os passos; execute() libera só uma página
+            conn.executescript(f"PRAGMA incremental_vacuum({paginas})")
+            restantes = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        
+        return {
+            'executado': True,
+            'paginas_livres': livres,
+            'paginas_liberadas': livres - restantes
+        }
+    
+    def _otimizar_estatisticas(self) -> Dict[str, Any]:
+        """ANALYZE nas tabelas muito alteradas desde a última vez + PRAGMA optimize"""
+        limite = self._manutencao_config['analyze_alteracoes']
+        with self._changes_lock:
+            tabelas = sorted(t for t, n in self._table_changes.items() if n >= limite)
+        
+        with self.get_connection() as conn:
+            existentes = {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )}
+            analisadas = [t for t in tabelas if t in existentes]
+            for tabela in analisadas:
+                conn.execute(f"ANALYZE {tabela}")
+            conn.execute("PRAGMA optimize")
+        
+        with self._changes_lock:
+            for tabela in tabelas:
+                self._table_changes.pop(tabela, None)
+        
+        return {'analyze': analisadas, 'optimize': True}
+    
+    def _registrar_alteracoes(self, alteracoes: Dict[str, int]):
+        """Acumula linhas alteradas por tabela (base para agendar ANALYZE)"""
+        with self._changes_lock:
+            for tabela, linhas in alteracoes.items():
+                self._table_changes[tabela] = self._table_changes.get(tabela, 0) + linhas
+    
+    def configurar_manutencao(self, vacuum_paginas: Optional[int] = None,
+                              analyze_alteracoes: Optional[int] = None,
+                              wal_truncate_mb: Optional[float] = None):
+        """Ajusta orçamentos da manutenção automática"""
+        if vacuum_paginas is not None:
+            self._manutencao_config['vacuum_paginas'] = max(1, int(vacuum_paginas))
+        if analyze_alteracoes is not None:
+            self._manutencao_config['analyze_alteracoes'] = max(1, int(analyze_alteracoes))
+        if wal_truncate_mb is not None:
+            self._manutencao_config['wal_truncate_mb'] = max(0.0, float(wal_truncate_mb))
+    
+    def obter_historico_manutencao(self, limite: int = 10) -> List[Dict[str, Any]]:
+        """Relatórios das últimas execuções de manutenção (mais recente primeiro)"""
+        return list(reversed(self._maintenance_history[-limite:]))
+    
+    def executar_query(self, query: str, params: Optional[List[Any]] = None) -> List[sqlite3.Row]:
+        """Executa query SELECT de forma segura com cache"""
+        cache_key = f"{query}|{str(params or [])}"
+        cacheable = self._should_cache_query(query)
+        
+        # Verificar cache
+        if cacheable:
+            tags = self._read_tags(query, params)
+            with self._cache_lock:
+                cached = self._query_cache.get(cache_key)
+                if cached is not None:
+                    self._health_stats['cache_hits'] += 1
+                    self._query_metrics.record(query, 0.0, cache_hit=True)
+                    return cached
+                else:
+                    self._health_stats['cache_misses'] += 1
+                # Gerações das tabelas lidas, para descartar o resultado se houver escrita concorrente
+                generations = {table: self._table_generations.get(table, 0) for table, _ in tags}
+                generations['*'] = self._table_generations.get('*', 0)
+        
+        start = time.perf_counter()
+        result = []
+        error = False
+        try:
+            with self.get_connection() as conn:
+                self._health_stats['queries_executed'] += 1
+                if params:
+                    result = conn.execute(query, params).fetchall()
+                else:
+                    result = conn.execute(query).fetchall()
+        except Exception:
+            error = True
+            raise
+        finally:
+            self._registrar_query(query, params, (time.perf_counter() - start) * 1000, len(result), error)
+        
+        # Salvar no cache se apropriado
+        if cacheable and len(result) < 1000:
+            self._cache_store(cache_key, result, tags, generations)
+        
+        return result
+    
+    def executar_query_df(self, query: str, params: Optional[List[Any]] = None) -> pd.DataFrame:
+        """Executa query e retorna DataFrame pandas"""
+        start = time.perf_counter()
+        df = None
+        try:
+            with self.get_connection() as conn:
+                self._health_stats['queries_executed'] += 1
+                df = pd.read_sql_query(query, conn, params=params or [])
+                return df
+        finally:
+            self._registrar_query(
+                query, params, (time.perf_counter() - start) * 1000,
+                len(df) if df is not None else 0, df is None
+            )
+
+    @staticmethod
+    def _converter_coluna(valores: Tuple[Any, ...], tipo: Optional[str]):
+        """Converte os valores crus de uma coluna para o dtype declarado no schema"""
+        if tipo == 'datetime':
+            return pd.to_datetime(pd.Series(valores, dtype=object), format='ISO8601', errors='coerce')
+        if tipo == 'numeric':
+            return pd.to_numeric(pd.Series(valores, dtype=object), errors='coerce').astype('float64')
+        if tipo == 'int':
+            inteiros = pd.Series(valores, dtype='Int64')
+            return inteiros if inteiros.hasnans else inteiros.astype('int64')
+        if tipo == 'category':
+            return pd.Categorical(valores)
+        if tipo == 'bool':
+            return pd.array(valores, dtype='boolean')
+        return pd.Series(valores, dtype=object)
+
+    def executar_query_df_tipado(self, query: str, params: Optional[List[Any]] = None,
+                                 schema: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+        """Executa query e monta o DataFrame direto do cursor, já com os dtypes do schema.
+
+        `schema` mapeia coluna -> 'datetime' | 'numeric' | 'int' | 'category' | 'bool';
+        colunas fora do schema ficam como object. Evita a inferência do read_sql_query
+        e as conversões repetidas (pd.to_datetime/pd.to_numeric) nos chamadores.
+        """
+        schema = schema or {}
+        start = time.perf_counter()
+        df = None
+        try:
+            with self.get_connection() as conn:
+                self._health_stats['queries_executed'] += 1
+                cursor = conn.execute(query, params or [])
+                colunas = [desc[0] for desc in cursor.description]
+                linhas = cursor.fetchall()
+
+            valores = list(zip(*linhas)) if linhas else [()] * len(colunas)
+            # Indexa por posição para não colapsar colunas com nomes repetidos
+            df = pd.DataFrame({
+                i: self._converter_coluna(valores[i], schema.get(coluna))
+                for i, coluna in enumerate(colunas)
+            })
+            df.columns = colunas
+            return df
+        finally:
+            self._registrar_query(
+                query, params, (time.perf_counter() - start) * 1000,
+                len(df) if df is not None else 0, df is None
+            )
+
+    def iterar_query(self, query: str, params: Optional[List[Any]] = None,
+                     tamanho_lote: int = 500) -> Iterator[sqlite3.Row]:
+        """Executa query e produz as linhas sob demanda (fetchmany), sem carregar tudo em memória"""
+        elapsed = 0.0
+        rows = 0
+        error = False
+        try:
+            with self.get_connection() as conn:
+                self._health_stats['queries_executed'] += 1
+                start = time.perf_counter()
+                cursor = conn.execute(query, params or [])
+                elapsed += time.perf_counter() - start
+                while True:
+                    start = time.perf_counter()
+                    lote = cursor.fetchmany(tamanho_lote)
+                    elapsed += time.perf_counter() - start
+                    if not lote:
+                        break
+                    rows += len(lote)
+                    yield from lote
+        except Exception:
+            error = True
+            raise
+        finally:
+            # Só o tempo gasto no SQLite entra na métrica (não o do consumidor)
+            self._registrar_query(query, params, elapsed * 1000, rows, error)
+    
+    def executar_query_df_chunks(self, query: str, params: Optional[List[Any]] = None,
+                                 chunksize: int = 5000) -> Iterator[pd.DataFrame]:
+        """Executa query e produz DataFrames de até `chunksize` linhas"""
+        elapsed = 0.0
+        rows = 0
+        error = False
+        try:
+            with self.get_connection() as conn:
+                self._health_stats['queries_executed'] += 1
+                start = time.perf_counter()
+                chunks = pd.read_sql_query(query, conn, params=params or [], chunksize=chunksize)
+                elapsed += time.perf_counter() - start
+                while True:
+                    start = time.perf_counter()
+                    chunk = next(chunks, None)
+                    elapsed += time.perf_counter() - start
+                    if chunk is None:
+                        break
+                    rows += len(chunk)
+                    yield chunk
+        except Exception:
+            error = True
+            raise
+        finally:
+            self._registrar_query(query, params, elapsed * 1000, rows, error)
+    
+    def executar_insert(self, query: str, params: Optional[List[Any]] = None) -> int:
+        """Executa INSERT e retorna o ID gerado"""
+        return self.executar_insert_async(query, params).result()
+    
+    def executar_update(self, query: str, params: Optional[List[Any]] = None) -> int:
+        """Executa UPDATE/DELETE e retorna quantidade de linhas afetadas"""
+        return self.executar_update_async(query, params).result()
+    
+    def executar_batch(self, queries: List[Tuple[str, List[Any]]]) -> List[int]:
+        """Executa múltiplas queries em uma transação"""
+        return self.executar_batch_async(queries).result()
+    
+    def executar_many(self, query: str, linhas: Iterable[Sequence[Any]],
+                      tamanho_lote: Optional[int] = None) -> int:
+        """Executa um statement preparado uma vez sobre várias linhas (executemany).
+        
+        Retorna as linhas efetivamente alteradas (em INSERT OR IGNORE, as
+        inseridas). Com `tamanho_lote`, cada bloco é confirmado em seu próprio
+        commit, para importações muito grandes não segurarem a escrita.
+        """
+        if not tamanho_lote:
+            return self.executar_many_async(query, linhas).result()
+        
+        total = 0
+        iterador = iter(linhas)
+        while True:
+            bloco = list(islice(iterador, tamanho_lote))
+            if not bloco:
+                return total
+            total += self.executar_many_async(query, bloco).result()
+    
+    def executar_com_tabela_temporaria(self, tabela: str, colunas: Sequence[str],
+                                       linhas: Iterable[Sequence[Any]],
+                                       queries: List[Tuple[str, List[Any]]]) -> List[int]:
+        """Carrega `linhas` numa tabela temporária e executa `queries` que a usam.
+        
+        Tudo roda em uma única transação na thread escritora: CREATE TEMP TABLE,
+        executemany das linhas, as queries (ex.: UPDATE ... FROM, INSERT ...
+        SELECT) e DROP. `colunas` são definições ("hash_transacao TEXT", ...).
+        Retorna as linhas afetadas por query.
+        """
+        return self.executar_com_tabela_temporaria_async(tabela, colunas, linhas, queries).result()
+    
+    def executar_insert_async(self, query: str, params: Optional[List[Any]] = None) -> Future:
+        """Enfileira INSERT; o Future resolve com o ID gerado após o commit"""
+        return self._submit_write('insert', [(query, params)])
+    
+    def executar_update_async(self, query: str, params: Optional[List[Any]] = None) -> Future:
+        """Enfileira UPDATE/DELETE; o Future resolve com as linhas afetadas após o commit"""
+        return self._submit_write('update', [(query, params)])
+    
+    def executar_batch_async(self, queries: List[Tuple[str, List[Any]]]) -> Future:
+        """Enfileira queries atômicas; o Future resolve com as linhas afetadas por query"""
+        return self._submit_write('batch', list(queries))
+    
+    def executar_many_async(self, query: str, linhas: Iterable[Sequence[Any]]) -> Future:
+        """Enfileira um executemany atômico; o Future resolve com as linhas alteradas"""
+        return self._submit_write('many', [(query, list(linhas))])
+    
+    def executar_com_tabela_temporaria_async(self, tabela: str, colunas: Sequence[str],
+                                             linhas: Iterable[Sequence[Any]],
+                                             queries: List[Tuple[str, List[Any]]]) -> Future:
+        """Enfileira executar_com_tabela_temporaria; o Future resolve com as linhas por query"""
+        if not self._RE_NOME_TEMPORARIA.match(tabela) or not colunas:
+            raise ValueError(f"Tabela temporária inválida: {tabela!r}")
+        marcadores = ", ".join("?" * len(colunas))
+        return self._submit_write('temp', [
+            (f"CREATE TEMP TABLE {tabela} ({', '.join(colunas)})", None),
+            (f"INSERT INTO temp.{tabela} VALUES ({marcadores})", list(linhas)),
+            *queries,
+            (f"DROP TABLE temp.{tabela}", None),
+        ])
+    
+    def _submit_write(self, kind: str, queries: List[Tuple[str, Optional[List[Any]]]]) -> Future:
+        """Envia um job de escrita para a thread escritora"""
+        future = Future()
+        # A pilha só existe aqui: a thread escritora não sabe quem enfileirou o job
+        chamador = self._pilha_chamador() if self._slow_query_config['ativo'] else None
+        self._enfileirar_job((kind, queries, future, chamador))
+        return future
+    
+    def _enfileirar_job(self, job: Tuple[str, List[Tuple[str, Any]], Future, Optional[List[str]]]):
+        """Coloca o job na fila da thread escritora"""
+        if not self._writer_thread.is_alive():
+            raise RuntimeError("Fila de escrita encerrada (close_pool já foi chamado)")
+        self._write_queue.put(job)
+    
+    def _start_writer(self):
+        """Inicia a thread única de escrita (evita disputa pelo lock de escrita do SQLite)"""
+        self._write_queue = queue.Queue()
+        self._writer_thread = threading.Thread(target=self._writer_loop, name="richness-db-writer", daemon=True)
+        self._writer_thread.start()
+    
+    def _writer_loop(self):
+        """Consome jobs de escrita, agrupando os que estiverem na fila em um único commit"""
+        conn = self._create_connection()
+        try:
+            running = True
+            pendente = None
+            while running:
+                job = pendente or self._proximo_job()
+                pendente = None
+                if job is None:
+                    break
+                
+                # executemany vai sozinho na transação: sem SAVEPOINT o FTS5 não
+                # descarrega o índice a cada linha inserida
+                jobs = [job]
+                while job[0] not in self._JOBS_ISOLADOS and len(jobs) < self.MAX_GROUP_COMMIT:
+                    try:
+                        job = self._write_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is None:
+                        running = False
+                        break
+                    if job[0] in self._JOBS_ISOLADOS:
+                        pendente = job
+                        break
+                    jobs.append(job)
+                
+                self._commit_group(conn, jobs)
+        finally:
+            conn.close()
+    
+    def _proximo_job(self):
+        """Próximo job da fila (None encerra a thread escritora)"""
+        return self._write_queue.get()
+    
+    def _commit_group(self, conn: sqlite3.Connection,
+                      jobs: List[Tuple[str, List[Tuple[str, Any]], Future, Optional[List[str]]]]):
+        """Executa jobs em uma transação; cada job é isolado por SAVEPOINT.
+        
+        Um job sozinho dispensa o SAVEPOINT: se falhar, a transação inteira é desfeita.
+        """
+        completed = []
+        alteracoes: Dict[str, int] = {}
+        isolar = len(jobs) > 1
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for kind, queries, future, chamador in jobs:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if isolar:
+                    conn.execute("SAVEPOINT write_job")
+                try:
+                    results = []
+                    job_alteracoes = {}
+                    for posicao, (query, params) in enumerate(queries):
+                        # Em 'temp', criar/carregar/remover a tabela temporária são auxiliares
+                        if kind == 'temp' and (posicao < 2 or posicao == len(queries) - 1):
+                            varias, auxiliar = posicao == 1, True
+                        else:
+                            varias, auxiliar = kind == 'many', False
+                        # Com executemany, params é a lista de linhas; a métrica usa a forma da primeira
+                        amostra = (params[0] if params else None) if varias else params
+                        start = time.perf_counter()
+                        try:
+                            if varias:
+                                cursor = conn.executemany(query, params)
+                            else:
+                                cursor = conn.execute(query, params or [])
+                        except Exception:
+                            self._registrar_query(query, amostra, (time.perf_counter() - start) * 1000,
+                                                  error=True, chamador=chamador)
+                            raise
+                        self._registrar_query(query, amostra, (time.perf_counter() - start) * 1000,
+                                              max(cursor.rowcount, 0), chamador=chamador)
+                        if auxiliar:
+                            continue
+                        results.append((cursor.lastrowid or 0) if kind == 'insert' else cursor.rowcount)
+                        match = self._RE_WRITE_TABLE.match(query)
+                        if match and cursor.rowcount > 0:
+                            tabela = match.group(1).lower()
+                            job_alteracoes[tabela] = job_alteracoes.get(tabela, 0) + cursor.rowcount
+                    if isolar:
+                        conn.execute("RELEASE write_job")
+                    for tabela, linhas in job_alteracoes.items():
+                        alteracoes[tabela] = alteracoes.get(tabela, 0) + linhas
+                    if kind == 'many':
+                        # Invalidação precisa de (query, params) por linha para achar os usuários
+                        queries = [(query, linha) for query, linhas in queries for linha in linhas]
+                    elif kind == 'temp':
+                        queries = queries[2:-1]
+                    completed.append((queries, future, results if kind in ('batch', 'temp') else results[0]))
+                except Exception as e:
+                    if not isolar:
+                        raise
+                    # Desfaz só este job; os demais do grupo seguem para o commit
+                    conn.execute("ROLLBACK TO write_job")
+                    conn.execute("RELEASE write_job")
+                    self._health_stats['errors'] += 1
+                    future.set_exception(e)
+            start = time.perf_counter()
+            conn.execute("COMMIT")
+            somente_log = all(job[3] is self._CHAMADOR_SLOW_LOG for job in jobs)
+            self._registrar_query("COMMIT", None, (time.perf_counter() - start) * 1000,
+                                  chamador=self._CHAMADOR_SLOW_LOG if somente_log else [])
+        except Exception as e:
+            if conn.in_transaction:
                 conn.execute("ROLLBACK")
-                raise e
+            self._health_stats['errors'] += 1
+            for _, _, future, _ in jobs:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        self._health_stats['write_transactions'] += 1
+        self._health_stats['write_jobs'] += len(completed)
+        self._registrar_alteracoes(alteracoes)
+        
+        # Invalidar cache antes de liberar os chamadores, para que releiam dados atualizados
+        self._invalidate_for_writes([q for queries, _, _ in completed for q in queries])
+        for _, future, result in completed:
+            future.set_result(result)
     
     def criar_usuario_se_nao_existe(self, username: str) -> int:
         """Cria usuário se não existir e retorna o ID"""
@@ -642,25 +2263,150 @@ class DatabaseManager:
         )
         return result[0]['id'] if result else None
     
-    def backup_database(self, backup_path: Optional[str] = None) -> str:
-        """Cria backup do banco de dados"""
+    def configurar_backup(self, max_backups: Optional[int] = None,
+                          paginas_por_passo: Optional[int] = None,
+                          pausa_ms: Optional[float] = None,
+                          diretorio: Optional[str] = None):
+        """Ajusta retenção e ritmo (páginas por passo / pausa entre passos) do backup online"""
+        if max_backups is not None:
+            self._backup_config['max_backups'] = max(1, int(max_backups))
+        if paginas_por_passo is not None:
+            self._backup_config['paginas_por_passo'] = max(1, int(paginas_por_passo))
+        if pausa_ms is not None:
+            self._backup_config['pausa_ms'] = max(0.0, float(pausa_ms))
+        if diretorio is not None:
+            self._backup_config['diretorio'] = diretorio
+    
+    def backup_database(self, backup_path: Optional[str] = None,
+                        progresso: Optional[Callable[[int, int], None]] = None) -> str:
+        """Cria backup online incremental do banco de dados.
+        
+        Copia `paginas_por_passo` páginas por vez com uma pausa entre os passos, para
+        não bloquear leituras/escritas em bancos grandes. `progresso(copiadas, total)`
+        é chamado a cada passo. O arquivo é gravado como `.parcial` e só é renomeado
+        ao final; `cancelar_backup()` interrompe com InterruptedError.
+        """
         if backup_path is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_path = f"backups/richness_backup_{timestamp}.db"
+            backup_path = os.path.join(self._backup_config['diretorio'],
+                                       f"richness_backup_{timestamp}.db")
         
         # Criar diretório de backup
-        os.makedirs(os.path.dirname(backup_path), exist_ok=True)
+        os.makedirs(os.path.dirname(backup_path) or '.', exist_ok=True)
+        
+        if not self._backup_lock.acquire(blocking=False):
+            raise RuntimeError("Já existe um backup em andamento")
+        
+        parcial = backup_path + '.parcial'
+        self._backup_cancelar.clear()
+        self._backup_status = {
+            'em_andamento': True,
+            'arquivo': backup_path,
+            'iniciado_em': datetime.now(),
+            'paginas_copiadas': 0,
+            'paginas_total': 0,
+            'percentual': 0.0,
+            'reinicios': 0
+        }
+        try:
+            try:
+                self._copiar_paginas(parcial, self._backup_config['paginas_por_passo'], progresso)
+            except _BackupReiniciado:
+                # Escritas contínuas reiniciam a cópia paginada; faz uma passada única
+                self.logger.warning("Backup reiniciado repetidamente; copiando em passo único")
+                self._copiar_paginas(parcial, -1, progresso)
+            
+            os.replace(parcial, backup_path)
+            self._health_stats['last_backup'] = datetime.now()
+            self._backup_status['duracao_s'] = round(
+                (datetime.now() - self._backup_status['iniciado_em']).total_seconds(), 2
+            )
+            self.logger.info(f"Backup criado: {backup_path}")
+            return backup_path
+        except BaseException:
+            if os.path.exists(parcial):
+                os.remove(parcial)
+            raise
+        finally:
+            self._backup_status['em_andamento'] = False
+            self._backup_lock.release()
+    
+    def _copiar_paginas(self, destino: str, paginas: int,
+                        progresso: Optional[Callable[[int, int], None]]):
+        """Executa a API de backup do SQLite passo a passo (conexão própria, fora do pool)"""
+        pausa = self._backup_config['pausa_ms'] / 1000
+        status = self._backup_status
+        status['reinicios'] = 0
+        ultimo_restante = None
         
-        # Backup usando SQL dump
-        with self.get_connection() as source:
-            with sqlite3.connect(backup_path) as backup:
-                source.backup(backup)
+        def _passo(_status, restante, total):
+            nonlocal ultimo_restante
+            # Se o banco muda por outra conexão, o SQLite recomeça a cópia
+            if ultimo_restante is not None and restante > ultimo_restante:
+                status['reinicios'] += 1
+                if paginas > 0 and status['reinicios'] > self.BACKUP_MAX_REINICIOS:
+                    raise _BackupReiniciado()
+            ultimo_restante = restante
+            
+            status['paginas_total'] = total
+            status['paginas_copiadas'] = total - restante
+            status['percentual'] = round((total - restante) / total * 100, 1) if total else 100.0
+            if progresso:
+                progresso(total - restante, total)
+            if self._backup_cancelar.is_set():
+                raise InterruptedError("Backup cancelado")
+            if pausa and restante:
+                time.sleep(pausa)
         
-        self.logger.info(f"Backup criado: {backup_path}")
-        return backup_path
+        source = sqlite3.connect(self.db_path, timeout=30.0)
+        backup = sqlite3.connect(destino)
+        try:
+            source.backup(backup, pages=paginas, progress=_passo)
+        finally:
+            backup.close()
+            source.close()
+    
+    def cancelar_backup(self) -> bool:
+        """Solicita o cancelamento do backup em andamento"""
+        if not self._backup_status.get('em_andamento'):
+            return False
+        self._backup_cancelar.set()
+        return True
+    
+    def obter_status_backup(self) -> Dict[str, Any]:
+        """Progresso do backup atual (ou do último executado)"""
+        return dict(self._backup_status)
+    
+    def rotacionar_backups(self, manter: Optional[int] = None,
+                           diretorio: Optional[str] = None) -> List[str]:
+        """Remove os backups automáticos mais antigos, mantendo os `manter` mais recentes"""
+        manter = manter or self._backup_config['max_backups']
+        diretorio = Path(diretorio or self._backup_config['diretorio'])
+        if not diretorio.is_dir():
+            return []
+        
+        # O timestamp no nome (AAAAMMDD_HHMMSS) ordena cronologicamente
+        backups = sorted(diretorio.glob('richness_backup_*.db'), key=lambda p: p.name, reverse=True)
+        removidos = []
+        for antigo in backups[manter:]:
+            try:
+                antigo.unlink()
+                for sufixo in ('-wal', '-shm'):
+                    Path(f"{antigo}{sufixo}").unlink(missing_ok=True)
+                removidos.append(str(antigo))
+            except OSError as e:
+                self.logger.warning(f"Não foi possível remover backup {antigo}: {e}")
+        
+        if removidos:
+            self.logger.info(f"Rotação de backups: {len(removidos)} arquivo(s) removido(s)")
+        return removidos
     
     def health_check(self) -> Dict[str, Any]:
-        """Verifica saúde do banco de dados"""
+        """Verifica saúde do banco de dados.
+        
+        Só a conectividade é testada na hora; a integridade vem dos resultados em
+        cache do quick_check (periódico) e do integrity_check (noturno).
+        """
         try:
             start_time = time.time()
             
@@ -673,22 +2419,38 @@ class DatabaseManager:
             # Estatísticas do banco
             stats = self.obter_estatisticas_db()
             
-            # Integridade do banco
-            integrity_result = self.executar_query("PRAGMA integrity_check")
-            is_healthy = integrity_result[0][0] == 'ok' if integrity_result else False
+            # Integridade do banco (última verificação conhecida; None = ainda não verificada)
+            integridade = self.obter_status_integridade()
+            is_healthy = all(r['ok'] for r in integridade.values() if r)
             
             return {
                 'status': 'healthy' if is_healthy else 'unhealthy',
                 'connection_time_ms': round(connection_time * 1000, 2),
+                'integrity_status': {
+                    tipo: {**r, 'verificado_em': r['verificado_em'].isoformat()} if r else None
+                    for tipo, r in integridade.items()
+                },
                 'database_stats': stats,
                 'performance_stats': self._health_stats.copy(),
                 'pool_status': {
                     'pool_size': len(self._connection_pool),
                     'max_pool_size': self.pool_size
                 },
+                'write_queue_status': {
+                    'pending_jobs': self._write_queue.qsize(),
+                    'writer_alive': self._writer_thread.is_alive()
+                },
                 'cache_status': {
-                    'cache_size': len(self._query_cache),
+                    **self._cache_status(),
                     'hit_ratio': self._calculate_cache_hit_ratio()
+                },
+                'query_latency': {
+                    **self._query_metrics.totals(),
+                    'slowest_queries': self._query_metrics.snapshot(limit=10, order_by='p95_ms')
+                },
+                'maintenance_status': {
+                    'ultima_execucao': self._maintenance_history[-1] if self._maintenance_history else None,
+                    'alteracoes_pendentes_analyze': dict(self._table_changes)
                 }
             }
         except Exception as e:
@@ -698,6 +2460,165 @@ class DatabaseManager:
                 'timestamp': datetime.now().isoformat()
             }
     
+    def _cache_status(self) -> Dict[str, Any]:
+        """Tamanho, uso de memória e contadores de evicção do cache de queries"""
+        with self._cache_lock:
+            return self._query_cache.status()
+    
+    def obter_metricas_queries(self, limite: Optional[int] = 20, ordenar_por: str = 'total_ms') -> List[Dict[str, Any]]:
+        """Latência por fingerprint de query (p50/p95/p99, execuções, linhas retornadas)"""
+        return self._query_metrics.snapshot(limit=limite, order_by=ordenar_por)
+    
+    # ---- Logs do sistema (system_logs) ----
+    
+    def _obter_buffer_logs(self) -> BufferLogsSistema:
+        """Buffer de system_logs, com a thread de descarga iniciada só no primeiro uso"""
+        if self._buffer_logs is None:
+            with self._buffer_logs_lock:
+                if self._buffer_logs is None:
+                    self._buffer_logs = BufferLogsSistema(
+                        self, self.LOG_BUFFER_CAPACIDADE, self.LOG_BUFFER_LOTE, self.LOG_BUFFER_INTERVALO_S
+                    )
+        return self._buffer_logs
+    
+    def registrar_log_sistema(self, action: str, details: Any = None, user_id: Optional[int] = None,
+                              ip_address: Optional[str] = None) -> bool:
+        """Enfileira um registro de system_logs (gravado em lote, fora do caminho da requisição).
+        
+        `details` que não for texto é gravado como JSON. Retorna False quando a
+        fila está cheia e o registro entrou apenas na contagem agregada.
+        """
+        return self._obter_buffer_logs().registrar(action, details, user_id, ip_address)
+    
+    def descarregar_logs_sistema(self) -> int:
+        """Grava imediatamente os logs em memória (ex.: antes de consultar system_logs)"""
+        if self._buffer_logs is None:
+            return 0
+        return self._buffer_logs.descarregar()
+    
+    def obter_estatisticas_logs(self) -> Dict[str, Any]:
+        """Contadores do buffer de system_logs (vazio se nada foi registrado)"""
+        if self._buffer_logs is None:
+            return {}
+        return self._buffer_logs.estatisticas()
+    
+    # ---- Slow-query log ----
+    
+    def configurar_slow_query_log(self, limite_ms: Optional[float] = None, amostragem: Optional[float] = None,
+                                  persistir: Optional[bool] = None, ativo: Optional[bool] = None):
+        """Ajusta o slow-query log: limite em ms, fração amostrada, gravação em system_logs e liga/desliga"""
+        if ativo is not None:
+            self._slow_query_config['ativo'] = bool(ativo)
+        if limite_ms is not None:
+            self._slow_query_config['limite_ms'] = max(0.0, float(limite_ms))
+        if amostragem is not None:
+            self._slow_query_config['amostragem'] = min(1.0, max(0.0, float(amostragem)))
+        if persistir is not None:
+            self._slow_query_config['persistir'] = bool(persistir)
+    
+    def obter_queries_lentas(self, limite: Optional[int] = 50, persistidas: bool = False) -> List[Dict[str, Any]]:
+        """Queries lentas mais recentes primeiro (buffer em memória ou as gravadas em system_logs)"""
+        if persistidas:
+            query = "SELECT details, timestamp FROM system_logs WHERE action = 'slow_query' ORDER BY id DESC"
+            params = []
+            if limite:
+                query += " LIMIT ?"
+                params.append(limite)
+            return [json.loads(row['details']) for row in self.executar_query(query, params)]
+        with self._slow_lock:
+            registros = list(reversed(self._slow_queries))
+        return registros[:limite] if limite else registros
+    
+    def resumo_queries_lentas(self, limite: int = 10) -> Dict[str, Any]:
+        """Queries lentas do buffer agrupadas por fingerprint, com os chamadores que as originaram"""
+        return {
+            'config': dict(self._slow_query_config),
+            'total_detected': self._health_stats['slow_queries'],
+            'buffered': len(self._slow_queries),
+            'top': self._agrupar_queries_lentas(self.obter_queries_lentas(limite=None), limite)
+        }
+    
+    @staticmethod
+    def _agrupar_queries_lentas(registros: List[Dict[str, Any]], limite: int) -> List[Dict[str, Any]]:
+        """Agrupa registros por fingerprint (maior tempo total primeiro), contando chamadores"""
+        grupos: Dict[str, Dict[str, Any]] = {}
+        for registro in registros:
+            grupo = grupos.setdefault(registro['query'], {
+                'query': registro['query'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'callers': {}
+            })
+            grupo['count'] += 1
+            grupo['total_ms'] += registro['duration_ms']
+            grupo['max_ms'] = max(grupo['max_ms'], registro['duration_ms'])
+            origem = registro['caller'][0] if registro['caller'] else '(desconhecido)'
+            grupo['callers'][origem] = grupo['callers'].get(origem, 0) + 1
+        
+        top = sorted(grupos.values(), key=lambda g: g['total_ms'], reverse=True)[:limite]
+        for grupo in top:
+            grupo['total_ms'] = round(grupo['total_ms'], 2)
+        return top
+    
+    def _registrar_query(self, query: str, params: Optional[List[Any]], duration_ms: float,
+                         rows: int = 0, error: bool = False, chamador: Optional[List[str]] = None):
+        """Registra a execução nas métricas e, acima do limite, no slow-query log.
+        
+        `chamador` vem das escritas (pilha capturada ao enfileirar); nas leituras a
+        pilha atual já é a do chamador.
+        """
+        self._query_metrics.record(query, duration_ms, rows, error)
+        
+        config = self._slow_query_config
+        if not config['ativo'] or duration_ms < config['limite_ms'] or chamador is self._CHAMADOR_SLOW_LOG:
+            return
+        self._health_stats['slow_queries'] += 1
+        if config['amostragem'] < 1.0 and random.random() >= config['amostragem']:
+            return
+        
+        registro = {
+            'query': QueryMetrics.fingerprint(query),
+            'params': self._forma_parametros(params),
+            'duration_ms': round(duration_ms, 3),
+            'rows': rows,
+            'error': error,
+            'caller': chamador if chamador is not None else self._pilha_chamador(),
+            'thread': threading.current_thread().name,
+            'timestamp': datetime.now().isoformat()
+        }
+        with self._slow_lock:
+            self._slow_queries.append(registro)
+        
+        # Sem esperar o commit (pode ser a própria thread escritora)
+        if config['persistir']:
+            try:
+                self._enfileirar_job(('insert', [(
+                    "INSERT INTO system_logs (action, details) VALUES ('slow_query', ?)",
+                    [json.dumps(registro, ensure_ascii=False, default=str)]
+                )], Future(), self._CHAMADOR_SLOW_LOG))
+            except RuntimeError:
+                pass  # gerenciador já fechado
+    
+    @staticmethod
+    def _forma_parametros(params: Optional[List[Any]]) -> Dict[str, Any]:
+        """Quantidade e tipos dos parâmetros, sem os valores"""
+        if not params:
+            return {'count': 0, 'types': []}
+        valores = list(params.values()) if isinstance(params, dict) else list(params)
+        return {'count': len(valores), 'types': [type(v).__name__ for v in valores[:20]]}
+    
+    @classmethod
+    def _pilha_chamador(cls) -> List[str]:
+        """Quadros mais internos fora deste módulo e da stdlib ('arquivo:linha função')"""
+        quadros = []
+        frame = sys._getframe(1)
+        base = os.getcwd()
+        while frame is not None and len(quadros) < cls.SLOW_QUERY_QUADROS:
+            arquivo = frame.f_code.co_filename
+            if arquivo != __file__ and not arquivo.startswith(_STDLIB_PREFIXOS):
+                if arquivo.startswith(base):
+                    arquivo = os.path.relpath(arquivo, base)
+                quadros.append(f"{arquivo}:{frame.f_lineno} {frame.f_code.co_name}")
+            frame = frame.f_back
+        return quadros
+    
     def _calculate_cache_hit_ratio(self) -> float:
         """Calcula taxa de acerto do cache"""
         hits = self._health_stats['cache_hits']
@@ -706,22 +2627,14 @@ class DatabaseManager:
         return round(hits / total * 100, 2) if total > 0 else 0.0
     
     def obter_estatisticas_db(self) -> Dict[str, Any]:
-        """Obtém estatísticas gerais do banco"""
-        stats = {}
-        
-        # Estatísticas por tabela
-        tabelas = [
-            'usuarios', 'transacoes', 'categorias_personalizadas',
-            'descricoes_personalizadas', 'transacoes_excluidas',
-            'cache_categorizacao_ia', 'transacoes_manuais', 'system_logs'
-        ]
-        
-        for tabela in tabelas:
-            try:
-                result = self.executar_query(f"SELECT COUNT(*) as total FROM {tabela}")
-                stats[f'total_{tabela}'] = result[0]['total']
-            except Exception:
-                stats[f'total_{tabela}'] = 0
+        """Obtém estatísticas gerais do banco (contagens lidas de table_stats, O(1))"""
+        totais = {
+            row['tabela']: row['total']
+            for row in self.executar_query(
+                "SELECT tabela, total FROM table_stats WHERE user_id = 0"
+            )
+        }
+        stats = {f'total_{tabela}': totais.get(tabela, 0) for tabela in self._TABELAS_CONTADAS}
         
         # Tamanho do banco
         db_size = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
@@ -729,6 +2642,65 @@ class DatabaseManager:
         
         return stats
     
+    def contar_linhas(self, tabela: str, user_id: Optional[int] = None) -> int:
+        """Total de linhas de uma tabela contada (por usuário só para transacoes), via table_stats"""
+        if tabela not in self._TABELAS_CONTADAS:
+            raise ValueError(f"Tabela sem contagem em table_stats: {tabela}")
+        if user_id is not None and tabela != 'transacoes':
+            raise ValueError("Contagem por usuário disponível apenas para transacoes")
+        
+        result = self.executar_query(
+            "SELECT total FROM table_stats WHERE tabela = ? AND user_id = ?",
+            [tabela, user_id or 0]
+        )
+        return result[0]['total'] if result else 0
+    
+    def _queries_recontagem(self) -> List[Tuple[str, List[Any]]]:
+        """Statements que reconstroem table_stats a partir de COUNT(*)"""
+        queries = [("DELETE FROM table_stats", [])]
+        queries.extend(
+            (f"INSERT INTO table_stats (tabela, user_id, total) SELECT '{tabela}', 0, COUNT(*) FROM {tabela}", [])
+            for tabela in self._TABELAS_CONTADAS
+        )
+        queries.append((
+            "INSERT INTO table_stats (tabela, user_id, total) "
+            "SELECT 'transacoes', user_id, COUNT(*) FROM transacoes GROUP BY user_id", []
+        ))
+        return queries
+    
+    def reconciliar_table_stats(self) -> Dict[str, Any]:
+        """Recalcula table_stats com COUNT(*) e informa as divergências corrigidas"""
+        start = time.perf_counter()
+        with self.get_connection() as conn:
+            atuais = {
+                (row[0], row[1]): row[2]
+                for row in conn.execute("SELECT tabela, user_id, total FROM table_stats")
+            }
+        
+        # Recontagem e regravação na mesma transação da thread escritora (sem perder escritas)
+        self.executar_batch(self._queries_recontagem())
+        
+        with self.get_connection() as conn:
+            reais = {
+                (row[0], row[1]): row[2]
+                for row in conn.execute("SELECT tabela, user_id, total FROM table_stats")
+            }
+        
+        divergencias = {}
+        for tabela, user_id in sorted(set(atuais) | set(reais)):
+            diferenca = reais.get((tabela, user_id), 0) - atuais.get((tabela, user_id), 0)
+            if diferenca:
+                chave = f"{tabela}[user_id={user_id}]" if user_id else tabela
+                divergencias[chave] = diferenca
+        
+        if divergencias:
+            self.logger.warning(f"table_stats reconciliada: {divergencias}")
+        
+        return {
+            'divergencias': divergencias,
+            'duracao_ms': round((time.perf_counter() - start) * 1000, 2)
+        }
+    
     def migrar_schema(self, versao_alvo: int = 2) -> bool:
         """Sistema de migração de esquema"""
         try:
@@ -799,12 +2771,685 @@ class DatabaseManager:
 
     def close_pool(self):
         """Fecha todas as conexões do pool"""
+        # Gravar os logs ainda em memória enquanto a thread escritora existe
+        if self._buffer_logs is not None:
+            self._buffer_logs.fechar()
+        
+        # Encerrar a thread escritora após concluir os jobs pendentes
+        self._write_queue.put(None)
+        self._writer_thread.join()
+        
         with self._pool_lock:
             for conn in self._connection_pool:
                 conn.close()
             self._connection_pool.clear()
         
         self._executor.shutdown(wait=True)
+        
+        # Remover do registro para que o próximo acesso crie um gerenciador novo
+        with _db_managers_lock:
+            if _db_managers.get(os.path.abspath(self.db_path)) is self:
+                del _db_managers[os.path.abspath(self.db_path)]
+
+class ArquivoShard(DatabaseManager):
+    """Um arquivo de shard do ShardedDatabaseManager, sem recursos próprios parados.
+    
+    Mesma API do DatabaseManager, mas o executor é o do catálogo, manutenção e
+    quick_check rodam no agendador do catálogo (que percorre os shards abertos),
+    o pool guarda no máximo POOL_CONEXOES conexões e a thread escritora só existe
+    enquanto há escrita: encerra após ESCRITOR_OCIOSO_S sem jobs e é recriada no
+    próximo. Threads e arquivos abertos acompanham os usuários ativos, não o total.
+    """
+    
+    POOL_CONEXOES = 2
+    CACHE_MAX_MB = 8
+    ESCRITOR_OCIOSO_S = 30.0
+    
+    def __init__(self, db_path: str, catalogo: DatabaseManager, cache_ttl_seconds: float = 300.0):
+        self._catalogo = catalogo
+        self._ultimo_uso = time.monotonic()
+        super().__init__(db_path, pool_size=self.POOL_CONEXOES, cache_max_mb=self.CACHE_MAX_MB,
+                         cache_ttl_seconds=cache_ttl_seconds)
+    
+    def _criar_executor(self) -> ThreadPoolExecutor:
+        return self._catalogo._executor
+    
+    def _schedule_maintenance(self):
+        """Feita pelo agendador do catálogo (ShardedDatabaseManager._manter_shards)"""
+    
+    def _schedule_health_probe(self):
+        """Feito pelo agendador do catálogo (ShardedDatabaseManager._manter_shards)"""
+    
+    @contextmanager
+    def get_connection(self, user_id: Optional[int] = None):
+        self._ultimo_uso = time.monotonic()
+        with super().get_connection(user_id) as conn:
+            yield conn
+    
+    # ---- Thread escritora sob demanda ----
+    
+    def _start_writer(self):
+        self._write_queue = queue.Queue()
+        self._writer_lock = threading.Lock()
+        self._escritor_ativo = False
+        self._encerrado = False
+        self._writer_thread = threading.Thread(target=self._writer_loop)  # iniciada no primeiro job
+    
+    def _enfileirar_job(self, job: Tuple[str, List[Tuple[str, Any]], Future, Optional[List[str]]]):
+        """Coloca o job na fila, iniciando a thread escritora se ela estiver parada"""
+        with self._writer_lock:
+            if self._encerrado:
+                raise RuntimeError("Fila de escrita encerrada (close_pool já foi chamado)")
+            if not self._escritor_ativo:
+                self._writer_thread = threading.Thread(
+                    target=self._writer_loop, name="richness-shard-writer", daemon=True
+                )
+                self._escritor_ativo = True
+                self._writer_thread.start()
+            self._ultimo_uso = time.monotonic()
+            self._write_queue.put(job)
+    
+    def _proximo_job(self):
+        """Próximo job; None (encerrar) após ESCRITOR_OCIOSO_S com a fila vazia"""
+        while True:
+            try:
+                return self._write_queue.get(timeout=self.ESCRITOR_OCIOSO_S)
+            except queue.Empty:
+                # Sob o lock, nenhum job entra entre a checagem e a saída
+                with self._writer_lock:
+                    if self._write_queue.empty():
+                        self._escritor_ativo = False
+                        return None
+    
+    # ---- Ciclo de vida ----
+    
+    def ocioso_ha(self) -> float:
+        """Segundos desde o último uso (leitura ou escrita)"""
+        return time.monotonic() - self._ultimo_uso
+    
+    def liberar_recursos(self) -> int:
+        """Fecha as conexões paradas no pool e esvazia o cache; retorna as conexões fechadas"""
+        with self._pool_lock:
+            conexoes, self._connection_pool = self._connection_pool, []
+        for conn in conexoes:
+            conn.close()
+        self.invalidar_cache()
+        return len(conexoes)
+    
+    def close_pool(self):
+        """Encerra a thread escritora (se ativa) e fecha as conexões; o executor é do catálogo"""
+        if self._buffer_logs is not None:
+            self._buffer_logs.fechar()
+        with self._writer_lock:
+            self._encerrado = True
+            ativo = self._escritor_ativo
+            if ativo:
+                self._write_queue.put(None)
+        if ativo:
+            self._writer_thread.join()
+        self.liberar_recursos()
+
+class ShardedDatabaseManager:
+    """Armazenamento particionado por usuário.
+    
+    Um catálogo global (o arquivo db_path) guarda `usuarios` e as tabelas sem dono
+    (logs do sistema, cache de categorização); os dados de cada usuário ficam em um
+    arquivo próprio (shards='usuario') ou em um de N shards (shards=N, escolhido por
+    user_id % N). Cada shard é um ArquivoShard leve: thread escritora própria só
+    enquanto há escrita, executor e agendador de manutenção compartilhados com o
+    catálogo. Importações de usuários diferentes não disputam o mesmo lock de escrita.
+    
+    As queries são roteadas pelo `user_id = ?` que já identifica o escopo no cache:
+    com usuário, vão para o shard dele (aberto sob demanda); só com tabelas globais,
+    para o catálogo. Leituras e escritas de tabelas particionadas sem usuário são
+    rejeitadas com ValueError: não há como juntar COUNT/SUM, ORDER BY e LIMIT de
+    vários arquivos, nem escrever atomicamente em mais de um. Varreduras
+    administrativas de todos os arquivos são métodos explícitos (contar_linhas,
+    obter_estatisticas_db, executar_update_por_arquivo, reconstruções).
+    Cada shard tem um espelho mínimo de `usuarios` (id, username, user_hash) para
+    as foreign keys.
+    """
+    
+    _TABELAS_GLOBAIS = {'usuarios', 'system_logs', 'cache_categorizacao_ia'}
+    
+    # Tabelas derivadas, recalculadas pelos triggers do shard na redistribuição
+    _TABELAS_DERIVADAS = {'table_stats', 'resumo_mensal'}
+    
+    # Shards abertos sem uso por mais que isso têm conexões e cache liberados na manutenção
+    SHARD_OCIOSO_S = 600.0
+    
+    def __init__(self, db_path: str = "richness_v2.db", shards: Union[int, str] = 'usuario', **kwargs):
+        if shards != 'usuario' and (not isinstance(shards, int) or shards < 1):
+            raise ValueError("shards deve ser 'usuario' ou um inteiro positivo")
+        
+        self.db_path = db_path
+        self.modo_shards = shards
+        self.diretorio_shards = os.path.splitext(db_path)[0] + '_shards'
+        self._kwargs = kwargs
+        self._shards: Dict[str, ArquivoShard] = {}
+        self._shards_lock = threading.Lock()
+        self._slow_query_kwargs: Dict[str, Any] = {}
+        self.logger = logging.getLogger(__name__)
+        
+        os.makedirs(self.diretorio_shards, exist_ok=True)
+        self.catalogo = DatabaseManager(db_path, **kwargs)
+        # Um só agendador: a manutenção do catálogo também cuida dos shards abertos
+        self.catalogo._ganchos_manutencao.append(('shards', self._manter_shards))
+    
+    def __getattr__(self, nome):
+        # Monitoramento, métricas e manutenção não roteados refletem o catálogo
+        if nome == 'catalogo':
+            raise AttributeError(nome)
+        return getattr(self.catalogo, nome)
+    
+    # ---- Localização dos shards ----
+    
+    def nome_shard(self, user_id: int) -> str:
+        """Nome do shard que guarda os dados do usuário"""
+        if self.modo_shards == 'usuario':
+            return f"usuario_{int(user_id)}"
+        return f"shard_{int(user_id) % self.modo_shards:02d}"
+    
+    def _caminho_shard(self, nome: str) -> str:
+        return os.path.join(self.diretorio_shards, f"{nome}.db")
+    
+    def _criar_shard(self, nome: str) -> ArquivoShard:
+        shard = ArquivoShard(
+            self._caminho_shard(nome), self.catalogo,
+            cache_ttl_seconds=self._kwargs.get('cache_ttl_seconds', 300.0)
+        )
+        # Backups de cada shard em subdiretório próprio (a rotação é por diretório)
+        shard.configurar_backup(
+            diretorio=os.path.join(shard._backup_config['diretorio'], 'shards', nome)
+        )
+        if self._slow_query_kwargs:
+            shard.configurar_slow_query_log(**self._slow_query_kwargs)
+        return shard
+    
+    def _abrir_shard(self, nome: str) -> ArquivoShard:
+        shard = self._shards.get(nome)
+        if shard is None:
+            with self._shards_lock:
+                shard = self._shards.get(nome)
+                if shard is None:
+                    shard = self._criar_shard(nome)
+                    self._shards[nome] = shard
+        return shard
+    
+    def shard_do_usuario(self, user_id: int) -> ArquivoShard:
+        """Shard do usuário (aberto sob demanda e mantido para o roteamento seguinte)"""
+        return self._abrir_shard(self.nome_shard(user_id))
+    
+    def _shards_abertos(self) -> List[ArquivoShard]:
+        with self._shards_lock:
+            return list(self._shards.values())
+    
+    def _nomes_shards(self) -> List[str]:
+        """Shards existentes em disco"""
+        return sorted(
+            os.path.splitext(arquivo)[0] for arquivo in os.listdir(self.diretorio_shards)
+            if arquivo.endswith('.db')
+        )
+    
+    def _percorrer_shards(self) -> Iterator[Tuple[str, DatabaseManager]]:
+        """Cada shard em disco, um de cada vez (varreduras administrativas).
+        
+        Os abertos são reaproveitados; os demais são abertos só para a varredura e
+        fechados em seguida, sem entrar no registro de shards.
+        """
+        for nome in self._nomes_shards():
+            with self._shards_lock:
+                shard = self._shards.get(nome)
+            if shard is not None:
+                yield nome, shard
+                continue
+            shard = self._criar_shard(nome)
+            try:
+                yield nome, shard
+            finally:
+                shard.close_pool()
+                # Aberto por outra thread durante a varredura: descartar leituras antigas
+                aberto = self._shards.get(nome)
+                if aberto is not None:
+                    aberto.invalidar_cache()
+    
+    def _manter_shards(self) -> Dict[str, Any]:
+        """Manutenção e quick_check dos shards abertos; libera conexões e cache dos ociosos"""
+        relatorio: Dict[str, Any] = {}
+        with self._shards_lock:
+            shards = dict(self._shards)
+        for nome, shard in shards.items():
+            ocioso = shard.ocioso_ha() >= self.SHARD_OCIOSO_S
+            manutencao = shard._run_maintenance()
+            integridade = shard.verificar_integridade(completa=False)
+            relatorio[nome] = {
+                'duracao_ms': manutencao['duracao_ms'],
+                'quick_check_ok': integridade['ok'],
+                'conexoes_liberadas': shard.liberar_recursos() if ocioso else 0
+            }
+        return relatorio
+    
+    # ---- Roteamento ----
+    
+    def _tabelas_globais(self, tabelas) -> bool:
+        return all(t in self._TABELAS_GLOBAIS or t.startswith(('sqlite_', 'pragma_')) for t in tabelas)
+    
+    def _destino_leitura(self, query: str, params: Optional[List[Any]]) -> DatabaseManager:
+        """Gerenciador que atende a leitura (catálogo ou shard do usuário)"""
+        tabelas = self.catalogo._expand_tables(t.lower() for t in DatabaseManager._RE_READ_TABLES.findall(query))
+        if self._tabelas_globais(tabelas):
+            return self.catalogo
+        user_id = self.catalogo._resolve_user_scope(query, params, 'user_id')
+        if user_id is None:
+            particionadas = ', '.join(sorted(t for t in tabelas if t not in self._TABELAS_GLOBAIS))
+            raise ValueError(
+                f"Leitura de tabela particionada ({particionadas}) sem `user_id = ?`: "
+                "no modo particionado filtre pelo usuário para rotear ao shard"
+            )
+        return self.shard_do_usuario(int(user_id))
+    
+    def _destino_escrita(self, query: str, params: Optional[List[Any]]) -> DatabaseManager:
+        """Gerenciador que recebe a escrita (catálogo ou shard do usuário)"""
+        tabela, user_id = self.catalogo._write_target(query, params)
+        if tabela in self._TABELAS_GLOBAIS:
+            return self.catalogo
+        if tabela is not None and user_id is None:
+            # INSERT ... SELECT filtrado por usuário
+            user_id = self.catalogo._resolve_user_scope(query, params, 'user_id')
+        if user_id is None:
+            raise ValueError(
+                f"Escrita em {tabela or 'tabela não identificada'} sem `user_id`: no modo particionado "
+                "a escrita precisa identificar o usuário (use executar_update_por_arquivo "
+                "para limpezas administrativas)"
+            )
+        return self.shard_do_usuario(int(user_id))
+    
+    @contextmanager
+    def get_connection(self, user_id: Optional[int] = None):
+        """Conexão do shard do usuário (ou do catálogo, sem user_id)"""
+        destino = self.catalogo if user_id is None else self.shard_do_usuario(user_id)
+        with destino.get_connection() as conn:
+            yield conn
+    
+    # ---- Leituras ----
+    
+    def executar_query(self, query: str, params: Optional[List[Any]] = None) -> List[sqlite3.Row]:
+        return self._destino_leitura(query, params).executar_query(query, params)
+    
+    def executar_query_df(self, query: str, params: Optional[List[Any]] = None) -> pd.DataFrame:
+        return self._destino_leitura(query, params).executar_query_df(query, params)
+    
+    def executar_query_df_tipado(self, query: str, params: Optional[List[Any]] = None,
+                                 schema: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+        return self._destino_leitura(query, params).executar_query_df_tipado(query, params, schema)
+    
+    def iterar_query(self, query: str, params: Optional[List[Any]] = None,
+                     tamanho_lote: int = 1000) -> Iterator[sqlite3.Row]:
+        return self._destino_leitura(query, params).iterar_query(query, params, tamanho_lote)
+    
+    def executar_query_df_chunks(self, query: str, params: Optional[List[Any]] = None,
+                                 chunksize: int = 5000) -> Iterator[pd.DataFrame]:
+        return self._destino_leitura(query, params).executar_query_df_chunks(query, params, chunksize)
+    
+    # ---- Escritas ----
+    
+    def executar_insert(self, query: str, params: Optional[List[Any]] = None) -> int:
+        tabela, _ = self.catalogo._write_target(query, params)
+        if tabela == 'usuarios':
+            if query.lstrip()[:6].lower() == 'delete':
+                return self._excluir_usuarios(query, params)
+            resultado = self.catalogo.executar_insert(query, params)
+            if query.lstrip()[:6].lower() in ('insert', 'replac') and resultado:
+                self._espelhar_usuario(resultado)
+            return resultado
+        return self._destino_escrita(query, params).executar_insert(query, params)
+    
+    def executar_update(self, query: str, params: Optional[List[Any]] = None) -> int:
+        if query.lstrip()[:6].lower() == 'delete' and self.catalogo._write_target(query, params)[0] == 'usuarios':
+            return self._excluir_usuarios(query, params)
+        return self._destino_escrita(query, params).executar_update(query, params)
+    
+    def _destino_unico(self, queries: List[Tuple[str, List[Any]]]) -> DatabaseManager:
+        """Arquivo comum a todas as queries (lotes só são atômicos dentro de um arquivo)"""
+        destinos = []
+        for query, params in queries:
+            if self.catalogo._write_target(query, params)[0] == 'usuarios':
+                raise ValueError("Escritas em usuarios não são suportadas em lote no modo particionado")
+            destinos.append(self._destino_escrita(query, params))
+        if not destinos or any(db is not destinos[0] for db in destinos):
+            raise ValueError("Lotes precisam ir para um único arquivo no modo particionado (um usuário por lote)")
+        return destinos[0]
+    
+    def executar_batch(self, queries: List[Tuple[str, List[Any]]]) -> List[int]:
+        """Executa o lote em uma transação no arquivo do usuário (todas as queries no mesmo arquivo)"""
+        return self._destino_unico(queries).executar_batch(queries)
+    
+    def executar_many(self, query: str, linhas: Iterable[Sequence[Any]],
+                      tamanho_lote: Optional[int] = None) -> int:
+        """executemany com as linhas agrupadas pelo arquivo do usuário de cada uma.
+        
+        Cada arquivo recebe o seu executemany (atômico por arquivo, não entre arquivos).
+        """
+        if self.catalogo._write_target(query, None)[0] == 'usuarios':
+            raise ValueError("Escritas em usuarios não são suportadas em lote no modo particionado")
+        
+        grupos: Dict[int, Tuple[DatabaseManager, List[Sequence[Any]]]] = {}
+        for linha in linhas:
+            db = self._destino_escrita(query, list(linha))
+            grupos.setdefault(id(db), (db, []))[1].append(linha)
+        return sum(db.executar_many(query, grupo, tamanho_lote) for db, grupo in grupos.values())
+    
+    def executar_com_tabela_temporaria(self, tabela: str, colunas: Sequence[str],
+                                       linhas: Iterable[Sequence[Any]],
+                                       queries: List[Tuple[str, List[Any]]]) -> List[int]:
+        """Executa no arquivo de destino das queries (precisa ser um só)"""
+        return self._destino_unico(queries).executar_com_tabela_temporaria(tabela, colunas, linhas, queries)
+    
+    def executar_update_por_arquivo(self, query: str, params: Optional[List[Any]] = None) -> Dict[str, int]:
+        """Aplica a escrita no catálogo e em cada shard em disco, um de cada vez.
+        
+        Para limpezas administrativas sem usuário (ex.: cache expirado). Não é
+        atômico entre arquivos; retorna as linhas alteradas por arquivo.
+        """
+        resultado = {'catalogo': self.catalogo.executar_update(query, params)}
+        for nome, shard in self._percorrer_shards():
+            resultado[nome] = shard.executar_update(query, params)
+        return resultado
+    
+    def executar_insert_async(self, query: str, params: Optional[List[Any]] = None) -> Future:
+        return self._executor.submit(self.executar_insert, query, params)
+    
+    def executar_update_async(self, query: str, params: Optional[List[Any]] = None) -> Future:
+        return self._executor.submit(self.executar_update, query, params)
+    
+    def executar_batch_async(self, queries: List[Tuple[str, List[Any]]]) -> Future:
+        return self._executor.submit(self.executar_batch, queries)
+    
+    def executar_many_async(self, query: str, linhas: Iterable[Sequence[Any]]) -> Future:
+        return self._executor.submit(self.executar_many, query, list(linhas))
+    
+    def executar_com_tabela_temporaria_async(self, tabela: str, colunas: Sequence[str],
+                                             linhas: Iterable[Sequence[Any]],
+                                             queries: List[Tuple[str, List[Any]]]) -> Future:
+        return self._executor.submit(self.executar_com_tabela_temporaria, tabela, colunas, list(linhas), queries)
+    
+    def invalidar_cache(self, tabela: Optional[str] = None, user_id: Optional[Any] = None) -> int:
+        if user_id is not None and tabela not in self._TABELAS_GLOBAIS:
+            return self.shard_do_usuario(int(user_id)).invalidar_cache(tabela, user_id)
+        # Só catálogo e shards abertos têm cache
+        return sum(db.invalidar_cache(tabela, user_id) for db in [self.catalogo] + self._shards_abertos())
+    
+    # ---- Usuários ----
+    
+    def _espelhar_usuario(self, user_id: int):
+        """Cria no shard a linha mínima de usuarios exigida pelas foreign keys"""
+        linhas = self.catalogo.executar_query(
+            "SELECT id, username, user_hash FROM usuarios WHERE id = ?", [user_id]
+        )
+        if linhas:
+            self.shard_do_usuario(user_id).executar_insert(
+                "INSERT INTO usuarios (id, username, user_hash) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO NOTHING",
+                [linhas[0]['id'], linhas[0]['username'], linhas[0]['user_hash']]
+            )
+    
+    def criar_usuario_se_nao_existe(self, username: str) -> int:
+        user_id = self.catalogo.criar_usuario_se_nao_existe(username)
+        self._espelhar_usuario(user_id)
+        return user_id
+    
+    def _excluir_usuarios(self, query: str, params: Optional[List[Any]]) -> int:
+        """DELETE em usuarios: remove do catálogo e apaga os dados nos shards"""
+        where = re.search(r'\bwhere\b.*$', query, re.IGNORECASE | re.DOTALL)
+        ids = [
+            row['id'] for row in self.catalogo.executar_query(
+                "SELECT id FROM usuarios " + (where.group(0) if where else ''), params
+            )
+        ]
+        removidos = self.catalogo.executar_update(query, params)
+        for user_id in ids:
+            self._remover_dados_usuario(user_id)
+        return removidos
+    
+    def _remover_dados_usuario(self, user_id: int):
+        if self.modo_shards != 'usuario':
+            # Shard compartilhado: o CASCADE do espelho apaga os dados do usuário
+            self.shard_do_usuario(user_id).executar_update("DELETE FROM usuarios WHERE id = ?", [user_id])
+            return
+        
+        # Arquivo exclusivo do usuário: exclusão é remover o arquivo
+        nome = self.nome_shard(user_id)
+        with self._shards_lock:
+            shard = self._shards.pop(nome, None)
+        if shard is not None:
+            shard.close_pool()
+        for sufixo in ('', '-wal', '-shm'):
+            caminho = self._caminho_shard(nome) + sufixo
+            if os.path.exists(caminho):
+                os.remove(caminho)
+        self.logger.info(f"Shard {nome} removido")
+    
+    def excluir_usuario(self, user_id: int) -> int:
+        """Exclui o usuário do catálogo e todos os seus dados"""
+        return self._excluir_usuarios("DELETE FROM usuarios WHERE id = ?", [user_id])
+    
+    def backup_usuario(self, user_id: int, backup_path: Optional[str] = None,
+                       progresso: Optional[Callable[[int, int], None]] = None) -> str:
+        """Backup do shard do usuário (no modo por usuário, contém apenas os dados dele)"""
+        return self.shard_do_usuario(user_id).backup_database(backup_path, progresso)
+    
+    def distribuir_usuarios_existentes(self) -> Dict[str, int]:
+        """Move para os shards os dados que ainda estão no catálogo (ativação do modo
+        particionado em um banco já em uso). Retorna as linhas movidas por tabela."""
+        with self.catalogo.get_connection() as conn:
+            tabelas = [
+                row[0] for row in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND sql NOT LIKE 'CREATE VIRTUAL%'"
+                )
+                if row[0] not in self._TABELAS_GLOBAIS | self._TABELAS_DERIVADAS
+                and 'user_id' in [c[1] for c in conn.execute(f"PRAGMA table_info({row[0]})")]
+            ]
+            user_ids = [
+                row[0] for row in conn.execute(
+                    " UNION ".join(f"SELECT DISTINCT user_id FROM {t} WHERE user_id IS NOT NULL" for t in tabelas)
+                )
+            ]
+        
+        movidas: Dict[str, int] = {}
+        origem = os.path.abspath(self.db_path)
+        for user_id in user_ids:
+            self._espelhar_usuario(user_id)
+            shard = self.shard_do_usuario(user_id)
+            with shard.get_connection() as conn:
+                conn.execute("ATTACH DATABASE ? AS catalogo", [origem])
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    for tabela in tabelas:
+                        colunas = ', '.join(c[1] for c in conn.execute(f"PRAGMA main.table_info({tabela})"))
+                        cursor = conn.execute(
+                            f"INSERT OR IGNORE INTO main.{tabela} ({colunas}) "
+                            f"SELECT {colunas} FROM catalogo.{tabela} WHERE user_id = ?", [user_id]
+                        )
+                        movidas[tabela] = movidas.get(tabela, 0) + max(cursor.rowcount, 0)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                finally:
+                    conn.execute("DETACH DATABASE catalogo")
+            shard.invalidar_cache()
+            
+            # Só depois de copiado, apagar do catálogo (mantendo o usuário)
+            self.catalogo.executar_batch([
+                (f"DELETE FROM {tabela} WHERE user_id = ?", [user_id]) for tabela in tabelas
+            ])
+        
+        self.logger.info(f"Dados distribuídos em shards: {movidas}")
+        return movidas
+    
+    # ---- Estatísticas e ciclo de vida ----
+    
+    def contar_linhas(self, tabela: str, user_id: Optional[int] = None) -> int:
+        """Contagem por table_stats; sem usuário, soma catálogo e todos os shards em disco"""
+        if tabela in self._TABELAS_GLOBAIS:
+            return self.catalogo.contar_linhas(tabela, user_id)
+        if user_id is not None:
+            return self.shard_do_usuario(user_id).contar_linhas(tabela, user_id)
+        return self.catalogo.contar_linhas(tabela) + sum(
+            db.contar_linhas(tabela) for _, db in self._percorrer_shards()
+        )
+    
+    def obter_estatisticas_db(self) -> Dict[str, Any]:
+        """Soma as estatísticas do catálogo e de todos os shards em disco (usuarios só do catálogo)"""
+        stats = self.catalogo.obter_estatisticas_db()
+        total = 0
+        for _, db in self._percorrer_shards():
+            total += 1
+            for chave, valor in db.obter_estatisticas_db().items():
+                if chave != 'total_usuarios':
+                    stats[chave] = round(stats.get(chave, 0) + valor, 2)
+        stats['total_shards'] = total
+        return stats
+    
+    def reconstruir_resumo_mensal(self, user_id: Optional[int] = None) -> int:
+        if user_id is not None:
+            return self.shard_do_usuario(user_id).reconstruir_resumo_mensal(user_id)
+        return self.catalogo.reconstruir_resumo_mensal() + sum(
+            db.reconstruir_resumo_mensal() for _, db in self._percorrer_shards()
+        )
+    
+    def reconstruir_indice_busca(self) -> int:
+        return self.catalogo.reconstruir_indice_busca() + sum(
+            db.reconstruir_indice_busca() for _, db in self._percorrer_shards()
+        )
+    
+    def busca_textual_disponivel(self) -> bool:
+        return self.catalogo.busca_textual_disponivel()
+    
+    def configurar_slow_query_log(self, **kwargs):
+        """Aplica a configuração do slow-query log ao catálogo e aos shards (inclusive os abertos depois)"""
+        with self._shards_lock:
+            self._slow_query_kwargs.update({k: v for k, v in kwargs.items() if v is not None})
+            shards = list(self._shards.values())
+        for db in [self.catalogo] + shards:
+            db.configurar_slow_query_log(**kwargs)
+    
+    def obter_queries_lentas(self, limite: Optional[int] = 50, persistidas: bool = False) -> List[Dict[str, Any]]:
+        """Queries lentas de todos os arquivos, mais recentes primeiro"""
+        with self._shards_lock:
+            shards = list(self._shards.values())
+        registros = [
+            registro for db in [self.catalogo] + shards
+            for registro in db.obter_queries_lentas(limite, persistidas)
+        ]
+        registros.sort(key=lambda r: r['timestamp'], reverse=True)
+        return registros[:limite] if limite else registros
+    
+    def resumo_queries_lentas(self, limite: int = 10) -> Dict[str, Any]:
+        with self._shards_lock:
+            shards = list(self._shards.values())
+        resumo = self.catalogo.resumo_queries_lentas(limite)
+        resumo['total_detected'] = sum(db._health_stats['slow_queries'] for db in [self.catalogo] + shards)
+        resumo['buffered'] = sum(len(db._slow_queries) for db in [self.catalogo] + shards)
+        resumo['top'] = DatabaseManager._agrupar_queries_lentas(self.obter_queries_lentas(limite=None), limite)
+        return resumo
+    
+    def health_check(self) -> Dict[str, Any]:
+        """Saúde do catálogo com o status resumido de cada shard aberto"""
+        resultado = self.catalogo.health_check()
+        with self._shards_lock:
+            shards = dict(self._shards)
+        resultado['shards'] = {nome: db.health_check().get('status') for nome, db in shards.items()}
+        if any(status != 'healthy' for status in resultado['shards'].values()):
+            resultado['status'] = 'unhealthy'
+        return resultado
+    
+    def close_pool(self):
+        """Fecha os shards abertos e o catálogo"""
+        with self._shards_lock:
+            shards = list(self._shards.values())
+            self._shards.clear()
+        for shard in shards:
+            shard.close_pool()
+        self.catalogo.close_pool()
+        with _db_managers_lock:
+            if _db_managers.get(os.path.abspath(self.db_path)) is self:
+                del _db_managers[os.path.abspath(self.db_path)]
+
+class AsyncDatabaseManager:
+    """Fachada asyncio sobre um DatabaseManager (ou ShardedDatabaseManager).
+    
+    Leituras e chamadas síncronas (ex.: métodos de repository) rodam no executor
+    limitado do gerenciador, sem bloquear o event loop; escritas aguardam o Future
+    da thread escritora diretamente, sem ocupar um worker.
+    
+        adb = get_async_database_manager()
+        linhas, df = await asyncio.gather(adb.query(sql1, p1), adb.query_df(sql2, p2))
+    """
+    
+    def __init__(self, db=None):
+        self.db = db if db is not None else get_database_manager()
+    
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Executa uma chamada síncrona de acesso ao banco no executor limitado"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.db._executor, functools.partial(func, *args, **kwargs))
+    
+    async def query(self, query: str, params: Optional[List[Any]] = None) -> List[sqlite3.Row]:
+        """executar_query assíncrono"""
+        return await self.run(self.db.executar_query, query, params)
+    
+    async def query_df(self, query: str, params: Optional[List[Any]] = None,
+                       schema: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+        """executar_query_df (ou executar_query_df_tipado, com schema) assíncrono"""
+        if schema is not None:
+            return await self.run(self.db.executar_query_df_tipado, query, params, schema)
+        return await self.run(self.db.executar_query_df, query, params)
+    
+    async def insert(self, query: str, params: Optional[List[Any]] = None) -> int:
+        """executar_insert assíncrono (ID gerado)"""
+        return await asyncio.wrap_future(self.db.executar_insert_async(query, params))
+    
+    async def update(self, query: str, params: Optional[List[Any]] = None) -> int:
+        """executar_update assíncrono (linhas afetadas)"""
+        return await asyncio.wrap_future(self.db.executar_update_async(query, params))
+    
+    async def batch(self, queries: List[Tuple[str, List[Any]]]) -> List[int]:
+        """executar_batch assíncrono (linhas afetadas por query)"""
+        return await asyncio.wrap_future(self.db.executar_batch_async(queries))
+    
+    async def many(self, query: str, linhas: Iterable[Sequence[Any]]) -> int:
+        """executar_many assíncrono (linhas alteradas)"""
+        return await asyncio.wrap_future(self.db.executar_many_async(query, linhas))
+
+# Registro global: um gerenciador compartilhado por arquivo de banco
+_db_managers: Dict[str, Any] = {}
+_db_managers_lock = threading.Lock()
+
+def get_database_manager(db_path: str = "richness_v2.db",
+                         shards: Optional[Union[int, str]] = None) -> DatabaseManager:
+    """Retorna o DatabaseManager compartilhado do processo para o arquivo (criado sob demanda).
+    
+    shards (ou a variável de ambiente DB_SHARDS) ativa o modo particionado:
+    'usuario' para um arquivo por usuário ou um inteiro N para N shards.
+    """
+    chave = os.path.abspath(db_path)
+    manager = _db_managers.get(chave)
+    if manager is None:
+        with _db_managers_lock:
+            manager = _db_managers.get(chave)
+            if manager is None:
+                if shards is None:
+                    shards = os.getenv("DB_SHARDS") or None
+                if shards is None:
+                    manager = DatabaseManager(db_path)
+                else:
+                    if isinstance(shards, str) and shards.isdigit():
+                        shards = int(shards)
+                    manager = ShardedDatabaseManager(db_path, shards)
+                _db_managers[chave] = manager
+    return manager
 
-# Instância global do gerenciador otimizado
-db_manager = DatabaseManager()
+def get_async_database_manager(db_path: str = "richness_v2.db") -> AsyncDatabaseManager:
+    """Fachada asyncio sobre o gerenciador compartilhado do arquivo"""
+    return AsyncDatabaseManager(get_database_manager(db_path))
@@ -7,6 +7,9 @@ import sqlite3
 import time
 import json
 import os
+import re
+import math
+import hashlib
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 import pandas as pd
@@ -82,6 +85,7 @@ class DatabaseMonitor:
             'cache_hit_ratio': self.db._calculate_cache_hit_ratio(),
             'queries_per_minute': self._calculate_query_rate(),
             'average_query_time': self._calculate_avg_query_time(),
+            'query_latency': self.db._query_metrics.totals(),
             'database_size_growth': self._calculate_db_growth(),
         }
         
@@ -104,39 +108,39 @@ class DatabaseMonitor:
             'system': system_metrics
         }
     
+    def _minutes_since_last_collection(self) -> Optional[float]:
+        """Minutos decorridos desde a última coleta registrada"""
+        if not self.metrics_history:
+            return None
+        previous = datetime.fromisoformat(self.metrics_history[-1]['timestamp'])
+        return max((datetime.now() - previous).total_seconds() / 60, 1e-9)
+    
     def _calculate_query_rate(self) -> float:
-        """Calcula taxa de queries por minuto"""
-        if len(self.metrics_history) < 2:
-            return 0.0
+        """Calcula taxa de queries por minuto desde a última coleta"""
+        elapsed_minutes = self._minutes_since_last_collection()
+        if elapsed_minutes is None:
+            return self.db._query_metrics.totals()['queries_per_minute']
         
         current = self.db._health_stats['queries_executed']
-        previous_metric = self.metrics_history[-1] if self.metrics_history else None
-        
-        if previous_metric:
-            previous = previous_metric.get('health', {}).get('performance_stats', {}).get('queries_executed', 0)
-            time_diff_minutes = 5  # Assumindo coleta a cada 5 minutos
-            return (current - previous) / time_diff_minutes
-        
-        return 0.0
+        previous = self.metrics_history[-1].get('health', {}).get('performance_stats', {}).get('queries_executed', 0)
+        return round((current - previous) / elapsed_minutes, 2)
     
     def _calculate_avg_query_time(self) -> float:
-        """Calcula tempo médio de query (estimado)"""
-        # Implementação simplificada - poderia ser mais sofisticada
-        return 5.0  # ms estimado
+        """Calcula tempo médio de query (ms) medido pelo DatabaseManager"""
+        return self.db._query_metrics.totals()['avg_ms']
     
     def _calculate_db_growth(self) -> float:
         """Calcula crescimento do banco em MB/dia"""
         if len(self.metrics_history) < 2:
             return 0.0
         
-        current_size = self.metrics_history[-1]['system']['disk_usage_mb']
-        previous_size = self.metrics_history[-2]['system']['disk_usage_mb']
-        
-        # Crescimento por coleta * coletas por dia (estimado)
-        growth_per_collection = current_size - previous_size
-        collections_per_day = 24 * 60 / 5  # Assumindo coleta a cada 5 minutos
+        current, previous = self.metrics_history[-1], self.metrics_history[-2]
+        growth = current['system']['disk_usage_mb'] - previous['system']['disk_usage_mb']
+        elapsed_days = (
+            datetime.fromisoformat(current['timestamp']) - datetime.fromisoformat(previous['timestamp'])
+        ).total_seconds() / 86400
         
-        return growth_per_collection * collections_per_day
+        return growth / elapsed_days if elapsed_days > 0 else 0.0
     
     def _get_wal_size(self) -> float:
         """Obtém tamanho do arquivo WAL"""
@@ -223,6 +227,7 @@ class DatabaseMonitor:
         # Calcular médias e tendências
         cache_ratios = [m['performance']['cache_hit_ratio'] for m in recent_metrics]
         query_rates = [m['performance']['queries_per_minute'] for m in recent_metrics]
+        query_times = [m['performance']['average_query_time'] for m in recent_metrics]
         db_sizes = [m['system']['disk_usage_mb'] for m in recent_metrics]
         
         return {
@@ -231,8 +236,10 @@ class DatabaseMonitor:
             'performance_summary': {
                 'avg_cache_hit_ratio': sum(cache_ratios) / len(cache_ratios) if cache_ratios else 0,
                 'avg_queries_per_minute': sum(query_rates) / len(query_rates) if query_rates else 0,
+                'avg_query_time_ms': sum(query_times) / len(query_times) if query_times else 0,
                 'database_growth_mb': db_sizes[-1] - db_sizes[0] if len(db_sizes) >= 2 else 0,
             },
+            'slowest_queries': self.db.obter_metricas_queries(limite=10, ordenar_por='p95_ms'),
             'alerts_summary': {
                 'total_alerts': len([a for a in self.alerts if datetime.fromisoformat(a['timestamp']) > cutoff]),
                 'error_alerts': len([a for a in self.alerts if a['level'] == 'error' and datetime.fromisoformat(a['timestamp']) > cutoff]),
@@ -241,6 +248,368 @@ class DatabaseMonitor:
             'recent_alerts': [a for a in self.alerts if datetime.fromisoformat(a['timestamp']) > cutoff][-10:]
         }
 
+class QueryPlanAuditor:
+    """Audita o workload real de queries com EXPLAIN QUERY PLAN e recomenda índices"""
+    
+    # Statements cujo plano interessa (INSERT só quando tem SELECT)
+    _RE_EXPLICAVEL = re.compile(r'^\s*(?:select|with|update|delete|insert\b.*\bselect)\b', re.IGNORECASE | re.DOTALL)
+    _RE_STRING = re.compile(r"'(?:[^']|'')*'")
+    _RE_TABELA = re.compile(
+        r'\b(?:from|join|update)\s+([a-z_]\w*)(?:\s+(?:as\s+)?([a-z_]\w*))?', re.IGNORECASE
+    )
+    _RE_PREDICADO = re.compile(
+        r"(?:\b([a-z_]\w*)\.)?\b([a-z_]\w*)\s*(=|==|<=|>=|<|>|\bin\b|\bbetween\b|\blike\b)\s*"
+        r"(\?|'(?:[^']|'')*'|-?\d+(?:\.\d+)?|\(|(?:[a-z_]\w*\.)?[a-z_]\w*)",
+        re.IGNORECASE
+    )
+    _RE_ORDENACAO = re.compile(
+        r'\b(?:order|group)\s+by\s+(.+?)(?:\blimit\b|\bhaving\b|\border\b|\)|$)', re.IGNORECASE | re.DOTALL
+    )
+    _RE_SELECAO = re.compile(r'^\s*select\s+(?:distinct\s+)?(.+?)\s+from\s', re.IGNORECASE | re.DOTALL)
+    _RE_INDICE_USADO = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+    _RE_WHERE_INDICE = re.compile(r'\bwhere\b(.+)$', re.IGNORECASE | re.DOTALL)
+    _RE_IGUALDADE_CONSTANTE = re.compile(
+        r'\s*\(?\s*(?:[a-z_]\w*\.)?([a-z_]\w*)\s*==?\s*(-?\d+)\s*\)?\s*', re.IGNORECASE
+    )
+    _RE_PLANO_TABELA = re.compile(r'^(SCAN|SEARCH) (\w+)(.*)$')
+    
+    # Palavras que o _RE_TABELA pode capturar como alias
+    _NAO_ALIAS = {
+        'where', 'on', 'join', 'left', 'right', 'inner', 'outer', 'cross', 'natural',
+        'group', 'order', 'limit', 'set', 'using', 'union', 'values', 'having', 'indexed', 'not'
+    }
+    
+    # Colunas além das quais um índice de cobertura deixa de compensar
+    MAX_COLUNAS_COBERTURA = 6
+    
+    def __init__(self, db_manager):
+        self.db = db_manager
+        self.logger = logging.getLogger(__name__)
+        self._colunas_cache: Dict[str, List[str]] = {}
+        self._linhas_cache: Dict[str, int] = {}
+    
+    def audit(self, workload: Optional[List[Dict[str, Any]]] = None, limit: int = 50) -> Dict[str, Any]:
+        """Explica as queries mais custosas do workload e consolida achados e recomendações.
+        
+        workload: itens no formato de DatabaseManager.obter_metricas_queries (query,
+        sample, count, total_ms, avg_rows); padrão = métricas capturadas pelo processo.
+        """
+        if workload is None:
+            workload = self.db.obter_metricas_queries(limite=None, ordenar_por='total_ms')
+        workload = sorted(workload, key=lambda item: item.get('total_ms', 0), reverse=True)
+        
+        findings = []
+        candidates: Dict[str, Dict[str, Any]] = {}
+        names: Dict[str, str] = {}  # nome recomendado -> definição (nomes únicos na auditoria)
+        used_indexes = set()
+        analyzed = skipped = 0
+        
+        with self.db.get_connection() as conn:
+            for item in workload:
+                if analyzed >= limit:
+                    break
+                sql = item.get('sample') or item.get('query', '')
+                sql = sql.replace('(?+)', '(?)')
+                if not self._RE_EXPLICAVEL.match(sql) or 'explain' in sql[:10].lower():
+                    skipped += 1
+                    continue
+                
+                plan = self._explain(conn, sql)
+                if plan is None:
+                    skipped += 1
+                    continue
+                analyzed += 1
+                
+                aliases = self._aliases(sql)
+                for detail in plan:
+                    used_indexes.update(self._RE_INDICE_USADO.findall(detail))
+                
+                for finding in self._classify_plan(plan, aliases):
+                    if not self._table_columns(conn, finding['table']):
+                        continue  # CTE ou subquery nomeada
+                    finding.update({
+                        'query': item.get('query', sql),
+                        'count': item.get('count', 1),
+                        'total_ms': item.get('total_ms', 0.0)
+                    })
+                    findings.append(finding)
+                    
+                    if finding['type'] in ('full_scan', 'index_scan', 'temp_btree'):
+                        rec = self._recommend(conn, sql, aliases, finding, item, names)
+                        if rec:
+                            current = candidates.get(rec['sql'])
+                            if current is None:
+                                current = candidates[rec['sql']] = dict(rec, queries=[])
+                            else:
+                                current['estimated_benefit_ms'] = round(
+                                    current['estimated_benefit_ms'] + rec['estimated_benefit_ms'], 2
+                                )
+                                current['estimated_rows_avoided'] += rec['estimated_rows_avoided']
+                            current['queries'].append(item.get('query', sql))
+            
+            unused = self._unused_indexes(conn, used_indexes) if analyzed else []
+        
+        recommendations = sorted(candidates.values(), key=lambda r: r['estimated_benefit_ms'], reverse=True)
+        return {
+            'audited_at': datetime.now().isoformat(),
+            'queries_analyzed': analyzed,
+            'queries_skipped': skipped,
+            'findings': findings,
+            'unused_indexes': unused,
+            'recommendations': recommendations,
+            'note': "Índices usados só por triggers ou por queries fora do workload aparecem como não usados"
+        }
+    
+    def _explain(self, conn, sql: str) -> Optional[List[str]]:
+        """Detalhes do EXPLAIN QUERY PLAN (parâmetros ligados como NULL)"""
+        placeholders = self._RE_STRING.sub("''", sql).count('?')
+        try:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", [None] * placeholders).fetchall()
+        except sqlite3.Error as e:
+            self.logger.debug(f"EXPLAIN falhou ({e}): {sql[:120]}")
+            return None
+        return [row[3] for row in rows]
+    
+    def _aliases(self, sql: str) -> Dict[str, str]:
+        """Mapeia alias (ou nome) -> tabela real para as tabelas citadas na query"""
+        aliases = {}
+        for table, alias in self._RE_TABELA.findall(self._RE_STRING.sub("''", sql)):
+            table = table.lower()
+            if table == 'select':
+                continue
+            aliases[table] = table
+            if alias and alias.lower() not in self._NAO_ALIAS:
+                aliases[alias.lower()] = table
+        return aliases
+    
+    def _classify_plan(self, plan: List[str], aliases: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Identifica varreduras completas e B-trees temporárias no plano"""
+        findings = []
+        outer = None  # primeira tabela do plano: o loop externo que define a ordem
+        for detail in plan:
+            match = self._RE_PLANO_TABELA.match(detail)
+            if match:
+                op, name, rest = match.groups()
+                table = aliases.get(name.lower())
+                if outer is None:
+                    outer = (name.lower(), table, 'VIRTUAL TABLE' in rest)
+                if op == 'SCAN' and table and 'VIRTUAL TABLE' not in rest:
+                    kind = 'index_scan' if 'INDEX' in rest else 'full_scan'
+                    findings.append({'type': kind, 'table': table, 'alias': name.lower(), 'detail': detail})
+            elif detail.startswith('USE TEMP B-TREE') and outer and outer[1] and not outer[2]:
+                findings.append({
+                    'type': 'temp_btree', 'table': outer[1],
+                    'alias': outer[0], 'detail': detail
+                })
+        return findings
+    
+    def _table_columns(self, conn, table: str) -> List[str]:
+        if table not in self._colunas_cache:
+            self._colunas_cache[table] = [row[1].lower() for row in conn.execute(f"PRAGMA table_info({table})")]
+        return self._colunas_cache[table]
+    
+    def _table_rows(self, conn, table: str) -> int:
+        """Linhas da tabela: table_stats quando mantida, senão COUNT(*)"""
+        if table not in self._linhas_cache:
+            if table in getattr(self.db, '_TABELAS_CONTADAS', ()):
+                self._linhas_cache[table] = self.db.contar_linhas(table)
+            else:
+                self._linhas_cache[table] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        return self._linhas_cache[table]
+    
+    def _owns(self, conn, ref_alias: Optional[str], column: str, alias: str, table: str,
+              aliases: Dict[str, str]) -> bool:
+        """Indica se a referência (alias.coluna ou coluna solta) pertence à tabela analisada"""
+        column = column.lower()
+        if column not in self._table_columns(conn, table):
+            return False
+        if ref_alias:
+            return ref_alias.lower() == alias or ref_alias.lower() == table
+        others = {t for t in aliases.values() if t != table}
+        return not any(column in self._table_columns(conn, other) for other in others)
+    
+    def _recommend(self, conn, sql: str, aliases: Dict[str, str], finding: Dict[str, Any],
+                   item: Dict[str, Any], names: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """Monta o índice (simples, de cobertura e/ou parcial) que eliminaria o achado"""
+        table, alias = finding['table'], finding['alias']
+        # Todo índice já carrega o rowid: indexá-lo ou cobri-lo não acrescenta nada
+        rowid = self._rowid_columns(conn, table)
+        # Predicados só a partir do FROM (evita CASE WHEN da lista de colunas)
+        inicio = re.search(r'\bfrom\b', sql, re.IGNORECASE)
+        predicates = sql[inicio.start():] if inicio else sql
+        
+        equality, ranges, partial = [], [], []
+        for ref_alias, column, op, value in self._RE_PREDICADO.findall(predicates):
+            if not self._owns(conn, ref_alias, column, alias, table, aliases):
+                # Junção escrita como outro.coluna = alias.coluna
+                value_alias, _, value_column = value.rpartition('.')
+                if op in ('=', '==') and value_column and self._owns(
+                        conn, value_alias or None, value_column, alias, table, aliases):
+                    column, value = value_column, '?'
+                else:
+                    continue
+            column = column.lower()
+            op = op.lower()
+            if op == 'like' or column in rowid:
+                # LIKE padrão é case-insensitive: não usa índice B-tree em coluna BINARY
+                continue
+            if op in ('=', '==') and re.fullmatch(r'-?\d+', value):
+                # Flag constante (ex.: excluida = 0) vira predicado de índice parcial
+                predicate = f"{column} = {value}"
+                if predicate not in partial:
+                    partial.append(predicate)
+            elif op in ('=', '==', 'in'):
+                if column not in equality:
+                    equality.append(column)
+            elif column not in ranges and column not in equality:
+                ranges.append(column)
+        
+        ordering = []
+        for clause in self._RE_ORDENACAO.findall(sql):
+            for term in clause.split(','):
+                ref = term.strip().split()[0] if term.strip() else ''
+                ref_alias, _, column = ref.rpartition('.')
+                if column and column.lower() not in rowid and self._owns(
+                        conn, ref_alias or None, column, alias, table, aliases):
+                    direction = ' DESC' if re.search(r'\bdesc\b', term, re.IGNORECASE) else ''
+                    ordering.append(column.lower() + direction)
+        
+        if finding['type'] == 'index_scan' and not (equality or ranges or partial):
+            return None  # varredura ordenada sem filtro: índice novo não ajuda
+        
+        columns = list(equality)
+        if finding['type'] == 'temp_btree' or not ranges:
+            columns += [c for c in ordering if c.split()[0] not in columns]
+        if ranges:
+            columns += [c for c in ranges[:1] if c not in columns]
+        if not columns:
+            return None
+        
+        covering = False
+        selection = self._RE_SELECAO.match(sql)
+        if selection and '*' not in selection.group(1):
+            selected = []
+            for ref_alias, column in re.findall(r'(?:\b([a-z_]\w*)\.)?\b([a-z_]\w*)\b', selection.group(1), re.IGNORECASE):
+                if column.lower() not in rowid and self._owns(conn, ref_alias or None, column, alias, table, aliases):
+                    selected.append(column.lower())
+            base = [c.split()[0] for c in columns]
+            extra = [c for c in dict.fromkeys(selected) if c not in base]
+            if extra and len(base) + len(extra) <= self.MAX_COLUNAS_COBERTURA:
+                columns += extra
+                covering = True
+        
+        base = [c.split()[0] for c in columns]
+        if self._covered_by_existing(conn, table, base, partial):
+            return None
+        
+        definition = f"ON {table}({', '.join(columns)})"
+        if partial:
+            definition += " WHERE " + " AND ".join(partial)
+        name = self._index_name(conn, table, base, definition, bool(partial), names)
+        index_sql = f"CREATE INDEX {name} {definition}"
+        kind = ('partial_' if partial else '') + ('covering' if covering else 'simple')
+        
+        # Benefício: fração do custo atual que o índice elimina, aplicada ao tempo total medido
+        rows = max(self._table_rows(conn, table), 1)
+        returned = max(item.get('avg_rows', 0) or 0, 1)
+        if finding['type'] != 'temp_btree':
+            cost_index = math.log2(rows + 1) + returned
+            fraction = max(0.0, 1 - cost_index / rows)
+            avoided = max(rows - cost_index, 0) * item.get('count', 1)
+        else:
+            sort_cost = returned * math.log2(returned + 1)
+            fraction = sort_cost / (sort_cost + rows)
+            avoided = 0
+        
+        return {
+            'sql': index_sql,
+            'table': table,
+            'columns': columns,
+            'kind': kind,
+            'reason': finding['detail'],
+            'estimated_benefit_ms': round(item.get('total_ms', 0.0) * fraction, 2),
+            'estimated_rows_avoided': int(avoided)
+        }
+    
+    def _rowid_columns(self, conn, table: str) -> set:
+        """Nomes do rowid na tabela (inclui a INTEGER PRIMARY KEY, que é um alias dele)"""
+        pk = [row for row in conn.execute(f"PRAGMA table_info({table})") if row[5]]
+        names = {'rowid', '_rowid_', 'oid'}
+        if len(pk) == 1 and (pk[0][2] or '').upper() == 'INTEGER':
+            names.add(pk[0][1].lower())
+        return names
+    
+    def _index_name(self, conn, table: str, base: List[str], definition: str, partial: bool,
+                    names: Dict[str, str]) -> str:
+        """Nome que não existe no banco nem foi dado a outra definição nesta auditoria.
+        
+        Colisões recebem _parcial (índices parciais) ou um hash curto da definição.
+        """
+        existing = {row[0].lower() for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        stem = f"idx_{table}_" + '_'.join(base)[:40]
+        digest = hashlib.blake2b(definition.encode('utf-8'), digest_size=3).hexdigest()
+        options = [stem] + ([f"{stem}_parcial"] if partial else []) + [f"{stem}_{digest}"]
+        options += [f"{stem}_{digest}_{n}" for n in range(2, 100)]
+        for name in options:
+            if name.lower() not in existing and names.get(name, definition) == definition:
+                names[name] = definition
+                return name
+        raise RuntimeError(f"Sem nome livre para o índice recomendado em {table}")
+    
+    def _covered_by_existing(self, conn, table: str, columns: List[str], partial: List[str]) -> bool:
+        """Verifica se algum índice existente já começa pelas mesmas colunas.
+        
+        Um índice parcial só conta se todos os termos do WHERE dele estiverem entre
+        os predicados constantes da query (senão o SQLite não pode usá-lo).
+        """
+        query_terms = {self._normalize_predicate(p) for p in partial}
+        for index in conn.execute(f"PRAGMA index_list({table})").fetchall():
+            existing = [row[2].lower() for row in conn.execute(f"PRAGMA index_info({index[1]})") if row[2]]
+            if existing[:len(columns)] != columns:
+                continue
+            if not index[4]:
+                return True
+            index_terms = self._partial_index_terms(conn, index[1])
+            if index_terms is not None and index_terms <= query_terms:
+                return True
+        return False
+    
+    def _partial_index_terms(self, conn, index_name: str) -> Optional[set]:
+        """Termos do WHERE de um índice parcial ('coluna = n'); None se não forem só igualdades simples"""
+        row = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", [index_name]
+        ).fetchone()
+        match = self._RE_WHERE_INDICE.search(row[0]) if row and row[0] else None
+        if not match:
+            return None
+        terms = set()
+        for term in re.split(r'\band\b', match.group(1), flags=re.IGNORECASE):
+            term = self._normalize_predicate(term)
+            if term is None:
+                return None
+            terms.add(term)
+        return terms
+    
+    @classmethod
+    def _normalize_predicate(cls, predicate: str) -> Optional[str]:
+        """'T.Excluida == 00' -> 'excluida = 0' (None se não for coluna = inteiro)"""
+        match = cls._RE_IGUALDADE_CONSTANTE.fullmatch(predicate)
+        if not match:
+            return None
+        return f"{match.group(1).lower()} = {int(match.group(2))}"
+    
+    def _unused_indexes(self, conn, used: set) -> List[Dict[str, Any]]:
+        """Índices explícitos que não aparecem em nenhum plano do workload"""
+        rows = conn.execute("""
+            SELECT name, tbl_name, sql FROM sqlite_master
+            WHERE type = 'index' AND sql IS NOT NULL
+            ORDER BY tbl_name, name
+        """).fetchall()
+        return [
+            {'name': row[0], 'table': row[1], 'sql': row[2]}
+            for row in rows if row[0] not in used
+        ]
+
 class DatabaseOptimizer:
     """Otimizador automático para o banco de dados"""
     
@@ -279,28 +648,34 @@ class DatabaseOptimizer:
         }
     
     def _analyze_index_usage(self) -> Dict[str, Any]:
-        """Analisa uso dos índices"""
+        """Analisa uso dos índices com EXPLAIN QUERY PLAN sobre o workload capturado"""
         try:
-            # Verificar estatísticas de índices (SQLite tem limitações aqui)
+            # Integridade: último resultado conhecido (quick_check periódico / integrity_check noturno)
+            integridade = self.db.obter_status_integridade()
+            ultima = integridade['integrity_check'] or integridade['quick_check']
+            
             with self.db.get_connection() as conn:
-                # Verificar integridade dos índices
-                integrity = conn.execute("PRAGMA integrity_check").fetchall()
-                
-                # Obter lista de índices
-                indexes = conn.execute("""
-                    SELECT name, sql FROM sqlite_master 
+                total_indexes = conn.execute("""
+                    SELECT COUNT(*) FROM sqlite_master 
                     WHERE type = 'index' AND name NOT LIKE 'sqlite_%'
-                """).fetchall()
+                """).fetchone()[0]
             
+            audit = QueryPlanAuditor(self.db).audit()
             suggestions = []
             
-            # Verificações básicas
-            if len(indexes) < 10:
-                suggestions.append("Considere adicionar mais índices para melhorar performance")
+            for rec in audit['recommendations'][:5]:
+                suggestions.append(
+                    f"{rec['sql']} (≈{rec['estimated_benefit_ms']:.1f} ms em {len(rec['queries'])} queries)"
+                )
+            
+            scans = {f['table'] for f in audit['findings'] if f['type'] == 'full_scan'}
+            if scans:
+                suggestions.append(f"Varreduras completas em: {', '.join(sorted(scans))}")
             
             return {
-                'total_indexes': len(indexes),
-                'integrity_ok': integrity[0][0] == 'ok' if integrity else False,
+                'total_indexes': total_indexes,
+                'integrity_ok': ultima['ok'] if ultima else None,
+                'plan_audit': audit,
                 'suggestions': suggestions
             }
             
@@ -364,12 +739,10 @@ class DatabaseOptimizer:
                 conn.execute("ANALYZE")
             applied.append("ANALYZE executado")
             
-            # Limpar cache de query se muito grande
+            # Limpar cache de query se muito grande (remove também expiradas)
             if len(self.db._query_cache) > 1000:
-                with self.db._cache_lock:
-                    # Manter apenas os 200 mais recentes
-                    items = list(self.db._query_cache.items())[-200:]
-                    self.db._query_cache = dict(items)
+                # Manter apenas os 200 mais recentes
+                self.db._trim_cache(200)
                 applied.append("Cache de queries otimizado")
             
         except Exception as e:
@@ -389,14 +762,18 @@ class ConfigurationManager:
                 'auto_backup_enabled': True,
                 'backup_interval_hours': 24,
                 'max_backups_to_keep': 7,
-                'backup_directory': 'backups'
+                'backup_directory': 'backups',
+                'backup_pages_per_step': 1024,
+                'backup_step_pause_ms': 50
             },
             'performance': {
                 'cache_size': 10000,
                 'connection_pool_size': 5,
                 'query_timeout_seconds': 30,
                 'enable_query_cache': True,
-                'max_query_cache_size': 500
+                'max_query_cache_size': 500,
+                'max_query_cache_mb': 64,
+                'query_cache_ttl_seconds': 300
             },
             'monitoring': {
                 'monitoring_enabled': True,
@@ -407,14 +784,21 @@ class ConfigurationManager:
                     'backup_age_max_hours': 24,
                     'wal_size_max_mb': 100,
                     'database_size_warning_mb': 1000
-                }
+                },
+                'slow_query_log_enabled': True,
+                'slow_query_threshold_ms': 250,
+                'slow_query_sample_rate': 1.0,
+                'slow_query_persist': False
             },
             'maintenance': {
                 'auto_vacuum_enabled': True,
                 'vacuum_frequency_days': 7,
                 'auto_cleanup_logs_days': 30,
                 'auto_optimize_enabled': True,
-                'optimize_frequency_hours': 168  # 1 semana
+                'optimize_frequency_hours': 168,  # 1 semana
+                'incremental_vacuum_pages': 1024,
+                'analyze_min_changes': 1000,
+                'wal_truncate_mb': 64
             }
         }
     
@@ -470,17 +854,54 @@ class ConfigurationManager:
             
             if 'max_query_cache_size' in perf_config:
                 max_cache = perf_config['max_query_cache_size']
-                with self.db._cache_lock:
-                    if len(self.db._query_cache) > max_cache:
-                        items = list(self.db._query_cache.items())[-max_cache:]
-                        self.db._query_cache = dict(items)
+                self.db.configurar_cache(max_entries=max_cache)
                 applied.append(f"Cache de queries limitado a {max_cache}")
             
+            if 'max_query_cache_mb' in perf_config:
+                max_mb = perf_config['max_query_cache_mb']
+                self.db.configurar_cache(max_mb=max_mb)
+                applied.append(f"Memória do cache de queries limitada a {max_mb} MB")
+            
+            if 'query_cache_ttl_seconds' in perf_config:
+                ttl = perf_config['query_cache_ttl_seconds']
+                self.db.configurar_cache(ttl_seconds=ttl)
+                applied.append(f"TTL do cache de queries: {ttl}s")
+            
             # Aplicar configurações de backup
             backup_config = config.get('backup', {})
             if backup_config.get('auto_backup_enabled'):
                 applied.append("Auto backup habilitado")
             
+            self.db.configurar_backup(
+                max_backups=backup_config.get('max_backups_to_keep'),
+                paginas_por_passo=backup_config.get('backup_pages_per_step'),
+                pausa_ms=backup_config.get('backup_step_pause_ms'),
+                diretorio=backup_config.get('backup_directory')
+            )
+            if 'max_backups_to_keep' in backup_config:
+                applied.append(f"Retenção de backups: {backup_config['max_backups_to_keep']} arquivos")
+            
+            # Aplicar orçamentos da manutenção automática
+            maint_config = config.get('maintenance', {})
+            self.db.configurar_manutencao(
+                vacuum_paginas=maint_config.get('incremental_vacuum_pages'),
+                analyze_alteracoes=maint_config.get('analyze_min_changes'),
+                wal_truncate_mb=maint_config.get('wal_truncate_mb')
+            )
+            if 'incremental_vacuum_pages' in maint_config:
+                applied.append(f"Incremental vacuum: até {maint_config['incremental_vacuum_pages']} páginas por execução")
+            
+            # Aplicar slow-query log
+            monitoring_config = config.get('monitoring', {})
+            self.db.configurar_slow_query_log(
+                limite_ms=monitoring_config.get('slow_query_threshold_ms'),
+                amostragem=monitoring_config.get('slow_query_sample_rate'),
+                persistir=monitoring_config.get('slow_query_persist'),
+                ativo=monitoring_config.get('slow_query_log_enabled')
+            )
+            if 'slow_query_threshold_ms' in monitoring_config:
+                applied.append(f"Slow-query log: queries acima de {monitoring_config['slow_query_threshold_ms']} ms")
+            
             return applied
             
         except Exception as e:
@@ -527,6 +948,17 @@ class DatabaseManagementSuite:
         self._last_optimization = datetime.now().isoformat()
         return result
     
+    def get_slow_query_report(self, limit: int = 20) -> Dict[str, Any]:
+        """Queries lentas: agrupadas por fingerprint e chamador, mais as ocorrências recentes"""
+        report = self.db.resumo_queries_lentas(limit)
+        report['recent'] = self.db.obter_queries_lentas(limit)
+        if report['config'].get('persistir'):
+            try:
+                report['persisted_recent'] = self.db.obter_queries_lentas(limit, persistidas=True)
+            except Exception as e:
+                self.logger.error(f"Erro ao ler queries lentas persistidas: {e}")
+        return report
+    
     def generate_comprehensive_report(self) -> Dict[str, Any]:
         """Gera relatório abrangente do sistema"""
         return {
@@ -534,6 +966,7 @@ class DatabaseManagementSuite:
             'performance_report': self.monitor.get_performance_report(24),
             'optimization_analysis': self.run_optimization(),
             'database_statistics': self.db.obter_estatisticas_db(),
+            'slow_queries': self.get_slow_query_report(),
             'configuration': self.config,
             'generated_at': datetime.now().isoformat()
         }
@@ -0,0 +1,98 @@
+"""
+Hash de identificação de transações (mesma transação = mesmo hash entre importações).
+
+A chave é canônica: data AAAA-MM-DD | descrição sem espaços nas pontas | valor
+em centavos inteiros. O hash é blake2b de 128 bits (32 caracteres hex, mesmo
+tamanho do MD5 usado antes), calculado de uma vez para colunas inteiras.
+"""
+
+import hashlib
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# Bytes do digest blake2b (hex com o dobro de caracteres)
+TAMANHO_DIGEST = 16
+
+
+def _serie(valores: Iterable[Any]) -> pd.Series:
+    """Coluna como Series com índice 0..n-1 (aceita Series, arrays e listas)"""
+    if isinstance(valores, pd.Series):
+        return valores.reset_index(drop=True)
+    return pd.Series(list(valores) if not isinstance(valores, np.ndarray) else valores)
+
+
+def _datas_canonicas(datas: Iterable[Any]) -> pd.Series:
+    """Datas como AAAA-MM-DD (datetime, date ou texto ISO com ou sem hora)"""
+    serie = _serie(datas)
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.strftime('%Y-%m-%d').fillna('')
+    return serie.fillna('').astype(str).str.slice(0, 10)
+
+
+def _centavos(valores: Iterable[Any]) -> pd.Series:
+    """Valores em centavos inteiros (evita 10.1 vs 10.10 vs 10.099999)"""
+    numeros = pd.to_numeric(_serie(valores), errors='coerce').fillna(0).to_numpy(dtype=float)
+    return pd.Series(np.rint(numeros * 100).astype(np.int64)).astype(str)
+
+
+def gerar_hashes_transacoes(datas: Iterable[Any], descricoes: Iterable[Any],
+                            valores: Iterable[Any]) -> List[str]:
+    """Hashes das transações dadas como arrays de colunas (mesma ordem)"""
+    descricoes = _serie(descricoes).fillna('').astype(str).str.strip()
+    chaves = _datas_canonicas(datas) + '|' + descricoes + '|' + _centavos(valores)
+    return [
+        hashlib.blake2b(chave.encode('utf-8'), digest_size=TAMANHO_DIGEST).hexdigest()
+        for chave in chaves
+    ]
+
+
+def gerar_hashes_df(df: pd.DataFrame, data: str = 'data', descricao: str = 'descricao',
+                    valor: str = 'valor') -> pd.Series:
+    """Hashes das linhas de um DataFrame, alinhados ao índice dele"""
+    if df.empty:
+        return pd.Series([], index=df.index, dtype=object)
+    return pd.Series(
+        gerar_hashes_transacoes(df[data], df[descricao], df[valor]),
+        index=df.index, dtype=object
+    )
+
+
+def gerar_hash_transacao(data: Any, descricao: Any, valor: Any) -> str:
+    """Hash de uma única transação (mesma chave canônica da versão em lote)"""
+    data_str = data.strftime('%Y-%m-%d') if hasattr(data, 'strftime') else ('' if data is None else str(data)[:10])
+    descricao_str = '' if descricao is None else str(descricao).strip()
+    centavos = int(np.rint(float(valor) * 100)) if valor is not None else 0
+    chave = f"{data_str}|{descricao_str}|{centavos}"
+    return hashlib.blake2b(chave.encode('utf-8'), digest_size=TAMANHO_DIGEST).hexdigest()
+
+
+def _mapa_hashes_legados(df: pd.DataFrame, data: str, descricao: str, valor: str) -> Dict[str, str]:
+    """Hash MD5 antigo (data|descrição|valor sem normalização) -> hash atual"""
+    datas = _datas_canonicas(df[data]).tolist()
+    antigos = [
+        hashlib.md5(f"{d}|{desc}|{v}".encode()).hexdigest()
+        for d, desc, v in zip(datas, df[descricao], df[valor])
+    ]
+    return dict(zip(antigos, gerar_hashes_df(df, data, descricao, valor)))
+
+
+def atualizar_chaves_legadas(chaves: Union[List[str], Dict[str, Any]], df: pd.DataFrame,
+                             hashes: pd.Series, data: str = 'Data', descricao: str = 'Descrição',
+                             valor: str = 'Valor') -> Tuple[Union[List[str], Dict[str, Any]], bool]:
+    """Troca chaves MD5 antigas (arquivos locais de personalização) pelo hash atual.
+
+    `chaves` é a lista ou o dict indexado por hash; `hashes` são os hashes
+    atuais das linhas de `df`. Os MD5 só são calculados quando há chaves
+    desconhecidas. Retorna as chaves (atualizadas ou não) e se houve troca.
+    """
+    conhecidos = set(hashes)
+    if df.empty or all(chave in conhecidos for chave in chaves):
+        return chaves, False
+    mapa = _mapa_hashes_legados(df, data, descricao, valor)
+    if not any(chave in mapa for chave in chaves):
+        return chaves, False
+    if isinstance(chaves, dict):
+        return {mapa.get(chave, chave): v for chave, v in chaves.items()}, True
+    return list(dict.fromkeys(mapa.get(chave, chave) for chave in chaves)), True
@@ -3,19 +3,107 @@ Repositories otimizados para acesso a dados seguindo o padrão Repository.
 Versão 2.0 com melhorias de performance e funcionalidades avançadas.
 """
 
-from typing import List, Optional, Dict, Tuple, Any
+from typing import List, Optional, Dict, Tuple, Any, Iterator, Union, IO
 import pandas as pd
 from datetime import datetime, timedelta
-from .database_manager_v2 import DatabaseManager
+from collections import OrderedDict
+import threading
+import time
+from .database_manager_v2 import DatabaseManager, ShardedDatabaseManager, AsyncDatabaseManager, get_database_manager
+from .hash_transacao import gerar_hash_transacao, gerar_hashes_transacoes
 import hashlib
 import json
-from functools import lru_cache
+import base64
+import re
 import logging
 import bcrypt
 
+class CacheUsuarios:
+    """Mapa de identidade username -> perfil do usuário, compartilhado pelo processo.
+    
+    Entradas expiram após `ttl` segundos (escritas feitas por outros processos)
+    e são descartadas pelas escritas em usuarios feitas neste processo. Usuário
+    inexistente não é guardado, para que um cadastro novo apareça na hora.
+    Credenciais (CAMPOS_SENSIVEIS) nunca ficam no mapa: quem precisa delas lê
+    do banco com `usar_cache=False`.
+    """
+    
+    CAMPOS_SENSIVEIS = ('password_hash',)
+    
+    def __init__(self, ttl: float = 60.0, max_entradas: int = 1000):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._entradas: "OrderedDict[Tuple[Any, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Incrementada a cada invalidação: leituras iniciadas antes não são guardadas
+        self.geracao = 0
+    
+    def obter(self, banco: Any, username: str) -> Optional[Dict[str, Any]]:
+        """Cópia do perfil em cache, ou None se ausente/expirado"""
+        with self._lock:
+            entrada = self._entradas.get((banco, username))
+            if entrada is None:
+                return None
+            if entrada[0] < time.monotonic():
+                del self._entradas[(banco, username)]
+                return None
+            self._entradas.move_to_end((banco, username))
+            return dict(entrada[1])
+    
+    @classmethod
+    def sem_credenciais(cls, perfil: Dict[str, Any]) -> Dict[str, Any]:
+        """Cópia do perfil sem os campos sensíveis"""
+        return {campo: valor for campo, valor in perfil.items() if campo not in cls.CAMPOS_SENSIVEIS}
+    
+    def guardar(self, banco: Any, perfil: Dict[str, Any], geracao: int):
+        """Guarda o perfil lido (sem credenciais) quando nenhuma invalidação ocorreu durante a leitura"""
+        with self._lock:
+            if geracao != self.geracao:
+                return
+            self._entradas[(banco, perfil['username'])] = (time.monotonic() + self.ttl, self.sem_credenciais(perfil))
+            self._entradas.move_to_end((banco, perfil['username']))
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+    
+    def invalidar(self, banco: Any = None, user_id: Optional[int] = None,
+                  username: Optional[str] = None) -> int:
+        """Remove entradas do banco (todas, do user_id ou do username); retorna quantas"""
+        with self._lock:
+            self.geracao += 1
+            chaves = [
+                chave for chave, (_, perfil) in self._entradas.items()
+                if (banco is None or chave[0] == banco)
+                and (user_id is None or perfil.get('id') == user_id)
+                and (username is None or chave[1] == username)
+            ]
+            for chave in chaves:
+                del self._entradas[chave]
+            return len(chaves)
+
+# Instância única do processo (todas as instâncias de UsuarioRepository)
+_cache_usuarios = CacheUsuarios()
+
+def _chave_banco(db_manager: Any) -> Any:
+    """Identifica o arquivo de banco nas chaves do cache de usuários"""
+    return getattr(db_manager, 'db_path', id(db_manager))
+
+def resolve_user_id(username: str, db_manager: Optional[DatabaseManager] = None) -> Optional[int]:
+    """ID do usuário pelo username, servido pelo cache de identidade (caminho quente)"""
+    perfil = UsuarioRepository(db_manager or get_database_manager()).obter_usuario_por_username(username)
+    return perfil['id'] if perfil else None
+
+def invalidar_perfil_usuario(user_id: Optional[int] = None, username: Optional[str] = None,
+                             db_manager: Optional[DatabaseManager] = None) -> int:
+    """Descarta perfis em cache após escritas em usuarios feitas fora do UsuarioRepository"""
+    banco = _chave_banco(db_manager) if db_manager is not None else None
+    return _cache_usuarios.invalidar(banco, user_id, username)
+
 class BaseRepository:
     """Classe base para todos os repositories com funcionalidades comuns"""
     
+    # Também gravar as operações em system_logs (pelo buffer em lote do DatabaseManager)
+    PERSISTIR_OPERACOES = False
+    
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
         self.logger = logging.getLogger(self.__class__.__name__)
@@ -23,15 +111,37 @@ class BaseRepository:
     def _log_operation(self, operation: str, details: str = ""):
         """Log interno de operações"""
         self.logger.debug(f"{operation}: {details}")
+        if self.PERSISTIR_OPERACOES:
+            self.db.registrar_log_sistema(operation, f"{self.__class__.__name__}: {details}")
+    
+    async def _executar_async(self, metodo, *args, **kwargs):
+        """Executa um método síncrono do repository no executor limitado do banco"""
+        return await AsyncDatabaseManager(self.db).run(metodo, *args, **kwargs)
 
 class TransacaoRepository(BaseRepository):
     """Repository para operações com transações"""
     
-    @lru_cache(maxsize=1000)
-    def gerar_hash_transacao(self, data: str, descricao: str, valor: float) -> str:
-        """Gera hash único para identificar transação (com cache)"""
-        chave = f"{data}|{descricao}|{valor}"
-        return hashlib.md5(chave.encode()).hexdigest()
+    # Dtypes das colunas de transações para executar_query_df_tipado
+    SCHEMA_TRANSACOES = {
+        'id': 'int',
+        'data': 'datetime',
+        'valor': 'numeric',
+        'categoria': 'category',
+        'tipo': 'category',
+        'origem': 'category',
+        'excluida': 'int',
+        'created_at': 'datetime',
+        'updated_at': 'datetime',
+    }
+    
+    # Trechos entre aspas (frases) ou palavras soltas no texto de busca
+    _RE_TERMO_BUSCA = re.compile(r'"([^"]*)"|(\w+)')
+    
+    # Colunas do índice textual transacoes_fts
+    COLUNAS_BUSCA = ('descricao', 'nota')
+    
+    # Hash de identificação (função do módulo hash_transacao, sem estado)
+    gerar_hash_transacao = staticmethod(gerar_hash_transacao)
     
     def criar_ou_atualizar_transacao(self, user_id: int, transacao: Dict[str, Any]) -> int:
         """Cria ou atualiza transação usando UPSERT"""
@@ -58,31 +168,48 @@ class TransacaoRepository(BaseRepository):
             transacao.get('arquivo_origem')
         ])
     
+    # Linhas por commit na importação em massa
+    TAMANHO_LOTE_IMPORTACAO = 5000
+    
     def criar_transacoes_lote(self, user_id: int, transacoes: List[Dict[str, Any]]) -> int:
-        """Cria múltiplas transações em lote para performance"""
-        queries = []
-        for transacao in transacoes:
-            hash_transacao = self.gerar_hash_transacao(
-                transacao['data'], transacao['descricao'], transacao['valor']
-            )
-            
-            queries.append(("""
-                INSERT OR IGNORE INTO transacoes (
-                    user_id, hash_transacao, data, descricao, valor, 
-                    categoria, tipo, origem, conta, arquivo_origem
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, [
-                user_id, hash_transacao, transacao['data'],
-                transacao['descricao'], transacao['valor'],
-                transacao.get('categoria', 'Outros'),
-                'receita' if transacao['valor'] > 0 else 'despesa',
-                transacao.get('origem', 'ofx_extrato'),
-                transacao.get('conta'),
-                transacao.get('arquivo_origem')
-            ]))
-        
-        results = self.db.executar_batch(queries)
-        return sum(results)
+        """Cria múltiplas transações em lote para performance; retorna as inseridas"""
+        return self.importar_transacoes_em_massa(user_id, transacoes)['inseridas']
+    
+    def importar_transacoes_em_massa(self, user_id: int, transacoes: List[Dict[str, Any]],
+                                     tamanho_lote: Optional[int] = None) -> Dict[str, int]:
+        """Insere transações com um único statement preparado (executemany).
+        
+        As colunas são montadas como arrays e o INSERT OR IGNORE roda sobre
+        elas em blocos de `tamanho_lote` linhas, cada um com seu commit.
+        Retorna total, inseridas e ignoradas (hash já existente).
+        """
+        datas = [t['data'] for t in transacoes]
+        descricoes = [t['descricao'] for t in transacoes]
+        valores = [t['valor'] for t in transacoes]
+        hashes = gerar_hashes_transacoes(datas, descricoes, valores) if transacoes else []
+        linhas = zip(
+            [user_id] * len(transacoes), hashes, datas, descricoes, valores,
+            [t.get('categoria', 'Outros') for t in transacoes],
+            ['receita' if valor > 0 else 'despesa' for valor in valores],
+            [t.get('origem', 'ofx_extrato') for t in transacoes],
+            [t.get('conta') for t in transacoes],
+            [t.get('arquivo_origem') for t in transacoes],
+        )
+        
+        inseridas = self.db.executar_many("""
+            INSERT OR IGNORE INTO transacoes (
+                user_id, hash_transacao, data, descricao, valor, 
+                categoria, tipo, origem, conta, arquivo_origem
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, linhas, tamanho_lote or self.TAMANHO_LOTE_IMPORTACAO) if transacoes else 0
+        
+        self._log_operation("importar_transacoes_em_massa",
+                            f"User: {user_id}, Inseridas: {inseridas}/{len(transacoes)}")
+        return {
+            'total': len(transacoes),
+            'inseridas': inseridas,
+            'ignoradas': len(transacoes) - inseridas,
+        }
 
     def remover_transacoes_por_arquivo(self, user_id: int, arquivo_origem: str) -> int:
         """Remove todas as transações associadas a um arquivo específico"""
@@ -93,15 +220,54 @@ class TransacaoRepository(BaseRepository):
         """
         return self.db.executar_update(query, [user_id, arquivo_origem])
 
-    def obter_transacoes_periodo(self, user_id: int, data_inicio: str, 
-                                data_fim: str, categorias: Optional[List[str]] = None,
-                                incluir_excluidas: bool = False,
-                                limite: Optional[int] = None,
-                                offset: int = 0) -> pd.DataFrame:
-        """Obtém transações com filtros otimizados e paginação"""
+    def _filtros_periodo(self, user_id: int, data_inicio: str, data_fim: str,
+                         categorias: Optional[List[str]] = None,
+                         incluir_excluidas: bool = False,
+                         origem: Optional[str] = None,
+                         sinal: Optional[int] = None) -> Tuple[str, List[Any]]:
+        """Cláusula WHERE (sobre o alias t) e parâmetros das consultas de transações por período"""
+        where = "WHERE t.user_id = ? AND t.data BETWEEN ? AND ?"
+        params = [user_id, data_inicio, data_fim]
+        
+        # Filtrar excluídas se solicitado (flag mantida por trigger; usa índice parcial)
+        if not incluir_excluidas:
+            where += " AND t.excluida = 0"
+        
+        # Filtrar por categorias
+        if categorias:
+            placeholders = ','.join(['?' for _ in categorias])
+            where += f" AND t.categoria IN ({placeholders})"
+            params.extend(categorias)
+        
+        if origem:
+            where += " AND t.origem = ?"
+            params.append(origem)
+        
+        # Filtrar pelo sinal do valor (1 = entradas, -1 = saídas)
+        if sinal:
+            where += " AND t.valor > 0" if sinal > 0 else " AND t.valor < 0"
+        
+        return where, params
+    
+    def _montar_query_periodo(self, user_id: int, data_inicio: str, data_fim: str,
+                              categorias: Optional[List[str]] = None,
+                              incluir_excluidas: bool = False,
+                              origem: Optional[str] = None,
+                              sinal: Optional[int] = None,
+                              apos: Optional[Tuple[str, int]] = None,
+                              chave_cursor: bool = False) -> Tuple[str, List[Any]]:
+        """Monta a query (sem paginação) usada pelas consultas de transações por período.
+        
+        `apos` é a chave (data, id) da última linha já lida: só vêm as linhas
+        seguintes na ordenação data DESC, id DESC (paginação por keyset).
+        Com `chave_cursor`, a data também vem como texto bruto em `data_chave`.
+        """
+        where, params = self._filtros_periodo(
+            user_id, data_inicio, data_fim, categorias, incluir_excluidas, origem, sinal
+        )
         
         # Query base com joins otimizados
-        query = """
+        query = f"""
             SELECT 
                 t.id,
                 t.hash_transacao,
@@ -116,53 +282,304 @@ class TransacaoRepository(BaseRepository):
                 dp.descricao as nota,
                 t.created_at,
                 t.updated_at,
-                CASE WHEN te.hash_transacao IS NOT NULL THEN 1 ELSE 0 END as excluida
+                t.excluida{', t.data AS data_chave' if chave_cursor else ''}
             FROM transacoes t
             LEFT JOIN descricoes_personalizadas dp 
                 ON t.user_id = dp.user_id AND t.hash_transacao = dp.hash_transacao
-            LEFT JOIN transacoes_excluidas te 
-                ON t.user_id = te.user_id AND t.hash_transacao = te.hash_transacao
-            WHERE t.user_id = ? AND t.data BETWEEN ? AND ?
+            {where}
         """
         
-        params = [user_id, data_inicio, data_fim]
+        # Continuar a partir do cursor, na mesma ordem do ORDER BY
+        if apos:
+            query += " AND (t.data < ? OR (t.data = ? AND t.id < ?))"
+            params.extend([apos[0], apos[0], apos[1]])
+        
+        # Ordenar por data mais recente
+        query += " ORDER BY t.data DESC, t.id DESC"
+        
+        return query, params
+
+    def contar_transacoes_periodo(self, user_id: int, data_inicio: str, data_fim: str,
+                                  categorias: Optional[List[str]] = None,
+                                  incluir_excluidas: bool = False,
+                                  origem: Optional[str] = None,
+                                  sinal: Optional[int] = None) -> int:
+        """COUNT(*) com os mesmos filtros de obter_pagina_transacoes (total de páginas)"""
+        where, params = self._filtros_periodo(
+            user_id, data_inicio, data_fim, categorias, incluir_excluidas, origem, sinal
+        )
+        result = self.db.executar_query(f"SELECT COUNT(*) AS total FROM transacoes t {where}", params)
+        return result[0]['total'] if result else 0
+
+    def obter_estatisticas_categorias_periodo(self, user_id: int, data_inicio: str, data_fim: str,
+                                              incluir_excluidas: bool = False) -> Dict[str, Dict[str, float]]:
+        """Por categoria: quantidade de transações e média/desvio padrão das despesas (valor absoluto)"""
+        where, params = self._filtros_periodo(
+            user_id, data_inicio, data_fim, incluir_excluidas=incluir_excluidas
+        )
+        linhas = self.db.executar_query(f"""
+            SELECT
+                t.categoria,
+                COUNT(*) AS quantidade,
+                COUNT(CASE WHEN t.valor < 0 THEN 1 END) AS qtd_despesas,
+                AVG(CASE WHEN t.valor < 0 THEN -t.valor END) AS media_despesa,
+                AVG(CASE WHEN t.valor < 0 THEN t.valor * t.valor END) AS media_quadrados
+            FROM transacoes t {where}
+            GROUP BY t.categoria
+        """, params)
+        
+        estatisticas = {}
+        for linha in linhas:
+            media = linha['media_despesa'] or 0.0
+            # Variância populacional: E[x²] - E[x]² (sem sqrt garantido no SQLite)
+            variancia = max((linha['media_quadrados'] or 0.0) - media * media, 0.0)
+            estatisticas[linha['categoria']] = {
+                'quantidade': linha['quantidade'],
+                'qtd_despesas': linha['qtd_despesas'],
+                'media_despesa': media,
+                'desvio_despesa': variancia ** 0.5
+            }
+        return estatisticas
+
+    def obter_transacoes_periodo(self, user_id: int, data_inicio: str, 
+                                data_fim: str, categorias: Optional[List[str]] = None,
+                                incluir_excluidas: bool = False,
+                                limite: Optional[int] = None,
+                                offset: int = 0,
+                                tipado: bool = False) -> pd.DataFrame:
+        """Obtém transações com filtros otimizados e paginação.
+        
+        Com `tipado=True` o DataFrame já vem com data como datetime64, valor numérico
+        e categoria/origem/tipo categóricos (ver SCHEMA_TRANSACOES).
+        """
+        query, params = self._montar_query_periodo(
+            user_id, data_inicio, data_fim, categorias, incluir_excluidas
+        )
+        
+        # Aplicar limite e paginação se especificados
+        if limite:
+            query += " LIMIT ? OFFSET ?"
+            params.extend([limite, offset])
+        
+        if tipado:
+            return self.db.executar_query_df_tipado(query, params, self.SCHEMA_TRANSACOES)
+        return self.db.executar_query_df(query, params)
+
+    async def obter_transacoes_periodo_async(self, user_id: int, data_inicio: str,
+                                             data_fim: str, categorias: Optional[List[str]] = None,
+                                             incluir_excluidas: bool = False,
+                                             limite: Optional[int] = None,
+                                             offset: int = 0,
+                                             tipado: bool = False) -> pd.DataFrame:
+        """Versão assíncrona de obter_transacoes_periodo"""
+        return await self._executar_async(
+            self.obter_transacoes_periodo, user_id, data_inicio, data_fim,
+            categorias, incluir_excluidas, limite, offset, tipado
+        )
+
+    def obter_pagina_transacoes(self, user_id: int, data_inicio: str, data_fim: str,
+                                categorias: Optional[List[str]] = None,
+                                origem: Optional[str] = None,
+                                sinal: Optional[int] = None,
+                                tamanho_pagina: int = 20,
+                                token: Optional[str] = None,
+                                tipado: bool = True) -> Tuple[pd.DataFrame, Optional[str]]:
+        """Obtém uma página de transações do período usando paginação por cursor.
+        
+        Retorna (DataFrame da página, token da próxima página). O token é opaco e
+        deve ser repassado na chamada seguinte; None indica que não há mais páginas.
+        Diferente de LIMIT/OFFSET, o custo de cada página não cresce com a profundidade.
+        """
+        apos = self._decodificar_token_pagina(token) if token else None
+        query, params = self._montar_query_periodo(
+            user_id, data_inicio, data_fim, categorias,
+            origem=origem, sinal=sinal, apos=apos, chave_cursor=True
+        )
+        
+        # Uma linha a mais indica se existe próxima página
+        query += " LIMIT ?"
+        params.append(tamanho_pagina + 1)
+        
+        if tipado:
+            df = self.db.executar_query_df_tipado(query, params, self.SCHEMA_TRANSACOES)
+        else:
+            df = self.db.executar_query_df(query, params)
+        
+        # data_chave é o texto gravado (a coluna data já pode ter virado datetime)
+        chaves = df.pop('data_chave')
+        if len(df) <= tamanho_pagina:
+            return df, None
+        
+        df = df.iloc[:tamanho_pagina]
+        proximo = self._codificar_token_pagina(str(chaves.iloc[tamanho_pagina - 1]), int(df['id'].iloc[-1]))
+        return df, proximo
+    
+    @staticmethod
+    def _codificar_token_pagina(data: str, transacao_id: int) -> str:
+        """Serializa a chave (data, id) em um token opaco"""
+        bruto = json.dumps({'d': data, 'i': transacao_id}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(bruto.encode('utf-8')).decode('ascii')
+    
+    @staticmethod
+    def _decodificar_token_pagina(token: str) -> Tuple[str, int]:
+        """Recupera a chave (data, id) de um token gerado por _codificar_token_pagina"""
+        try:
+            chave = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+            return str(chave['d']), int(chave['i'])
+        except Exception as e:
+            raise ValueError(f"Token de paginação inválido: {token!r}") from e
+
+    @classmethod
+    def _montar_consulta_fts(cls, termo: str, qualquer_termo: bool = False,
+                             colunas: Optional[List[str]] = None) -> Optional[str]:
+        """Converte o texto digitado em consulta FTS5.
+        
+        Trechos entre aspas viram frases exatas e as demais palavras viram prefixos
+        ("mercad" encontra "mercado"). Os termos são combinados com AND, ou com OR
+        quando `qualquer_termo=True`. Retorna None se não houver termos.
+        """
+        partes = []
+        for frase, palavra in cls._RE_TERMO_BUSCA.findall(termo or ''):
+            if palavra:
+                partes.append(f'"{palavra}"*')
+            elif re.findall(r'\w+', frase):
+                partes.append('"' + ' '.join(re.findall(r'\w+', frase)) + '"')
+        if not partes:
+            return None
+        
+        consulta = (' OR ' if qualquer_termo else ' AND ').join(partes)
+        if colunas:
+            consulta = '{' + ' '.join(colunas) + '} : (' + consulta + ')'
+        return consulta
+    
+    def buscar_transacoes(self, user_id: int, termo: str,
+                          categorias: Optional[List[str]] = None,
+                          colunas: Optional[List[str]] = None,
+                          qualquer_termo: bool = False,
+                          incluir_excluidas: bool = False,
+                          limite: Optional[int] = 50) -> pd.DataFrame:
+        """Busca transações por texto na descrição e na nota pessoal.
+        
+        Usa o índice FTS5 (transacoes_fts) com ordenação por relevância (bm25);
+        sem FTS5, recorre a LIKE ordenado por data. Veja _montar_consulta_fts para
+        a sintaxe de prefixos e frases.
+        """
+        colunas = list(colunas) if colunas else None
+        if colunas and not set(colunas) <= set(self.COLUNAS_BUSCA):
+            raise ValueError(f"Colunas de busca inválidas: {colunas}")
+        
+        consulta = self._montar_consulta_fts(termo, qualquer_termo, colunas)
+        if consulta is None:
+            return pd.DataFrame()
+        
+        campos = """
+                t.id,
+                t.hash_transacao,
+                t.data,
+                t.descricao,
+                t.valor,
+                t.categoria,
+                t.tipo,
+                t.origem,
+                dp.descricao as nota,
+                t.excluida"""
+        join_nota = """
+            LEFT JOIN descricoes_personalizadas dp 
+                ON t.user_id = dp.user_id AND t.hash_transacao = dp.hash_transacao"""
+        
+        if self.db.busca_textual_disponivel():
+            query = f"""
+                SELECT {campos},
+                    bm25(transacoes_fts) as relevancia
+                FROM transacoes_fts
+                JOIN transacoes t ON t.id = transacoes_fts.rowid
+                {join_nota}
+                WHERE transacoes_fts MATCH ? AND t.user_id = ?
+            """
+            params: List[Any] = [consulta, user_id]
+            ordem = " ORDER BY relevancia, t.data DESC"
+        else:
+            termos = [frase or palavra for frase, palavra in self._RE_TERMO_BUSCA.findall(termo)]
+            termos = [texto.strip() for texto in termos if texto.strip()]
+            colunas_like = [{'descricao': 't.descricao', 'nota': 'dp.descricao'}[c]
+                            for c in (colunas or self.COLUNAS_BUSCA)]
+            condicoes = []
+            params = [user_id]
+            for texto in termos:
+                condicoes.append('(' + ' OR '.join(f"{c} LIKE ?" for c in colunas_like) + ')')
+                params.extend([f'%{texto}%'] * len(colunas_like))
+            query = f"""
+                SELECT {campos},
+                    0 as relevancia
+                FROM transacoes t
+                {join_nota}
+                WHERE t.user_id = ? AND ({(' OR ' if qualquer_termo else ' AND ').join(condicoes)})
+            """
+            ordem = " ORDER BY t.data DESC"
         
-        # Filtrar excluídas se solicitado
         if not incluir_excluidas:
-            query += " AND te.hash_transacao IS NULL"
+            query += " AND t.excluida = 0"
         
-        # Filtrar por categorias
         if categorias:
             placeholders = ','.join(['?' for _ in categorias])
             query += f" AND t.categoria IN ({placeholders})"
             params.extend(categorias)
         
-        # Ordenar por data mais recente
-        query += " ORDER BY t.data DESC, t.id DESC"
-        
-        # Aplicar limite e paginação se especificados
+        query += ordem
         if limite:
-            query += " LIMIT ? OFFSET ?"
-            params.extend([limite, offset])
+            query += " LIMIT ?"
+            params.append(limite)
         
         return self.db.executar_query_df(query, params)
 
+    def iterar_transacoes_periodo(self, user_id: int, data_inicio: str,
+                                  data_fim: str, categorias: Optional[List[str]] = None,
+                                  incluir_excluidas: bool = False,
+                                  tamanho_lote: int = 5000) -> Iterator[pd.DataFrame]:
+        """Produz as transações do período em DataFrames de até `tamanho_lote` linhas"""
+        query, params = self._montar_query_periodo(
+            user_id, data_inicio, data_fim, categorias, incluir_excluidas
+        )
+        return self.db.executar_query_df_chunks(query, params, chunksize=tamanho_lote)
+
+    def exportar_transacoes_csv(self, user_id: int, data_inicio: str, data_fim: str,
+                                destino: Union[str, IO[str]],
+                                categorias: Optional[List[str]] = None,
+                                tamanho_lote: int = 5000) -> int:
+        """Exporta transações do período para CSV em lotes e retorna o total de linhas escritas"""
+        self._log_operation("exportar_transacoes_csv", f"User: {user_id}, Período: {data_inicio} a {data_fim}")
+        
+        arquivo = open(destino, 'w', encoding='utf-8', newline='') if isinstance(destino, str) else destino
+        total = 0
+        try:
+            for lote in self.iterar_transacoes_periodo(
+                user_id, data_inicio, data_fim, categorias, tamanho_lote=tamanho_lote
+            ):
+                lote.to_csv(arquivo, index=False, header=(total == 0))
+                total += len(lote)
+        finally:
+            if isinstance(destino, str):
+                arquivo.close()
+        
+        return total
+
     def atualizar_categorias_lote(self, user_id: int, 
                                mapeamento: Dict[str, str]) -> int:
-        """Atualiza categorias em lote"""
+        """Atualiza categorias em lote (tabela temporária + um único UPDATE ... FROM)"""
         if not mapeamento:
             return 0
-            
-        queries = []
-        for hash_transacao, nova_categoria in mapeamento.items():
-            queries.append(("""
-                UPDATE transacoes 
-                SET categoria = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE user_id = ? AND hash_transacao = ?
-            """, [nova_categoria, user_id, hash_transacao]))
         
-        results = self.db.executar_batch(queries)
-        return sum(results)
+        return self.db.executar_com_tabela_temporaria(
+            'lote_categorias',
+            ['hash_transacao TEXT PRIMARY KEY', 'categoria TEXT NOT NULL'],
+            mapeamento.items(),
+            [("""
+                UPDATE transacoes 
+                SET categoria = l.categoria, updated_at = CURRENT_TIMESTAMP
+                FROM temp.lote_categorias l
+                WHERE transacoes.user_id = ? AND transacoes.hash_transacao = l.hash_transacao
+            """, [user_id])]
+        )[0]
 
     def atualizar_categoria_transacao(self, user_id: int, 
                                      hash_transacao: str, nova_categoria: str) -> bool:
@@ -183,19 +600,22 @@ class TransacaoRepository(BaseRepository):
         return affected > 0
 
     def excluir_transacoes_lote(self, user_id: int, hashes_transacoes: List[str]) -> int:
-        """Exclui múltiplas transações em lote"""
+        """Exclui múltiplas transações em lote (tabela temporária + um único INSERT ... SELECT)"""
         if not hashes_transacoes:
             return 0
-            
-        queries = []
-        for hash_transacao in hashes_transacoes:
-            queries.append(("""
-                INSERT OR IGNORE INTO transacoes_excluidas (user_id, hash_transacao, motivo)
-                VALUES (?, ?, 'Excluída em lote pelo usuário')
-            """, [user_id, hash_transacao]))
         
-        results = self.db.executar_batch(queries)
-        return sum(results)
+        # user_id na tabela temporária para o filtro `user_id = ?` identificar o usuário
+        return self.db.executar_com_tabela_temporaria(
+            'lote_exclusoes',
+            ['user_id INTEGER NOT NULL', 'hash_transacao TEXT NOT NULL'],
+            [(user_id, h) for h in dict.fromkeys(hashes_transacoes)],
+            [("""
+                INSERT OR IGNORE INTO transacoes_excluidas (user_id, hash_transacao, motivo)
+                SELECT user_id, hash_transacao, 'Excluída em lote pelo usuário'
+                FROM temp.lote_exclusoes
+                WHERE user_id = ?
+            """, [user_id])]
+        )[0]
 
     def obter_transacoes_usuario_categorizado(self, user_id: int) -> pd.DataFrame:
         """Obtém transações do usuário que já foram categorizadas"""
@@ -203,15 +623,14 @@ class TransacaoRepository(BaseRepository):
             query = """
                 SELECT t.hash_transacao, t.data, t.descricao, t.valor, t.categoria, t.tipo, t.origem
                 FROM transacoes t
-                LEFT JOIN transacoes_excluidas te ON t.user_id = te.user_id AND t.hash_transacao = te.hash_transacao
                 WHERE t.user_id = ? 
+                  AND t.excluida = 0
                   AND t.categoria IS NOT NULL 
                   AND t.categoria != 'Outros'
-                  AND te.hash_transacao IS NULL
                 ORDER BY t.data DESC
             """
             
-            with self.db.get_connection() as conn:
+            with self.db.get_connection(user_id) as conn:
                 df = pd.read_sql_query(query, conn, params=[user_id])
             return df
         except Exception:
@@ -223,7 +642,14 @@ class UsuarioRepository(BaseRepository):
     def criar_usuario(self, username: str, email: Optional[str] = None) -> int:
         """Cria novo usuário"""
         self._log_operation("criar_usuario", f"Username: {username}")
-        return self.db.criar_usuario_se_nao_existe(username)
+        user_id = self.db.criar_usuario_se_nao_existe(username)
+        # Usuário já existente tem o last_login atualizado
+        self._invalidar_cache(user_id)
+        return user_id
+    
+    def _invalidar_cache(self, user_id: int):
+        """Descarta o perfil em cache após uma escrita em usuarios"""
+        _cache_usuarios.invalidar(_chave_banco(self.db), user_id=user_id)
     
     def obter_usuario_por_id(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Obtém dados completos do usuário"""
@@ -233,13 +659,35 @@ class UsuarioRepository(BaseRepository):
         )
         return dict(result[0]) if result else None
     
-    def obter_usuario_por_username(self, username: str) -> Optional[Dict[str, Any]]:
-        """Obtém usuário pelo username"""
+    def obter_usuario_por_username(self, username: str, usar_cache: bool = True) -> Optional[Dict[str, Any]]:
+        """Obtém usuário pelo username (mapa de identidade do processo; `usar_cache=False` lê do banco).
+        
+        Pelo cache o perfil vem sem password_hash; só `usar_cache=False` traz a linha completa.
+        """
+        banco = _chave_banco(self.db)
+        if usar_cache:
+            perfil = _cache_usuarios.obter(banco, username)
+            if perfil is not None:
+                return perfil
+        
+        geracao = _cache_usuarios.geracao
         result = self.db.executar_query(
             "SELECT * FROM usuarios WHERE username = ?",
             [username]
         )
-        return dict(result[0]) if result else None
+        if not result:
+            return None
+        perfil = dict(result[0])
+        _cache_usuarios.guardar(banco, perfil, geracao)
+        return CacheUsuarios.sem_credenciais(perfil) if usar_cache else perfil
+    
+    async def obter_usuario_por_id_async(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Versão assíncrona de obter_usuario_por_id"""
+        return await self._executar_async(self.obter_usuario_por_id, user_id)
+    
+    async def obter_usuario_por_username_async(self, username: str) -> Optional[Dict[str, Any]]:
+        """Versão assíncrona de obter_usuario_por_username"""
+        return await self._executar_async(self.obter_usuario_por_username, username)
     
     def atualizar_preferencias(self, user_id: int, preferencias: Dict[str, Any]) -> bool:
         """Atualiza preferências do usuário"""
@@ -247,6 +695,7 @@ class UsuarioRepository(BaseRepository):
             "UPDATE usuarios SET preferences = ? WHERE id = ?",
             [json.dumps(preferencias), user_id]
         )
+        self._invalidar_cache(user_id)
         return affected > 0
     
     def obter_preferencias(self, user_id: int) -> Dict[str, Any]:
@@ -268,6 +717,7 @@ class UsuarioRepository(BaseRepository):
             "UPDATE usuarios SET last_login = CURRENT_TIMESTAMP WHERE id = ?",
             [user_id]
         )
+        self._invalidar_cache(user_id)
         return affected > 0
     
     def buscar_todos(self) -> List[Dict[str, Any]]:
@@ -301,14 +751,15 @@ class UsuarioRepository(BaseRepository):
             "UPDATE usuarios SET password_hash = ? WHERE id = ?",
             [password_hash, user_id]
         )
+        self._invalidar_cache(user_id)
         return affected > 0
     
     def verificar_senha(self, username: str, password: str) -> Optional[Dict[str, Any]]:
         """Verifica senha e retorna dados do usuário se válida"""
         self._log_operation("verificar_senha", f"Username: {username}")
         
-        # Buscar usuário
-        user_data = self.obter_usuario_por_username(username)
+        # Buscar usuário (sempre do banco: o hash da senha não pode vir do cache)
+        user_data = self.obter_usuario_por_username(username, usar_cache=False)
         if not user_data:
             return None
         
@@ -332,7 +783,7 @@ class UsuarioRepository(BaseRepository):
         """Migra hash de senha do sistema legado para bcrypt"""
         self._log_operation("migrar_senha_legado", f"Username: {username}")
         
-        user_data = self.obter_usuario_por_username(username)
+        user_data = self.obter_usuario_por_username(username, usar_cache=False)
         if not user_data:
             return False
         
@@ -351,6 +802,7 @@ class UsuarioRepository(BaseRepository):
                 "UPDATE usuarios SET password_hash = ? WHERE id = ?",
                 [password_hash, user_data['id']]
             )
+            self._invalidar_cache(user_data['id'])
             return affected > 0
         except Exception as e:
             self._log_operation("migrar_senha_error", f"Error: {str(e)}")
@@ -364,6 +816,7 @@ class UsuarioRepository(BaseRepository):
             "UPDATE usuarios SET profile_pic = ? WHERE id = ?",
             [profile_pic_path, user_id]
         )
+        self._invalidar_cache(user_id)
         return affected > 0
 
 class CategoriaRepository(BaseRepository):
@@ -436,6 +889,44 @@ class ExclusaoRepository(BaseRepository):
         )
         return bool(result)
 
+class ResumoMensalRepository(BaseRepository):
+    """Repository para os agregados mensais (resumo_mensal), mantidos por triggers"""
+    
+    def obter_totais_mensais(self, user_id: int, ano_mes_inicio: str,
+                             ano_mes_fim: str) -> Dict[str, Dict[str, Any]]:
+        """Receitas, despesas e quantidade por mês (AAAA-MM) no intervalo, inclusive"""
+        result = self.db.executar_query("""
+            SELECT 
+                ano_mes,
+                SUM(receitas) as receitas,
+                SUM(despesas) as despesas,
+                SUM(qtd_receitas + qtd_despesas) as total_transacoes
+            FROM resumo_mensal
+            WHERE user_id = ? AND ano_mes BETWEEN ? AND ?
+            GROUP BY ano_mes
+            HAVING SUM(qtd_receitas + qtd_despesas) > 0
+        """, [user_id, ano_mes_inicio, ano_mes_fim])
+        return {row['ano_mes']: dict(row) for row in result}
+    
+    async def obter_totais_mensais_async(self, user_id: int, ano_mes_inicio: str,
+                                         ano_mes_fim: str) -> Dict[str, Dict[str, Any]]:
+        """Versão assíncrona de obter_totais_mensais"""
+        return await self._executar_async(self.obter_totais_mensais, user_id, ano_mes_inicio, ano_mes_fim)
+    
+    def obter_gastos_por_categoria(self, user_id: int, ano_mes_inicio: str,
+                                   ano_mes_fim: str) -> pd.DataFrame:
+        """Despesas (valor absoluto) e quantidade por categoria no intervalo de meses"""
+        return self.db.executar_query_df("""
+            SELECT 
+                categoria,
+                SUM(despesas) as despesas,
+                SUM(qtd_despesas) as qtd_despesas
+            FROM resumo_mensal
+            WHERE user_id = ? AND ano_mes BETWEEN ? AND ?
+            GROUP BY categoria
+            HAVING SUM(qtd_despesas) > 0
+        """, [user_id, ano_mes_inicio, ano_mes_fim])
+
 class CacheIARepository(BaseRepository):
     """Repository para operações com cache de categorização IA"""
     
@@ -482,23 +973,30 @@ class ArquivoOFXRepository(BaseRepository):
 class SystemLogRepository(BaseRepository):
     """Repository para operações com logs do sistema"""
     
-    def registrar_log(self, tipo: str, mensagem: str, dados: Optional[Dict[str, Any]] = None) -> int:
-        """Registra log do sistema"""
-        self._log_operation("registrar_log", f"Tipo: {tipo}")
-        return self.db.executar_insert("""
-            INSERT INTO system_logs (tipo, mensagem, dados)            VALUES (?, ?, ?)
-        """, [tipo, mensagem, json.dumps(dados) if dados else None])
+    def registrar_log(self, tipo: str, mensagem: str, dados: Optional[Dict[str, Any]] = None,
+                      user_id: Optional[int] = None, ip_address: Optional[str] = None) -> bool:
+        """Registra log do sistema (action=tipo) sem esperar a gravação.
+        
+        O registro vai para o buffer do DatabaseManager e é inserido em lote pela
+        thread de descarga. Retorna False se a fila estava cheia e o log entrou
+        só na contagem agregada.
+        """
+        details = json.dumps({'mensagem': mensagem, 'dados': dados}, ensure_ascii=False, default=str) if dados else mensagem
+        return self.db.registrar_log_sistema(tipo, details, user_id, ip_address)
     
     def buscar_logs(self, tipo: Optional[str] = None, limite: int = 100) -> List[Dict[str, Any]]:
         """Busca logs do sistema com filtros"""
+        # Incluir os logs ainda em memória
+        self.db.descarregar_logs_sistema()
+        
         query = "SELECT * FROM system_logs"
         params = []
         
         if tipo:
-            query += " WHERE tipo = ?"
+            query += " WHERE action = ?"
             params.append(tipo)
             
-        query += " ORDER BY created_at DESC LIMIT ?"
+        query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
         params.append(limite)
         
         result = self.db.executar_query(query, params)
@@ -768,8 +1266,8 @@ class CacheInsightsRepository(BaseRepository):
             self.db.executar_insert("""
                 UPDATE cache_insights_llm 
                 SET used_count = used_count + 1 
-                WHERE id = ?
-            """, [result[0]['id']])
+                WHERE id = ? AND user_id = ?
+            """, [result[0]['id'], user_id])
             
             self._log_operation("buscar_insight_cache", f"Cache HIT - Type: {insight_type}")
             return dict(result[0])
@@ -777,6 +1275,13 @@ class CacheInsightsRepository(BaseRepository):
         self._log_operation("buscar_insight_cache", f"Cache MISS - Type: {insight_type}")
         return None
     
+    async def buscar_insight_cache_async(self, user_id: int, insight_type: str, personalidade: str,
+                                         data_hash: str, prompt_hash: str) -> Optional[Dict[str, Any]]:
+        """Versão assíncrona de buscar_insight_cache"""
+        return await self._executar_async(
+            self.buscar_insight_cache, user_id, insight_type, personalidade, data_hash, prompt_hash
+        )
+    
     def limpar_cache_expirado(self, user_id: Optional[int] = None) -> int:
         """Remove insights expirados do cache"""
         from datetime import datetime
@@ -794,9 +1299,11 @@ class CacheInsightsRepository(BaseRepository):
             """
             params = [datetime.now().isoformat()]
         
-        with self.db.get_connection() as conn:
-            cursor = conn.execute(query, params)
-            rows_deleted = cursor.rowcount
+        # Pela thread escritora (invalida o cache); particionado e sem usuário, arquivo por arquivo
+        if not user_id and isinstance(self.db, ShardedDatabaseManager):
+            rows_deleted = sum(self.db.executar_update_por_arquivo(query, params).values())
+        else:
+            rows_deleted = self.db.executar_update(query, params)
         
         self._log_operation("limpar_cache_expirado", f"Removidos: {rows_deleted} insights")
         return rows_deleted
@@ -863,9 +1370,8 @@ class CacheInsightsRepository(BaseRepository):
             params = [user_id]
             self._log_operation("invalidar_cache_usuario", f"User: {user_id}, ALL types")
         
-        with self.db.get_connection() as conn:
-            cursor = conn.execute(query, params)
-            return cursor.rowcount
+        rows_deleted = self.db.executar_update(query, params)
+        return rows_deleted
 
 class MetaEconomiaRepository(BaseRepository):
     """Repository para operações com metas de economia"""